@@ -0,0 +1,77 @@
+"""
+Memory allocated per agent request on the hot path, measured with tracemalloc.
+
+Runs many concurrent run_conversation turns against a stubbed LLM that returns
+real LiteLLM response objects (a tool call, then the summary) and the bundled
+tools, and reports the bytes allocated and the traced peak per request.
+
+Usage:
+    python benchmarks/request_memory_benchmark.py [concurrency]
+"""
+import asyncio
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import litellm
+from services.llm_service import run_conversation
+from services.mcp_service import MCPServer
+
+
+def completion(message):
+    return litellm.ModelResponse(choices=[{"index": 0, "finish_reason": "stop", "message": message}])
+
+
+async def fake_acompletion(**kwargs):
+    if any(message["role"] == "tool" for message in kwargs["messages"]):
+        return completion({"role": "assistant", "content": "15 times 4 is 60."})
+    arguments = json.dumps({"expression": "15 * 4"})
+    return completion({
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [{"id": "call_1", "type": "function", "function": {"name": "calculate", "arguments": arguments}}]
+    })
+
+
+def build_server():
+    mcp_server = MCPServer()
+    mcp_server.load_tools_from_modules()
+    return mcp_server
+
+
+async def run_requests(mcp_server, concurrency):
+    histories = [[{"role": "system", "content": "You are a helpful assistant."}, {"role": "user", "content": "What's 15 * 4?"}]
+                 for _ in range(concurrency)]
+    return await asyncio.gather(*(run_conversation(history, mcp_server, skip_summary=False) for history in histories))
+
+
+def measure(concurrency):
+    with patch("builtins.print"):
+        mcp_server = build_server()
+    with patch("services.llm_service.litellm.acompletion", side_effect=fake_acompletion), patch("builtins.print"):
+        # Warm up imports, caches and lazily imported tool modules
+        asyncio.run(run_requests(mcp_server, 4))
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        results = asyncio.run(run_requests(mcp_server, concurrency))
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename") if stat.size_diff > 0)
+    return allocated / concurrency, peak / concurrency, results
+
+
+if __name__ == "__main__":
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    allocated, peak, results = measure(concurrency)
+    assert all(result["content"] == "15 times 4 is 60." for result in results)
+    print(f"{concurrency} concurrent requests")
+    print(f"retained per request: {allocated / 1024:8.1f} KiB")
+    print(f"peak per request:     {peak / 1024:8.1f} KiB")
@@ -0,0 +1,57 @@
+"""
+Serialization cost per chat request, before and after the fast JSON path.
+
+"Before" mirrors the old request path: json.dumps for every tool message, then
+FastAPI validating an AgentResponse and running jsonable_encoder before
+JSONResponse renders it. "After" serializes tool messages with
+services.serialization.dumps and renders the response once with FastJSONResponse.
+
+Usage:
+    python benchmarks/serialization_benchmark.py [iterations]
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from models.schema import AgentResponse
+from services.serialization import dumps, FastJSONResponse, HAS_ORJSON
+
+# A multi-city weather answer: one tool call with a table result and the summary
+TOOL_RESULT = {
+    "columns": ["city", "location", "temp_c", "feels_like_c", "description", "humidity_pct", "wind_m_s"],
+    "rows": [[f"City {index}", f"City {index}, XX", 18.2 + index, 17.1 + index, "scattered clouds", 60 + index, 3.1]
+             for index in range(10)],
+    "errors": []
+}
+RESPONSE = {
+    "role": "assistant",
+    "content": "Here is the current weather in the ten cities you asked about. " * 8,
+    "tool_calls": None,
+    "function_call": None,
+    "timings": {"tool_selection": {"prompt_eval_ms": 412.5, "eval_ms": 88.1}, "summary": {"prompt_eval_ms": 35.2, "eval_ms": 950.3}}
+}
+
+
+def before():
+    json.dumps(TOOL_RESULT)
+    validated = AgentResponse(response=RESPONSE)
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def after():
+    dumps(TOOL_RESULT)
+    return FastJSONResponse({"response": RESPONSE}).body
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    assert json.loads(before()) == json.loads(after())
+    print(f"orjson available: {HAS_ORJSON}")
+    for name, function in (("before", before), ("after", after)):
+        seconds = min(timeit.repeat(function, number=iterations, repeat=5))
+        print(f"{name:>6}: {seconds / iterations * 1e6:8.1f} us per request")
@@ -10,3 +10,125 @@ LLM_API_BASE_URL = os.getenv("LLM_API_BASE_URL", "http://localhost:11434")  # Ba
 
 # API keys for tools
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY", "your_api_key_here")
+
+# Multiple LLM backends (optional). Either a JSON list such as
+# '[{"url": "http://gpu1:11434", "model": "llama3.2", "weight": 2}]'
+# or comma-separated 'url|model|weight' entries. Defaults to the single backend above.
+LLM_BACKENDS = os.getenv("LLM_BACKENDS", "")
+LLM_HEALTH_CHECK_INTERVAL = float(os.getenv("LLM_HEALTH_CHECK_INTERVAL", "10"))  # Seconds between active health checks
+LLM_MAX_FAILURES = int(os.getenv("LLM_MAX_FAILURES", "3"))  # Consecutive errors before a backend is ejected
+LLM_EJECTION_SECONDS = float(os.getenv("LLM_EJECTION_SECONDS", "30"))  # How long an ejected backend is skipped
+
+# Rule-based fast path that answers trivial tool requests on /chat without the LLM
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "false").lower() == "true"
+FAST_PATH_MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.8"))  # Lower-confidence matches go to the LLM
+
+# System prompt used by /chat and new sessions
+SYSTEM_PROMPT = os.getenv("SYSTEM_PROMPT", "You are a helpful assistant with access to various tools.")
+
+# Server-side sessions
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))  # Sessions kept in memory
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "1800"))  # Seconds before an idle session expires
+SESSION_SPILL_PATH = os.getenv("SESSION_SPILL_PATH", "")  # SQLite file for evicted sessions (optional)
+
+# Prompt-prefix stability and model residency (Ollama)
+PROMPT_PREFIX_STABLE = os.getenv("PROMPT_PREFIX_STABLE", "false").lower() == "true"  # Byte-stable system prompt and tool block
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")  # How long Ollama keeps the model loaded; empty to use Ollama's default
+LLM_WARMUP = os.getenv("LLM_WARMUP", "true").lower() == "true"  # Load the model with a tiny completion on startup
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "600"))  # Seconds before a completion request times out
+
+# Cache of tool names and schemas discovered without importing tool modules
+TOOL_MANIFEST_PATH = os.getenv("TOOL_MANIFEST_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "tool_manifest.json"))
+
+# Calls to external tool APIs (weather, currency)
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "5"))  # Seconds per request
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))  # Retries for transient errors
+UPSTREAM_BREAKER_THRESHOLD = int(os.getenv("UPSTREAM_BREAKER_THRESHOLD", "5"))  # Consecutive failures that open a host's breaker
+UPSTREAM_BREAKER_RESET = float(os.getenv("UPSTREAM_BREAKER_RESET", "30"))  # Seconds before an open breaker allows a trial call
+UPSTREAM_HEDGE = os.getenv("UPSTREAM_HEDGE", "true").lower() == "true"  # Send a duplicate request after the host's p95 latency
+
+# Response cache for external tool APIs (stale-while-revalidate)
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() == "true"  # Cache tools' upstream responses
+HTTP_CACHE_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "1024"))  # Maximum cached responses
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))  # Maximum total size of cached responses
+HTTP_CACHE_POLICIES = os.getenv("HTTP_CACHE_POLICIES", "")  # JSON list of {pattern, soft_ttl, hard_ttl, stale_if_error}; empty uses the defaults
+
+# Quotas of external tool APIs and per-client limits on the public endpoints
+QUOTA_LIMITS = os.getenv("QUOTA_LIMITS", "")  # JSON object of host -> {per_minute, per_day, ...}; empty uses the free-tier defaults
+QUOTA_MAX_WAIT = float(os.getenv("QUOTA_MAX_WAIT", "10"))  # Longest a call waits in the queue for quota, in seconds
+QUOTA_PRESSURE_THRESHOLD = float(os.getenv("QUOTA_PRESSURE_THRESHOLD", "0.8"))  # Fraction of a quota used up from which cached responses are preferred
+CLIENT_RATE_LIMIT = float(os.getenv("CLIENT_RATE_LIMIT", "0"))  # Requests per minute per client on the chat and session endpoints; 0 disables
+CLIENT_RATE_BURST = float(os.getenv("CLIENT_RATE_BURST", "0"))  # Requests a client may make at once; 0 uses CLIENT_RATE_LIMIT
+CLIENT_API_KEYS = os.getenv("CLIENT_API_KEYS", "")  # API keys limited per key (comma-separated), besides those in LLM_PRIORITY_API_KEYS; other clients are limited per address
+
+# Background jobs (POST /jobs)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # Jobs run at the same time
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "1000"))  # Waiting jobs before new ones get a 503
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "jobs.sqlite3"))  # SQLite file the jobs are persisted to
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "86400"))  # Seconds finished jobs are kept
+JOB_CALLBACK_TIMEOUT = float(os.getenv("JOB_CALLBACK_TIMEOUT", "10"))  # Timeout in seconds for posting results to a callback URL
+JOB_CALLBACK_ALLOWED_HOSTS = os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "")  # Hosts callbacks may go to (comma-separated); empty allows any public address
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))  # A running job whose worker stops renewing its lease for this long is run again
+JOB_PRIORITY = os.getenv("JOB_PRIORITY", "bulk")  # Traffic class of LLM calls made by jobs
+
+# Priority classes for LLM calls (weighted fair queuing)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))  # Completions sent to the backends at once; 0 disables queuing
+LLM_PRIORITY_WEIGHTS = os.getenv("LLM_PRIORITY_WEIGHTS", "interactive:8,bulk:1")  # Share of backend slots per class ('name:weight', comma-separated)
+LLM_DEFAULT_PRIORITY = os.getenv("LLM_DEFAULT_PRIORITY", "interactive")  # Class of requests that do not ask for one
+LLM_PRIORITY_HEADER = os.getenv("LLM_PRIORITY_HEADER", "X-Priority")  # Request header naming the class
+LLM_PRIORITY_API_KEYS = os.getenv("LLM_PRIORITY_API_KEYS", "")  # Fixed class per API key ('key:class', comma-separated), overrides the header
+LLM_PRIORITY_MAX_WAIT = float(os.getenv("LLM_PRIORITY_MAX_WAIT", "30"))  # Seconds after which a waiting call goes next whatever its class
+
+# WebSocket conversations (/ws/chat)
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "10000"))  # Open connections before new ones are closed with 1013
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "30"))  # Seconds of client silence before a ping; closed after two unanswered pings
+WS_MAX_MESSAGE_BYTES = int(os.getenv("WS_MAX_MESSAGE_BYTES", "16384"))  # Largest client message accepted
+WS_MAX_HISTORY_CHARS = int(os.getenv("WS_MAX_HISTORY_CHARS", "32768"))  # History kept per connection; oldest turns are dropped beyond this
+
+# Shared cache tier for multi-worker deployments: 'sqlite' (one host), 'redis' (any Redis-protocol server) or empty (per-worker only)
+SHARED_CACHE_BACKEND = os.getenv("SHARED_CACHE_BACKEND", "").lower()
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "shared_cache.sqlite3"))  # Database for the sqlite backend
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "redis://localhost:6379/0")  # Server for the redis backend
+SHARED_CACHE_L1_SIZE = int(os.getenv("SHARED_CACHE_L1_SIZE", "1024"))  # In-process entries kept in front of the shared tier
+COMPLETION_CACHE_TTL = float(os.getenv("COMPLETION_CACHE_TTL", "0"))  # Seconds identical completion requests are answered from the cache; 0 disables
+
+# Multi-city weather tool
+WEATHER_BATCH_CONCURRENCY = int(os.getenv("WEATHER_BATCH_CONCURRENCY", "5"))  # Weather API requests in flight per batch
+WEATHER_BATCH_MAX_CITIES = int(os.getenv("WEATHER_BATCH_MAX_CITIES", "20"))  # Cities per get_weather_batch call
+
+# Tools that stream their output (async generator functions)
+TOOL_STREAM_MAX_CHARS = int(os.getenv("TOOL_STREAM_MAX_CHARS", "16384"))  # Text kept from a streaming tool's string chunks for its result
+TOOL_STREAM_MAX_ITEMS = int(os.getenv("TOOL_STREAM_MAX_ITEMS", "200"))  # Other chunks kept for its result; the rest are only counted
+
+# Model Context Protocol endpoint (POST /mcp) and stdio server (python -m services.mcp_protocol)
+MCP_MAX_BATCH = int(os.getenv("MCP_MAX_BATCH", "50"))  # Largest JSON-RPC batch accepted
+
+# Remote MCP servers whose tools are served alongside the local ones. Either a JSON list such as
+# '[{"name": "search", "url": "http://search:8000/mcp", "prefix": "search_", "max_concurrency": 4}]'
+# or comma-separated 'name|url|prefix' entries (prefix defaults to '<name>_')
+MCP_REMOTE_SERVERS = os.getenv("MCP_REMOTE_SERVERS", "")
+MCP_REMOTE_MAX_CONCURRENCY = int(os.getenv("MCP_REMOTE_MAX_CONCURRENCY", "8"))  # Tool calls in flight (and pooled connections) per remote
+MCP_REMOTE_TIMEOUT = float(os.getenv("MCP_REMOTE_TIMEOUT", "30"))  # Seconds to wait for a remote's response
+MCP_REMOTE_SCHEMA_TTL = float(os.getenv("MCP_REMOTE_SCHEMA_TTL", "300"))  # Seconds a remote's tool list is reused before it is fetched again
+MCP_REMOTE_BATCH_WINDOW = float(os.getenv("MCP_REMOTE_BATCH_WINDOW", "0.002"))  # Seconds requests to a remote wait to be sent as one batch
+
+# Historical exchange rates (convert_currency_historical, get_rate_trend)
+RATE_STORE_PATH = os.getenv("RATE_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "rates"))  # Directory of the memory-mapped rate columns
+RATE_STORE_BASE = os.getenv("RATE_STORE_BASE", "USD")  # Currency stored rates are quoted against
+RATE_SNAPSHOT_INTERVAL = float(os.getenv("RATE_SNAPSHOT_INTERVAL", "21600"))  # Seconds between snapshots of the latest rate table; 0 disables
+
+# Admin endpoints (/debug/*, /admin/*), enabled by setting a key sent in the X-Admin-Key header
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "")
+TOOL_IMPORT_PACKAGES = os.getenv("TOOL_IMPORT_PACKAGES", "tools")  # Packages (comma-separated) whose functions tools added at runtime may use
+
+# Sampling profiler (GET /debug/profile)
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))  # Longest profile a request may ask for
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))  # Default milliseconds between stack samples
+
+# Event loop monitor: lag percentiles and callbacks that block the loop, on /metrics
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "false").lower() == "true"  # Opt-in: times every callback the loop runs
+LOOP_SLOW_CALLBACK_MS = float(os.getenv("LOOP_SLOW_CALLBACK_MS", "100"))  # A callback running longer than this blocks the loop and is attributed to its tool or endpoint
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))  # Seconds between loop lag measurements
+
+# Template answers for single tool calls (overridable per request with 'skip_summary')
+TEMPLATE_ANSWERS = os.getenv("TEMPLATE_ANSWERS", "false").lower() == "true"  # Opt-in: render the answer from the tool's response template instead of a summary completion
@@ -1,13 +1,42 @@
-from fastapi import FastAPI, HTTPException, Request
+import time
+_imports_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Request, WebSocket, Header, Depends
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import Headers
 import uvicorn
-from typing import Dict, Any
+import asyncio
+import importlib
+import hmac
+from typing import Dict, Any, Optional
 
-from models.schema import Message, AgentRequest, AgentResponse, Tool, SimpleAgentRequest
-from services.llm_service import generate_response
+from models.schema import (
+    Message, AgentRequest, AgentResponse, Tool, SimpleAgentRequest,
+    SessionCreateRequest, SessionResponse, JobRequest, JobResponse, ToolDefinition
+)
+from services.llm_service import generate_response, run_conversation, warm_up_model
+from services.llm_router import get_router
+from services.llm_scheduler import current_priority, classify, parse_api_key_classes
 from services.mcp_service import MCPServer
+from services.mcp_protocol import MCPProtocolHandler
+from services.mcp_remote import parse_remote_servers
+from services.intent_router import IntentRouter
+from services.job_queue import JobQueue, QueueFullError
+from services.metrics import metrics
+from services.quota import ClientRateLimiter
+from services.session_store import SessionStore
+from services.ws_chat import ChatConnection, CLOSE_TRY_AGAIN_LATER
+from services.shared_cache import get_shared_backend
+from services.serialization import FastJSONResponse
+from services.startup import startup_profiler
+from services import profiler as profiling
+from services.loop_monitor import LoopMonitor
+import config
 
-app = FastAPI(title="Agent AI with Tool-calling")
+startup_profiler.record("app_imports", time.perf_counter() - _imports_started)
+
+app = FastAPI(title="Agent AI with Tool-calling", default_response_class=FastJSONResponse)
 
 # CORS middleware setup
 app.add_middleware(
@@ -18,15 +47,232 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Traffic class of LLM calls, by API key or priority header
+PRIORITY_API_KEYS = parse_api_key_classes(config.LLM_PRIORITY_API_KEYS)
+
+# Per-client token buckets on the public endpoints, per configured API key or else per address
+client_limiter = ClientRateLimiter(
+    config.CLIENT_RATE_LIMIT,
+    config.CLIENT_RATE_BURST,
+    api_keys={key.strip() for key in config.CLIENT_API_KEYS.split(",") if key.strip()} | set(PRIORITY_API_KEYS)
+) if config.CLIENT_RATE_LIMIT > 0 else None
+RATE_LIMITED_PATHS = ("/chat", "/agent/chat", "/sessions", "/jobs", "/mcp")
+
+def require_admin(x_admin_key: Optional[str] = Header(None)):
+    """Allow admin endpoints only with the configured admin key; hidden when none is set"""
+    if not config.ADMIN_API_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_key is None or not hmac.compare_digest(x_admin_key.encode("utf-8"), config.ADMIN_API_KEY.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin key")
+
 # Initialize MCP Server
 mcp_server = MCPServer()
+metrics.register_collector("tools", lambda: {"registry_version": mcp_server.latest.version, "registered": len(mcp_server.latest.tools)})
+
+class RequestContextMiddleware:
+    """
+    Per-request setup in a single ASGI layer, run in the request's own task:
+    client rate limits, the traffic class of LLM calls, profiler tags and
+    the tool registry snapshot the request is served from
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # HTTP only; WebSocket turns set up their own context
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        path = scope["path"]
+        api_key = headers.get("x-api-key")
+
+        # Reject requests from clients over their rate limit with 429
+        if client_limiter is not None and path.startswith(RATE_LIMITED_PATHS):
+            client = scope.get("client")
+            allowed, retry_after = client_limiter.check(client_limiter.client_id(api_key, client[0] if client else None))
+            if not allowed:
+                metrics.increment("http.rate_limited")
+                response = FastJSONResponse(
+                    status_code=429,
+                    content={"detail": "Rate limit exceeded"},
+                    headers={"Retry-After": str(max(1, int(retry_after + 0.999)))}
+                )
+                await response(scope, receive, send)
+                return
+
+        priority = current_priority.set(classify(headers.get(config.LLM_PRIORITY_HEADER), api_key, PRIORITY_API_KEYS))
+        try:
+            # The scope is shared with the router, which sets the matched route on it
+            with profiling.tagged(endpoint=scope):
+                if path.startswith("/admin"):
+                    # Admin changes read back the registry they publish
+                    await self.app(scope, receive, send)
+                else:
+                    with mcp_server.pinned():
+                        await self.app(scope, receive, send)
+        finally:
+            current_priority.reset(priority)
+
+app.add_middleware(RequestContextMiddleware)
+
+# The registry over the Model Context Protocol (POST /mcp)
+mcp_protocol = MCPProtocolHandler(mcp_server, max_batch=config.MCP_MAX_BATCH)
+
+# Pre-router that answers trivial tool requests without the LLM
+intent_router = IntentRouter(min_confidence=config.FAST_PATH_MIN_CONFIDENCE)
+
+# Server-side conversation history
+session_store = SessionStore(
+    max_sessions=config.SESSION_MAX_SESSIONS,
+    idle_ttl=config.SESSION_IDLE_TTL,
+    spill_path=config.SESSION_SPILL_PATH or None
+)
+metrics.register_collector("sessions", lambda: {"in_memory": len(session_store)})
+metrics.register_collector("websockets", lambda: {"open": ChatConnection.active})
+
+async def run_job(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a queued agent request"""
+    agent_request = AgentRequest(**request)
+    current_priority.set(config.JOB_PRIORITY)
+    with profiling.tagged(endpoint="job"), mcp_server.pinned():
+        return await generate_response(agent_request.messages, mcp_server, agent_request.skip_summary)
+
+# Agent requests run in the background (POST /jobs)
+job_queue = JobQueue(
+    run_job,
+    config.JOB_DB_PATH,
+    workers=config.JOB_WORKERS,
+    max_queued=config.JOB_MAX_QUEUED,
+    result_ttl=config.JOB_RESULT_TTL,
+    callback_timeout=config.JOB_CALLBACK_TIMEOUT,
+    callback_allowed_hosts=[host.strip() for host in config.JOB_CALLBACK_ALLOWED_HOSTS.split(",") if host.strip()],
+    lease_seconds=config.JOB_LEASE_SECONDS
+)
+metrics.register_collector("jobs", job_queue.stats)
+
+# Loop lag and callbacks that block the loop, attributed to tools and endpoints
+loop_monitor = LoopMonitor(config.LOOP_SLOW_CALLBACK_MS / 1000, config.LOOP_LAG_INTERVAL)
+metrics.register_collector("event_loop", loop_monitor.stats)
+
+async def expire_sessions_periodically(interval: float = 60.0):
+    """Drop idle sessions in the background"""
+    while True:
+        await asyncio.sleep(interval)
+        removed = session_store.expire()
+        if removed:
+            print(f"Expired {removed} idle sessions")
+
+async def snapshot_rates_periodically(interval: float):
+    """Record the latest exchange-rate table in the historical rate store"""
+    # NumPy is only imported once the server is up
+    from services.rate_store import snapshot_latest_rates
+    while True:
+        try:
+            stored = await snapshot_latest_rates()
+            print(f"Stored {stored} exchange rates in the historical rate store")
+        except Exception as e:
+            print(f"Exchange-rate snapshot failed: {str(e)}")
+        await asyncio.sleep(interval)
+
+async def connect_remote_servers():
+    """Register the tools of the configured remote MCP servers, then keep their lists current"""
+    remotes = parse_remote_servers(
+        config.MCP_REMOTE_SERVERS,
+        max_concurrency=config.MCP_REMOTE_MAX_CONCURRENCY,
+        timeout=config.MCP_REMOTE_TIMEOUT,
+        schema_ttl=config.MCP_REMOTE_SCHEMA_TTL,
+        batch_window=config.MCP_REMOTE_BATCH_WINDOW
+    )
+    if not remotes:
+        return
+    for remote in remotes:
+        try:
+            count = await mcp_server.add_remote_server(remote)
+            print(f"Registered {count} tools from MCP server '{remote.name}'")
+        except Exception as e:
+            # Retried by the periodic refresh below
+            print(f"MCP server '{remote.name}' is unavailable: {str(e)}")
+    metrics.register_collector("mcp_remotes", lambda: {name: remote.status() for name, remote in mcp_server.remotes.items()})
+    while True:
+        await asyncio.sleep(config.MCP_REMOTE_SCHEMA_TTL)
+        await mcp_server.refresh_remotes()
+
+async def warm_up():
+    """Import heavy dependencies and load the model in the background, then mark the app ready"""
+    try:
+        with startup_profiler.phase("imports"):
+            await asyncio.to_thread(importlib.import_module, "litellm")
+        
+        # Load the model so the first request does not pay for it
+        if config.LLM_WARMUP:
+            with startup_profiler.phase("model_warmup"):
+                await warm_up_model()
+    except Exception as e:
+        print(f"Warm-up failed: {str(e)}")
+        return
+    startup_profiler.mark_ready()
 
 # Register tools on startup
 @app.on_event("startup")
 async def startup_event():
+    # Profiler tags follow requests into the tasks and threads they start
+    profiling.install(asyncio.get_running_loop())
+    
     print("Loading tools during server startup...")
-    mcp_server.load_tools_from_modules()
+    with startup_profiler.phase("tool_registration"):
+        mcp_server.load_tools_from_modules()
+        if config.FAST_PATH_ENABLED:
+            intent_router.load_tools(mcp_server)
     print(f"Loaded {len(mcp_server.tools)} tools successfully")
+    
+    # Started after tool registration, which blocks the loop before any request is served
+    if config.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    
+    app.state.session_expiry_task = asyncio.create_task(expire_sessions_periodically())
+    app.state.remote_tools_task = asyncio.create_task(connect_remote_servers())
+    app.state.rate_snapshot_task = None
+    if config.RATE_SNAPSHOT_INTERVAL > 0:
+        app.state.rate_snapshot_task = asyncio.create_task(snapshot_rates_periodically(config.RATE_SNAPSHOT_INTERVAL))
+    
+    requeued = job_queue.start()
+    if requeued:
+        print(f"Requeued {requeued} unfinished jobs")
+    
+    # Serve requests while LiteLLM is imported and the model is loaded;
+    # /ready reports false until this finishes
+    app.state.warmup_task = asyncio.create_task(warm_up())
+    
+    # Actively probe LLM backends when there is more than one to balance across
+    router = get_router()
+    if len(router.backends) > 1:
+        router.start_health_checks(config.LLM_HEALTH_CHECK_INTERVAL)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await get_router().stop_health_checks()
+    await loop_monitor.stop()
+    app.state.session_expiry_task.cancel()
+    app.state.remote_tools_task.cancel()
+    if app.state.rate_snapshot_task is not None:
+        app.state.rate_snapshot_task.cancel()
+    await mcp_server.close_remotes()
+    session_store.close()
+    await job_queue.stop()
+    job_queue.close()
+    shared_cache = get_shared_backend()
+    if shared_cache is not None:
+        shared_cache.close()
+
+def chat_response(response: Dict[str, Any]) -> FastJSONResponse:
+    """
+    Serialize an agent response in one pass.
+    Shaped like AgentResponse, but returned as a response object so FastAPI
+    skips re-validating and re-encoding the plain dictionary.
+    """
+    return FastJSONResponse({"response": response})
 
 @app.get("/")
 async def root():
@@ -36,35 +282,232 @@ async def root():
 async def agent_chat(request: AgentRequest):
     try:
         # Process the request through the LLM and get response
-        response = await generate_response(request.messages, mcp_server)
-        return AgentResponse(response=response)
+        response = await generate_response(request.messages, mcp_server, request.skip_summary)
+        return chat_response(response)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
 @app.post("/chat", response_model=AgentResponse)
 async def simple_chat(request: SimpleAgentRequest):
     try:
+        # Answer trivial tool requests directly when a pattern matches confidently
+        if config.FAST_PATH_ENABLED:
+            response = await intent_router.handle(request.message, mcp_server)
+            if response is not None:
+                return chat_response(response)
+        
         # Create a message list with just the user's message
         messages = [
-            Message(role="system", content="You are a helpful assistant with access to various tools."),
+            Message(role="system", content=config.SYSTEM_PROMPT),
             Message(role="user", content=request.message)
         ]
         
         # Process the request through the LLM and get response
-        response = await generate_response(messages, mcp_server)
-        return AgentResponse(response=response)
+        response = await generate_response(messages, mcp_server, request.skip_summary)
+        return chat_response(response)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
+@app.post("/sessions", response_model=SessionResponse)
+async def create_session(request: Optional[SessionCreateRequest] = None):
+    """Create a server-side session so clients only send new turns"""
+    system_prompt = request.system_prompt if request and request.system_prompt else config.SYSTEM_PROMPT
+    session = session_store.create(system_prompt)
+    return SessionResponse(session_id=session.session_id, messages=session.messages)
+
+@app.post("/sessions/{session_id}/chat", response_model=AgentResponse)
+async def session_chat(session_id: str, request: SimpleAgentRequest):
+    """Add a user turn to a session and get the assistant's answer"""
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found")
+    
+    async with session.lock:
+        # Work on a copy so a failed turn leaves the stored history untouched
+        llm_messages = list(session.messages)
+        llm_messages.append({"role": "user", "content": request.message})
+        try:
+            response = await run_conversation(llm_messages, mcp_server, request.skip_summary)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+        
+        session.messages = llm_messages
+        session_store.save(session)
+    
+    return chat_response(response)
+
+@app.websocket("/ws/chat")
+async def websocket_chat(websocket: WebSocket):
+    """Hold a conversation on a WebSocket, streaming tokens and tool events"""
+    await websocket.accept()
+    if not ChatConnection.reserve(config.WS_MAX_CONNECTIONS):
+        await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+        return
+    try:
+        await serve_chat(websocket)
+    finally:
+        ChatConnection.release()
+
+async def serve_chat(websocket: WebSocket):
+    """Run a WebSocket conversation that holds a connection slot"""
+    # HTTP middleware does not run for WebSockets
+    api_key = websocket.headers.get("x-api-key")
+    current_priority.set(classify(websocket.headers.get(config.LLM_PRIORITY_HEADER), api_key, PRIORITY_API_KEYS))
+    client = client_limiter.client_id(api_key, websocket.client.host if websocket.client else None) if client_limiter is not None else None
+    
+    async def converse(messages, skip_summary, on_event):
+        # Each turn keeps the tool registry it started with
+        with mcp_server.pinned():
+            return await run_conversation(messages, mcp_server, skip_summary, on_event)
+    
+    connection = ChatConnection(
+        websocket,
+        converse,
+        system_prompt=config.SYSTEM_PROMPT,
+        heartbeat_interval=config.WS_HEARTBEAT_INTERVAL,
+        max_message_bytes=config.WS_MAX_MESSAGE_BYTES,
+        max_history_chars=config.WS_MAX_HISTORY_CHARS,
+        check_rate=(lambda: client_limiter.check(client)) if client_limiter is not None else None
+    )
+    with profiling.tagged(endpoint=websocket.scope):
+        await connection.serve()
+
+@app.get("/sessions/{session_id}", response_model=SessionResponse)
+async def get_session(session_id: str):
+    """Get the full history of a session"""
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found")
+    return FastJSONResponse({"session_id": session.session_id, "messages": session.messages})
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Delete a session"""
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail=f"Session '{session_id}' not found")
+    return {"deleted": session_id}
+
+@app.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(request: JobRequest):
+    """Queue an agent request and return its job id at once"""
+    try:
+        job = job_queue.submit(request.model_dump(exclude={"callback_url"}), request.callback_url)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse(job, status_code=202)
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Get the state of a job, with its result once finished"""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return FastJSONResponse(job)
+
 @app.get("/tools")
 async def list_tools():
     """List all available tools in the MCP Server"""
     return {"tools": mcp_server.list_tools()}
 
+def registry_changed() -> Dict[str, Any]:
+    """Follow a change of the tool registry; describes the new snapshot"""
+    if config.FAST_PATH_ENABLED:
+        intent_router.load_tools(mcp_server)
+    return {"version": mcp_server.latest.version, "tools": len(mcp_server.latest.tools)}
+
+@app.get("/admin/tools", dependencies=[Depends(require_admin)])
+async def admin_list_tools():
+    """List the tools of the latest registry snapshot"""
+    return {"version": mcp_server.latest.version, "tools": mcp_server.list_tools()}
+
+@app.put("/admin/tools/{tool_name}", dependencies=[Depends(require_admin)])
+async def admin_put_tool(tool_name: str, definition: ToolDefinition):
+    """Add or replace a tool; requests already running keep the registry they started with"""
+    tool = Tool(name=tool_name, **definition.model_dump(exclude={"reload"}))
+    try:
+        entry = mcp_server.import_tool(tool, reload_module=definition.reload)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Tool '{tool_name}' could not be loaded: {str(e)}")
+    replaced = tool_name in mcp_server.latest.tools
+    mcp_server.register_tool(entry)
+    return {"name": tool_name, "replaced": replaced, **registry_changed()}
+
+@app.delete("/admin/tools/{tool_name}", dependencies=[Depends(require_admin)])
+async def admin_delete_tool(tool_name: str):
+    """Remove a tool; requests already running can still call it"""
+    if not mcp_server.unregister_tool(tool_name):
+        raise HTTPException(status_code=404, detail=f"Tool '{tool_name}' not found")
+    return {"deleted": tool_name, **registry_changed()}
+
+@app.post("/admin/tools/reload", dependencies=[Depends(require_admin)])
+async def admin_reload_tools(reload_modules: bool = True):
+    """Load the tools package again, re-importing changed tool code, and publish it as one snapshot"""
+    try:
+        mcp_server.load_tools_from_modules(reload_modules=reload_modules)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Tools could not be reloaded: {str(e)}")
+    return registry_changed()
+
+@app.post("/mcp")
+async def mcp_endpoint(request: Request):
+    """Model Context Protocol over streamable HTTP: JSON-RPC requests and batches"""
+    return await mcp_protocol.http_response(await request.body())
+
+@app.get("/mcp")
+async def mcp_event_stream():
+    """No server-initiated messages are sent, so there is no event stream to open"""
+    return FastJSONResponse(status_code=405, content={"detail": "Method Not Allowed"}, headers={"Allow": "POST"})
+
+@app.get("/metrics")
+async def get_metrics():
+    """Runtime metrics of the server"""
+    return metrics.snapshot()
+
+@app.get("/debug/profile", dependencies=[Depends(require_admin)])
+async def debug_profile(seconds: float = 10.0, interval_ms: float = config.PROFILE_INTERVAL_MS, format: str = "collapsed", include_idle: bool = False):
+    """
+    Sample the stacks of the event loop and executor threads for a while.
+    Returns collapsed stacks (flamegraph.pl, speedscope) or, with format=json,
+    the stacks with the hottest frames and the samples per endpoint and tool.
+    """
+    if not 0 < seconds <= config.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {config.PROFILE_MAX_SECONDS:g}")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms must be between 1 and 1000")
+    if format not in ("collapsed", "json"):
+        raise HTTPException(status_code=400, detail="format must be 'collapsed' or 'json'")
+    try:
+        profile = await profiling.profiler.profile(seconds, interval_ms / 1000, include_idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    stacks = profile.pop("stacks")
+    if format == "json":
+        return FastJSONResponse({
+            **profile,
+            "by_tag": profiling.tag_totals(stacks),
+            "hot_frames": [{"frame": frame, "samples": count} for frame, count in profiling.hot_frames(stacks)],
+            "stacks": dict(stacks.most_common())
+        })
+    return PlainTextResponse(
+        profiling.collapsed(stacks),
+        headers={"X-Profile-Samples": str(profile["samples"]), "X-Profile-Overhead-Pct": f"{profile['sampling_overhead_pct']:.2f}"}
+    )
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy"}
+    return {"status": "healthy", "startup": startup_profiler.report(), "llm_backends": get_router().status()}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint; 503 until dependencies are imported and the model is warmed up"""
+    if not startup_profiler.ready:
+        return FastJSONResponse(status_code=503, content={"ready": False})
+    return {"ready": True}
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    # Oversized WebSocket messages are refused by the server before they are buffered
+    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True, ws_max_size=config.WS_MAX_MESSAGE_BYTES)
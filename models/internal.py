@@ -0,0 +1,99 @@
+"""
+Compact internal representations used on the request path.
+Pydantic models in models/schema.py validate data at the HTTP and tool
+registration boundaries; inside the server, registry entries and executed
+tool calls are plain __slots__ objects.
+"""
+from typing import Dict, Any, List, Optional, Mapping
+from types import MappingProxyType
+from models.schema import Tool
+
+
+class ToolEntry:
+    """A registered tool, with its LLM function definition built once"""
+
+    __slots__ = (
+        "name", "description", "parameters", "function", "intents", "module", "function_name",
+        "response_template", "cache_ttl", "llm_view", "llm_definition"
+    )
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        parameters: Dict[str, Any],
+        function: Any = None,
+        intents: Optional[List[Dict[str, Any]]] = None,
+        module: Optional[str] = None,
+        function_name: Optional[str] = None,
+        response_template: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        llm_view: Optional[Dict[str, Any]] = None
+    ):
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.function = function
+        self.intents = intents if intents is not None else []
+        self.module = module
+        self.function_name = function_name
+        self.response_template = response_template
+        self.cache_ttl = cache_ttl
+        self.llm_view = llm_view
+        # Shared by every request's tool block instead of being rebuilt each time
+        self.llm_definition = {
+            "type": "function",
+            "function": {"name": name, "description": description, "parameters": parameters}
+        }
+
+    @classmethod
+    def from_tool(cls, tool: Tool) -> "ToolEntry":
+        """Build the registry entry of a validated Tool"""
+        return cls(
+            tool.name, tool.description, tool.parameters, tool.function, tool.intents, tool.module,
+            tool.function_name, tool.response_template, tool.cache_ttl, tool.llm_view
+        )
+
+    def __repr__(self) -> str:
+        return f"ToolEntry(name={self.name!r})"
+
+
+class RegistrySnapshot:
+    """
+    One published version of the tool registry. Never modified: a change to the
+    registry publishes a new snapshot, so readers need no lock.
+    """
+
+    __slots__ = ("version", "tools", "owner", "_llm_tools")
+
+    def __init__(self, version: int, tools: Dict[str, ToolEntry], owner: Any = None):
+        self.version = version
+        self.tools: Mapping[str, ToolEntry] = MappingProxyType(tools)
+        # Registry that published the snapshot
+        self.owner = owner
+        self._llm_tools: Optional[List[Dict[str, Any]]] = None
+
+    @property
+    def llm_tools(self) -> List[Dict[str, Any]]:
+        """Tool definitions for the LLM, built on first use and shared by every request"""
+        if self._llm_tools is None:
+            self._llm_tools = [tool.llm_definition for tool in self.tools.values()]
+        return self._llm_tools
+
+    def __repr__(self) -> str:
+        return f"RegistrySnapshot(version={self.version}, tools={len(self.tools)})"
+
+
+class ToolCallRecord:
+    """A tool call executed during a turn, with its full result"""
+
+    __slots__ = ("name", "arguments", "result")
+
+    def __init__(self, name: str, arguments: Optional[Dict[str, Any]], result: Any):
+        self.name = name
+        self.arguments = arguments
+        self.result = result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Shape returned to clients under 'tool_calls'"""
+        return {"name": self.name, "arguments": self.arguments, "result": self.result}
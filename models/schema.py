@@ -9,11 +9,27 @@ class Message(BaseModel):
 class AgentRequest(BaseModel):
     """Request model for agent chat endpoint"""
     messages: List[Message] = Field(..., description="List of message objects")
+    skip_summary: Optional[bool] = Field(None, description="Answer from a tool's response template instead of a second LLM round when possible (defaults to the server setting)")
 
 class SimpleAgentRequest(BaseModel):
     """Simplified request model for agent chat endpoint that takes just the message content"""
     message: str = Field(..., description="The user's message content")
+    skip_summary: Optional[bool] = Field(None, description="Answer from a tool's response template instead of a second LLM round when possible (defaults to the server setting)")
     
+class JobRequest(AgentRequest):
+    """Request model for running an agent request in the background"""
+    callback_url: Optional[str] = Field(None, description="URL the finished job is posted to")
+
+class JobResponse(BaseModel):
+    """Response model describing a background job"""
+    job_id: str = Field(..., description="Identifier to poll with GET /jobs/{job_id}")
+    status: str = Field(..., description="One of 'queued', 'running', 'succeeded' or 'failed'")
+    result: Optional[Dict[str, Any]] = Field(None, description="Agent response once the job has succeeded")
+    error: Optional[str] = Field(None, description="Error message if the job failed")
+    created_at: float = Field(..., description="Submission time (Unix seconds)")
+    started_at: Optional[float] = Field(None, description="Time a worker picked the job up")
+    finished_at: Optional[float] = Field(None, description="Time the job finished")
+
 class AgentResponse(BaseModel):
     """Response model for agent chat endpoint"""
     response: Dict[str, Any] = Field(..., description="Agent response with potential tool calls")
@@ -35,3 +51,30 @@ class Tool(BaseModel):
     description: str = Field(..., description="Description of the tool")
     parameters: Dict[str, Any] = Field(..., description="Parameters schema for the tool")
     function: Any = Field(None, description="Function to call when tool is invoked")
+    intents: List[Dict[str, Any]] = Field(default_factory=list, description="Patterns that map a user message directly to this tool, skipping the LLM")
+    module: Optional[str] = Field(None, description="Module providing the function, imported on the first call when function is not set")
+    function_name: Optional[str] = Field(None, description="Name of the function in module")
+    response_template: Optional[str] = Field(None, description="Format string over the result used as the final answer, skipping the summary round")
+    cache_ttl: Optional[float] = Field(None, description="Seconds a result is reused for identical arguments, across workers when a shared cache is configured")
+    llm_view: Optional[Dict[str, Any]] = Field(None, description="Compact form of the result sent back to the LLM (fields, rename, round, parse_numbers, max_chars)")
+
+class ToolDefinition(BaseModel):
+    """Request model for adding or replacing a tool at runtime"""
+    description: str = Field(..., description="Description of the tool")
+    parameters: Dict[str, Any] = Field(..., description="Parameters schema for the tool")
+    module: str = Field(..., description="Importable module providing the function, e.g. 'tools.weather'")
+    function_name: str = Field(..., description="Name of the function in module")
+    reload: bool = Field(False, description="Re-import the module if it is already imported, to pick up changed code")
+    intents: List[Dict[str, Any]] = Field(default_factory=list, description="Patterns that map a user message directly to this tool, skipping the LLM")
+    response_template: Optional[str] = Field(None, description="Format string over the result used as the final answer, skipping the summary round")
+    cache_ttl: Optional[float] = Field(None, description="Seconds a result is reused for identical arguments")
+    llm_view: Optional[Dict[str, Any]] = Field(None, description="Compact form of the result sent back to the LLM")
+
+class SessionCreateRequest(BaseModel):
+    """Request model for creating a server-side session"""
+    system_prompt: Optional[str] = Field(None, description="System prompt for the conversation (defaults to the server's)")
+
+class SessionResponse(BaseModel):
+    """Response model describing a server-side session"""
+    session_id: str = Field(..., description="Identifier to send with later turns")
+    messages: List[Dict[str, Any]] = Field(default_factory=list, description="Full conversation history including tool calls")
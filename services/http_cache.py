@@ -0,0 +1,291 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from collections import OrderedDict
+from fnmatch import fnmatchcase
+import asyncio
+import hashlib
+import json
+import re
+import time
+from services.metrics import metrics
+from services.serialization import dumps_bytes, loads
+from services.shared_cache import CacheBackend, CacheUnavailable
+
+# Cache policies for the bundled tools' upstream calls, first match wins.
+# Times are in seconds: entries are fresh until soft_ttl, served stale while
+# being refreshed until hard_ttl, and served for another stale_if_error
+# seconds when the upstream is failing.
+DEFAULT_POLICIES = [
+    {"pattern": "*api.openweathermap.org/geo/*", "soft_ttl": 86400, "hard_ttl": 604800, "stale_if_error": 604800},
+    {"pattern": "*api.openweathermap.org/data/*", "soft_ttl": 300, "hard_ttl": 900, "stale_if_error": 3600},
+    {"pattern": "https://open.er-api.com/*", "soft_ttl": 600, "hard_ttl": 3600, "stale_if_error": 86400}
+]
+
+
+# Query parameters that carry credentials, e.g. OpenWeatherMap's appid
+_CREDENTIAL_PARAMS = re.compile(
+    r"([?&](?:appid|api_?key|apikey|key|token|access_token|secret|password|signature|sig)=)[^&#\s]*",
+    re.IGNORECASE
+)
+
+
+def redact_url(text: str) -> str:
+    """Mask the credential query parameters of the URLs in a text, for logs and errors"""
+    return _CREDENTIAL_PARAMS.sub(r"\1***", text)
+
+
+def shared_key(url: str) -> str:
+    """Shared cache key of a URL; hashed so credentials in the URL are not stored in the key"""
+    return "http:" + hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+class CachePolicy:
+    """Freshness rules for the URLs matching a template"""
+
+    def __init__(self, pattern: str, soft_ttl: float, hard_ttl: float, stale_if_error: float = 0):
+        """
+        Initialize a policy
+
+        Args:
+            pattern: URL template with shell-style wildcards, e.g., 'https://open.er-api.com/*'
+            soft_ttl: Seconds an entry is served without revalidation
+            hard_ttl: Seconds an entry may be served stale while it is refreshed
+            stale_if_error: Extra seconds past hard_ttl an entry may be served when the upstream fails
+        """
+        if hard_ttl < soft_ttl:
+            raise ValueError(f"hard_ttl must not be shorter than soft_ttl for '{pattern}'")
+        self.pattern = pattern
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.stale_if_error = stale_if_error
+
+    def matches(self, url: str) -> bool:
+        return fnmatchcase(url, self.pattern)
+
+
+def parse_policies(spec: Optional[str]) -> List[CachePolicy]:
+    """
+    Parse cache policies from a JSON list of objects
+
+    Args:
+        spec: JSON list with pattern, soft_ttl, hard_ttl and stale_if_error keys;
+              the default policies are used when empty
+
+    Returns:
+        List of cache policies
+    """
+    entries = json.loads(spec) if spec else DEFAULT_POLICIES
+    return [CachePolicy(**entry) for entry in entries]
+
+
+class CacheEntry:
+    """A cached response body"""
+
+    __slots__ = ("value", "stored_at", "size")
+
+    def __init__(self, value: Any, stored_at: float, size: int):
+        self.value = value
+        self.stored_at = stored_at
+        self.size = size
+
+
+class ResponseCache:
+    """
+    Bounded in-memory cache for upstream JSON responses with
+    stale-while-revalidate and stale-if-error semantics.
+    Concurrent requests for the same missing or stale URL share one fetch.
+    """
+
+    def __init__(
+        self,
+        policies: List[CachePolicy],
+        max_entries: int = 1024,
+        max_bytes: int = 8 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+        shared: Optional[CacheBackend] = None,
+        under_pressure: Optional[Callable[[str], bool]] = None
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            policies: Cache policies, first match wins; URLs matching none are not cached
+            max_entries: Maximum number of cached responses
+            max_bytes: Maximum total size of cached responses (as serialized JSON)
+            clock: Time source in seconds
+            shared: Cache shared with the other workers, consulted before
+                    fetching and updated after every fetch (optional)
+            under_pressure: Tells whether a URL's provider is low on quota; stale
+                            entries are then served without a refresh (optional)
+        """
+        self.policies = policies
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.shared = shared
+        self.under_pressure = under_pressure
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.total_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def policy_for(self, url: str) -> Optional[CachePolicy]:
+        """Get the policy of a URL, or None if it should not be cached"""
+        for policy in self.policies:
+            if policy.matches(url):
+                return policy
+        return None
+
+    async def get(self, url: str, fetch: Callable[[str], Awaitable[Any]]) -> Any:
+        """
+        Get the response for a URL, from the cache when allowed
+
+        Args:
+            url: URL to fetch
+            fetch: Coroutine function that fetches the URL from the upstream
+
+        Returns:
+            Response body
+        """
+        policy = self.policy_for(url)
+        if policy is None:
+            return await fetch(url)
+
+        entry = self.entries.get(url)
+        if self.shared is not None and (entry is None or self.clock() - entry.stored_at >= policy.soft_ttl):
+            # Another worker may already have a fresher copy
+            entry = await self._load_shared(url, entry)
+        if entry is not None:
+            age = self.clock() - entry.stored_at
+            if age < policy.soft_ttl:
+                self.entries.move_to_end(url)
+                metrics.increment("http_cache.hits")
+                return entry.value
+            if self.under_pressure is not None and age < policy.hard_ttl + policy.stale_if_error and self.under_pressure(url):
+                # Keep the remaining quota for URLs with nothing cached
+                self.entries.move_to_end(url)
+                metrics.increment("http_cache.quota_stale")
+                return entry.value
+            if age < policy.hard_ttl:
+                # Serve the stale body now and refresh it in the background
+                self.entries.move_to_end(url)
+                metrics.increment("http_cache.stale")
+                if url not in self._inflight:
+                    metrics.increment("http_cache.refreshes")
+                    self._start_fetch(url, fetch)
+                return entry.value
+
+        metrics.increment("http_cache.misses")
+        future = self._inflight.get(url) or self._start_fetch(url, fetch)
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            entry = self.entries.get(url)
+            if entry is not None and self.clock() - entry.stored_at < policy.hard_ttl + policy.stale_if_error:
+                metrics.increment("http_cache.stale_if_error")
+                print(f"Serving stale response for {redact_url(url)} after an upstream error")
+                return entry.value
+            raise
+
+    def _start_fetch(self, url: str, fetch: Callable[[str], Awaitable[Any]]) -> asyncio.Future:
+        future = asyncio.ensure_future(self._fetch_and_store(url, fetch))
+        future.add_done_callback(self._log_fetch_error)
+        self._inflight[url] = future
+        return future
+
+    async def _fetch_and_store(self, url: str, fetch: Callable[[str], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch(url)
+            self.put(url, value)
+            if self.shared is not None:
+                await self._store_shared(url, value)
+            return value
+        finally:
+            self._inflight.pop(url, None)
+
+    def _log_fetch_error(self, future: asyncio.Future) -> None:
+        # Also marks the exception as retrieved for refreshes nobody awaits
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Cached fetch failed: {redact_url(str(future.exception()))}")
+
+    async def _load_shared(self, url: str, entry: Optional[CacheEntry]) -> Optional[CacheEntry]:
+        """Replace the local entry with the shared one if that is fresher"""
+        try:
+            raw = await self.shared.run(self.shared.get, shared_key(url))
+        except CacheUnavailable:
+            return entry
+        except Exception as e:
+            metrics.increment("shared_cache.errors")
+            print(f"Shared cache unavailable, using the local cache only: {str(e)}")
+            return entry
+        if raw is None:
+            return entry
+
+        stored = loads(raw)
+        age = max(0.0, time.time() - stored["stored_at"])
+        if entry is not None and self.clock() - entry.stored_at <= age:
+            return entry
+        metrics.increment("http_cache.shared_hits")
+        self._store_local(url, stored["value"], self.clock() - age)
+        return self.entries.get(url)
+
+    def put(self, url: str, value: Any) -> None:
+        """
+        Store a response body locally, evicting least recently used entries to stay in bounds
+
+        Args:
+            url: URL the body was fetched from
+            value: JSON-serializable response body
+        """
+        policy = self.policy_for(url)
+        if policy is None:
+            return
+        self._store_local(url, value, self.clock())
+
+    async def _store_shared(self, url: str, value: Any) -> None:
+        """Share a response body with the other workers"""
+        policy = self.policy_for(url)
+        if policy is None:
+            return
+        data = dumps_bytes({"value": value, "stored_at": time.time()})
+        try:
+            await self.shared.run(self.shared.set, shared_key(url), data, policy.hard_ttl + policy.stale_if_error)
+        except CacheUnavailable:
+            pass
+        except Exception as e:
+            metrics.increment("shared_cache.errors")
+            print(f"Could not write to the shared cache: {str(e)}")
+
+    def _store_local(self, url: str, value: Any, stored_at: float) -> None:
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+
+        self._discard(url)
+        self.entries[url] = CacheEntry(value, stored_at, size)
+        self.total_bytes += size
+
+        while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._discard(oldest)
+            metrics.increment("http_cache.evictions")
+
+    def _discard(self, url: str) -> None:
+        entry = self.entries.pop(url, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+    def clear(self) -> None:
+        """Drop all cached responses"""
+        self.entries.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache size and hit counters"""
+        hits = metrics.counter("http_cache.hits")
+        stale = metrics.counter("http_cache.stale")
+        misses = metrics.counter("http_cache.misses")
+        total = hits + stale + misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "hit_rate": (hits + stale) / total if total else 0.0
+        }
@@ -0,0 +1,220 @@
+from typing import Dict, Any, List, Optional
+import re
+from services.mcp_service import MCPServer
+from services.metrics import metrics
+
+# Characters stripped from the end of a message before matching
+TRAILING_PUNCTUATION = "?!. "
+
+
+class IntentPattern:
+    """A compiled pattern that maps a user message to a tool call"""
+
+    def __init__(
+        self,
+        tool_name: str,
+        pattern: str,
+        template: str,
+        confidence: float = 0.9,
+        arguments: Optional[Dict[str, Any]] = None,
+        parameters: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Initialize an intent pattern
+
+        Args:
+            tool_name: Name of the tool the pattern calls
+            pattern: Regular expression matched against the whole message;
+                named groups become tool arguments
+            template: Format string rendered with the tool result to answer the user
+            confidence: How sure we are that a match means this tool call (0-1)
+            arguments: Fixed arguments added to the captured ones
+            parameters: Parameters schema of the tool, used to convert captured values
+        """
+        self.tool_name = tool_name
+        self.regex = re.compile(pattern, re.IGNORECASE)
+        self.template = template
+        self.confidence = confidence
+        self.arguments = arguments or {}
+        self.properties = (parameters or {}).get("properties", {})
+
+    def match(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Match a normalized message against the pattern
+
+        Args:
+            text: Normalized user message
+
+        Returns:
+            Tool arguments if the whole message matches, otherwise None
+        """
+        found = self.regex.fullmatch(text)
+        if not found:
+            return None
+
+        arguments = dict(self.arguments)
+        for name, value in found.groupdict().items():
+            if value is None:
+                continue
+            arguments[name] = self._convert(name, value.strip())
+        return arguments
+
+    def _convert(self, name: str, value: str) -> Any:
+        """Convert a captured string to the type declared in the tool schema"""
+        declared = self.properties.get(name, {}).get("type")
+        if declared == "number":
+            return float(value)
+        if declared == "integer":
+            return int(value)
+        return value
+
+
+class IntentMatch:
+    """Result of matching a message against the registered patterns"""
+
+    def __init__(self, intent: IntentPattern, arguments: Dict[str, Any]):
+        self.intent = intent
+        self.arguments = arguments
+
+    @property
+    def tool_name(self) -> str:
+        return self.intent.tool_name
+
+    @property
+    def confidence(self) -> float:
+        return self.intent.confidence
+
+
+def normalize_message(text: str) -> str:
+    """Collapse whitespace and strip trailing punctuation from a message"""
+    return " ".join(text.split()).rstrip(TRAILING_PUNCTUATION)
+
+
+class IntentRouter:
+    """
+    Rule-based pre-router that answers trivial tool requests without the LLM.
+    Messages matching a high-confidence pattern are sent straight to the tool
+    and the answer is rendered from a template; anything else falls back to the LLM.
+    """
+
+    def __init__(self, min_confidence: float = 0.8):
+        """
+        Initialize the router with no patterns
+
+        Args:
+            min_confidence: Matches below this confidence fall back to the LLM
+        """
+        self.min_confidence = min_confidence
+        self.intents: List[IntentPattern] = []
+        metrics.register_collector("fast_path", self.stats)
+
+    def register(
+        self,
+        tool_name: str,
+        pattern: str,
+        template: str,
+        confidence: float = 0.9,
+        arguments: Optional[Dict[str, Any]] = None,
+        parameters: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Register a pattern for a tool
+
+        Args:
+            tool_name: Name of the tool the pattern calls
+            pattern: Regular expression matched against the whole message
+            template: Format string rendered with the tool result
+            confidence: Confidence of the pattern (0-1)
+            arguments: Fixed arguments added to the captured ones
+            parameters: Parameters schema of the tool
+        """
+        self.intents.append(IntentPattern(tool_name, pattern, template, confidence, arguments, parameters))
+
+    def load_tools(self, mcp_server: MCPServer) -> None:
+        """
+        Register the intents declared by every tool in the MCP server
+
+        Args:
+            mcp_server: MCP Server whose tools declare intents
+        """
+        self.intents = []
+        for name, tool in mcp_server.tools.items():
+            for intent in tool.intents:
+                self.register(
+                    name,
+                    intent["pattern"],
+                    intent["template"],
+                    confidence=intent.get("confidence", 0.9),
+                    arguments=intent.get("arguments"),
+                    parameters=tool.parameters
+                )
+        print(f"Loaded {len(self.intents)} fast-path intents")
+
+    def match(self, text: str) -> Optional[IntentMatch]:
+        """
+        Find the most confident pattern matching a message
+
+        Args:
+            text: User message
+
+        Returns:
+            Best match, or None if no pattern matches
+        """
+        text = normalize_message(text)
+        best: Optional[IntentMatch] = None
+        for intent in self.intents:
+            if best is not None and intent.confidence <= best.confidence:
+                continue
+            try:
+                arguments = intent.match(text)
+            except ValueError:
+                continue
+            if arguments is not None:
+                best = IntentMatch(intent, arguments)
+        return best
+
+    async def handle(self, text: str, mcp_server: MCPServer) -> Optional[Dict[str, Any]]:
+        """
+        Answer a message through the fast path if possible
+
+        Args:
+            text: User message
+            mcp_server: MCP Server used to execute the tool
+
+        Returns:
+            Assistant response dictionary, or None if the LLM should handle the message
+        """
+        metrics.increment("fast_path.requests")
+
+        found = self.match(text)
+        if found is None or found.confidence < self.min_confidence:
+            metrics.increment("fast_path.misses")
+            return None
+
+        try:
+            result = await mcp_server.execute_tool(found.tool_name, found.arguments)
+            if isinstance(result, dict) and "error" in result:
+                raise ValueError(result["error"])
+            content = found.intent.template.format_map(result)
+        except Exception as e:
+            # Anything unexpected goes to the LLM, which can explain or recover
+            print(f"Fast path for '{found.tool_name}' fell back to the LLM: {str(e)}")
+            metrics.increment("fast_path.fallbacks")
+            return None
+
+        metrics.increment("fast_path.hits")
+        return {
+            "role": "assistant",
+            "content": content,
+            "tool_calls": [{"name": found.tool_name, "arguments": found.arguments, "result": result}]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Get fast-path counters and the hit rate"""
+        requests = metrics.counter("fast_path.requests")
+        hits = metrics.counter("fast_path.hits")
+        return {
+            "requests": requests,
+            "hits": hits,
+            "hit_rate": hits / requests if requests else 0.0
+        }
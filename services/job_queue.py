@@ -0,0 +1,384 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Sequence
+from urllib.parse import urlsplit
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import requests
+from services.metrics import metrics
+from services.serialization import dumps, dumps_bytes
+
+# Job states; queued and running jobs are picked up again after a restart
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at its limit"""
+
+
+def check_callback_url(url: str, allowed_hosts: Sequence[str] = ()) -> str:
+    """
+    Check that a callback URL may be posted to
+
+    Args:
+        url: Callback URL
+        allowed_hosts: Hosts callbacks may go to; when empty, any host whose
+                       addresses are public
+
+    Returns:
+        The URL's host name
+
+    Raises:
+        ValueError: If the URL is not http(s), its host is not allowed, or it
+                    is (or resolves to) a loopback, link-local or private address
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise ValueError("Callback URL must be an http or https URL")
+    if allowed_hosts:
+        if host not in allowed_hosts:
+            raise ValueError(f"Callback host '{host}' is not allowed")
+        return host
+    try:
+        addresses = [ipaddress.ip_address(host)]
+    except ValueError:
+        # Resolved when the callback is sent, by _check_callback_addresses
+        return host
+    _check_addresses(host, addresses)
+    return host
+
+
+def _check_addresses(host: str, addresses: List[Any]) -> None:
+    for address in addresses:
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"Callback host '{host}' is not a public address")
+
+
+def _check_callback_addresses(url: str, allowed_hosts: Sequence[str]) -> None:
+    """Resolve a callback's host and reject it if any of its addresses is not public (blocks; run in a thread)"""
+    host = check_callback_url(url, allowed_hosts)
+    if allowed_hosts:
+        return
+    infos = socket.getaddrinfo(host, urlsplit(url).port or None, proto=socket.IPPROTO_TCP)
+    _check_addresses(host, [ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos])
+
+
+class JobQueue:
+    """
+    Persistent queue of agent requests run by a bounded pool of background workers.
+    Job state is kept in SQLite so queued and interrupted jobs survive restarts;
+    results are fetched by id or posted to the job's callback URL.
+
+    Several servers may share the database. A worker claims a job atomically
+    and holds it under a lease it renews while the job runs; only jobs whose
+    lease has run out (their worker died) are queued again.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+        path: str,
+        workers: int = 2,
+        max_queued: int = 1000,
+        result_ttl: float = 86400,
+        callback_timeout: float = 10.0,
+        callback_retries: int = 2,
+        callback_backoff: float = 1.0,
+        callback_allowed_hosts: Sequence[str] = (),
+        lease_seconds: float = 60.0
+    ):
+        """
+        Initialize the queue
+
+        Args:
+            runner: Coroutine function that runs a job's request and returns its result
+            path: SQLite file holding the jobs
+            workers: Jobs run at the same time
+            max_queued: Jobs waiting to run before new ones are rejected
+            result_ttl: Seconds finished jobs are kept
+            callback_timeout: Timeout in seconds for posting a result to a callback URL
+            callback_retries: Retries for a failed callback
+            callback_backoff: Seconds before the first retry, doubled for each further one
+            callback_allowed_hosts: Hosts callbacks may go to; when empty, any public host
+            lease_seconds: Seconds a running job stays claimed without its worker renewing the lease
+        """
+        self.runner = runner
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.callback_timeout = callback_timeout
+        self.callback_retries = callback_retries
+        self.callback_backoff = callback_backoff
+        self.callback_allowed_hosts = tuple(host.lower() for host in callback_allowed_hosts)
+        self.lease_seconds = lease_seconds
+        # Identifies this process's claims in a database shared with other servers
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._pending: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._running = 0
+        self._db_lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, request TEXT NOT NULL, callback_url TEXT, "
+            "result TEXT, error TEXT, created_at REAL, started_at REAL, finished_at REAL, "
+            "owner TEXT, lease_until REAL)"
+        )
+        # Databases created before leases existed
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self._db.commit()
+
+    @property
+    def depth(self) -> int:
+        """Jobs waiting for a worker"""
+        return self._pending.qsize()
+
+    def start(self) -> int:
+        """
+        Start the workers and queue the jobs waiting in the database
+
+        Returns:
+            Number of jobs queued from the database
+        """
+        self.expire()
+        self.requeue_abandoned()
+        with self._db_lock:
+            rows = self._db.execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)).fetchall()
+        for (job_id,) in rows:
+            self._pending.put_nowait(job_id)
+        metrics.set_gauge("jobs.queue_depth", self.depth)
+
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        return len(rows)
+
+    def requeue_abandoned(self) -> List[str]:
+        """
+        Queue again the running jobs whose lease has run out; their worker
+        stopped, so they are run again from the start
+
+        Returns:
+            Ids of the requeued jobs
+        """
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status = ? AND (lease_until IS NULL OR lease_until < ?)",
+                (RUNNING, time.time())
+            ).fetchall()
+            requeued = []
+            for (job_id,) in rows:
+                # Guarded by the lease again in case its worker renewed it meanwhile
+                cursor = self._db.execute(
+                    "UPDATE jobs SET status = ?, owner = NULL, started_at = NULL, lease_until = NULL "
+                    "WHERE id = ? AND status = ? AND (lease_until IS NULL OR lease_until < ?)",
+                    (QUEUED, job_id, RUNNING, time.time())
+                )
+                if cursor.rowcount == 1:
+                    requeued.append(job_id)
+            self._db.commit()
+        if requeued:
+            metrics.increment("jobs.requeued", len(requeued))
+        return requeued
+
+    async def stop(self) -> None:
+        """Stop the workers; unfinished jobs stay queued for the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, request: Dict[str, Any], callback_url: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Store a job and queue it for the workers
+
+        Args:
+            request: JSON-serializable request passed to the runner
+            callback_url: URL the finished job is posted to (optional)
+
+        Returns:
+            The new job
+
+        Raises:
+            QueueFullError: If max_queued jobs are already waiting
+            ValueError: If the callback URL may not be posted to
+        """
+        if callback_url:
+            check_callback_url(callback_url, self.callback_allowed_hosts)
+        if self.depth >= self.max_queued:
+            metrics.increment("jobs.rejected")
+            raise QueueFullError(f"Job queue is full ({self.max_queued} jobs waiting)")
+
+        job_id = uuid.uuid4().hex
+        with self._db_lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, status, request, callback_url, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, QUEUED, dumps(request), callback_url, time.time())
+            )
+            self._db.commit()
+        self._pending.put_nowait(job_id)
+        metrics.increment("jobs.submitted")
+        metrics.set_gauge("jobs.queue_depth", self.depth)
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a job by id
+
+        Args:
+            job_id: Job identifier
+
+        Returns:
+            The job's state, timestamps and result or error, or None if it does not exist
+        """
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT id, status, result, error, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "result": json.loads(row[2]) if row[2] is not None else None,
+            "error": row[3],
+            "created_at": row[4],
+            "started_at": row[5],
+            "finished_at": row[6]
+        }
+
+    def expire(self) -> int:
+        """
+        Remove finished jobs older than the result TTL
+
+        Returns:
+            Number of jobs removed
+        """
+        with self._db_lock:
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (SUCCEEDED, FAILED, time.time() - self.result_ttl)
+            )
+            self._db.commit()
+        return cursor.rowcount
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._pending.get()
+            metrics.set_gauge("jobs.queue_depth", self.depth)
+            self._running += 1
+            try:
+                await self._run(job_id)
+                self.expire()
+                # Pick up the jobs of workers that died
+                for abandoned in self.requeue_abandoned():
+                    self._pending.put_nowait(abandoned)
+            except Exception as e:
+                print(f"Job {job_id} could not be processed: {str(e)}")
+            finally:
+                self._running -= 1
+
+    def _claim(self, job_id: str, started: float) -> Optional[tuple]:
+        """Claim a queued job for this worker; None if another worker got it first"""
+        with self._db_lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, owner = ?, started_at = ?, lease_until = ? WHERE id = ? AND status = ?",
+                (RUNNING, self.owner, started, started + self.lease_seconds, job_id, QUEUED)
+            )
+            self._db.commit()
+            if cursor.rowcount != 1:
+                return None
+            return self._db.execute(
+                "SELECT request, callback_url, created_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+
+    async def _renew_lease(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            with self._db_lock:
+                self._db.execute(
+                    "UPDATE jobs SET lease_until = ? WHERE id = ? AND owner = ?",
+                    (time.time() + self.lease_seconds, job_id, self.owner)
+                )
+                self._db.commit()
+
+    async def _run(self, job_id: str) -> None:
+        started = time.time()
+        row = self._claim(job_id, started)
+        if row is None:
+            return
+        request, callback_url, created_at = json.loads(row[0]), row[1], row[2]
+        metrics.observe("jobs.wait_ms", (started - created_at) * 1000)
+
+        result, error = None, None
+        renewal = asyncio.create_task(self._renew_lease(job_id))
+        try:
+            result = await self.runner(request)
+            status = SUCCEEDED
+        except Exception as e:
+            error = str(e)
+            status = FAILED
+            print(f"Job {job_id} failed: {error}")
+        finally:
+            renewal.cancel()
+        finished = time.time()
+        metrics.increment(f"jobs.{status}")
+        metrics.observe("jobs.run_ms", (finished - started) * 1000)
+
+        with self._db_lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL "
+                "WHERE id = ? AND owner = ? AND status = ?",
+                (status, dumps(result) if result is not None else None, error, finished, job_id, self.owner, RUNNING)
+            )
+            self._db.commit()
+        if cursor.rowcount != 1:
+            # The lease ran out and the job was requeued; its new run reports it
+            print(f"Job {job_id} finished after its lease was lost; result dropped")
+            return
+
+        if callback_url:
+            await self._post_callback(callback_url, self.get(job_id))
+
+    def _send_callback(self, url: str, body: bytes) -> None:
+        # Checked on every attempt, as the host may resolve differently by now
+        _check_callback_addresses(url, self.callback_allowed_hosts)
+        response = requests.post(
+            url, data=body, headers={"Content-Type": "application/json"},
+            timeout=self.callback_timeout, allow_redirects=False
+        )
+        response.raise_for_status()
+
+    async def _post_callback(self, url: str, job: Dict[str, Any]) -> bool:
+        """Post a finished job to its callback URL, retrying failed attempts"""
+        body = dumps_bytes(job)
+        for attempt in range(self.callback_retries + 1):
+            try:
+                await asyncio.to_thread(self._send_callback, url, body)
+                metrics.increment("jobs.callbacks_sent")
+                return True
+            except Exception as e:
+                print(f"Callback for job {job['job_id']} to {url} failed: {str(e)}")
+                if attempt < self.callback_retries:
+                    await asyncio.sleep(self.callback_backoff * 2 ** attempt)
+        metrics.increment("jobs.callbacks_failed")
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth, running jobs and pool size"""
+        return {"queued": self.depth, "running": self._running, "workers": self.workers}
+
+    def close(self) -> None:
+        """Close the job database"""
+        self._db.close()
@@ -0,0 +1,345 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import time
+import httpx
+import config
+
+
+# Errors of LiteLLM/OpenAI clients that mean the backend could not be reached
+# or did not answer in time; matched by name as LiteLLM is imported lazily
+UNREACHABLE_ERRORS = ("APIConnectionError", "APITimeoutError", "Timeout")
+
+
+def is_failover_error(error: Exception) -> bool:
+    """
+    Whether an error means the backend is unavailable (connection failure,
+    timeout or 5xx) rather than that the request itself was rejected
+    """
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    if any(cls.__name__ in UNREACHABLE_ERRORS for cls in type(error).__mro__):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status, int) and status >= 500
+
+
+class LLMBackend:
+    """
+    A single model server the router can send completions to.
+    Tracks in-flight requests and health state for load balancing.
+    """
+
+    def __init__(self, url: str, model: str, weight: float = 1.0):
+        """
+        Initialize a backend
+
+        Args:
+            url: Base URL of the Ollama server, e.g., 'http://localhost:11434'
+            model: Name of the model served by this backend
+            weight: Relative capacity of the backend (higher takes more traffic)
+        """
+        self.url = url.rstrip("/")
+        self.model = model
+        self.weight = max(float(weight), 0.01)
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.healthy = True
+
+    @property
+    def model_id(self) -> str:
+        """Model identifier in the format expected by LiteLLM"""
+        return f"ollama/{self.model}"
+
+    def is_available(self, now: float) -> bool:
+        """Whether the backend passed its last health check and is not ejected"""
+        return self.healthy and now >= self.ejected_until
+
+    def load(self) -> float:
+        """Outstanding requests normalized by weight, counting the one being placed"""
+        return (self.outstanding + 1) / self.weight
+
+    def status(self) -> Dict[str, Any]:
+        """Get a serializable view of the backend state"""
+        return {
+            "url": self.url,
+            "model": self.model,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "healthy": self.healthy,
+            "ejected": time.monotonic() < self.ejected_until,
+            "consecutive_failures": self.consecutive_failures
+        }
+
+
+def parse_backends(spec: str, default_url: str, default_model: str) -> List[LLMBackend]:
+    """
+    Parse a backend list from configuration
+
+    Accepts either a JSON list of objects with 'url', 'model' and 'weight' keys,
+    or a comma-separated list of 'url|model|weight' entries where model and weight
+    are optional. An empty spec yields the single default backend.
+
+    Args:
+        spec: Backend specification string
+        default_url: URL used when the spec is empty
+        default_model: Model used when an entry does not name one
+
+    Returns:
+        List of backends
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        return [LLMBackend(default_url, default_model)]
+
+    if spec.startswith("["):
+        entries = json.loads(spec)
+        return [
+            LLMBackend(entry["url"], entry.get("model") or default_model, entry.get("weight", 1.0))
+            for entry in entries
+        ]
+
+    backends = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        parts = entry.split("|")
+        url = parts[0]
+        model = parts[1] if len(parts) > 1 and parts[1] else default_model
+        weight = float(parts[2]) if len(parts) > 2 and parts[2] else 1.0
+        backends.append(LLMBackend(url, model, weight))
+    return backends
+
+
+def conversation_key(messages: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Derive a stable key for a conversation from its opening messages.
+    Clients resend the full history every turn, so the first messages
+    identify the conversation across requests.
+
+    Args:
+        messages: Conversation messages in LiteLLM format
+
+    Returns:
+        Hex digest identifying the conversation, or None for an empty list
+    """
+    if not messages:
+        return None
+    digest = hashlib.sha1()
+    for message in messages[:2]:
+        digest.update(str(message.get("role")).encode())
+        digest.update(b"\x00")
+        digest.update(str(message.get("content")).encode())
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class LLMRouter:
+    """
+    Routes completions across multiple LLM backends.
+    Picks the backend with the fewest outstanding requests (weighted),
+    ejects backends that keep failing, and fails over to the next one.
+    """
+
+    def __init__(
+        self,
+        backends: List[LLMBackend],
+        max_failures: int = 3,
+        ejection_seconds: float = 30.0,
+        affinity_slack: int = 2,
+        max_affinity_entries: int = 10000
+    ):
+        """
+        Initialize the router
+
+        Args:
+            backends: Backends to balance across
+            max_failures: Consecutive failures before a backend is ejected
+            ejection_seconds: How long an ejected backend is skipped
+            affinity_slack: Extra outstanding requests tolerated on a preferred backend
+            max_affinity_entries: Maximum number of remembered conversation affinities
+        """
+        if not backends:
+            raise ValueError("At least one LLM backend is required")
+        self.backends = backends
+        self.max_failures = max_failures
+        self.ejection_seconds = ejection_seconds
+        self.affinity_slack = affinity_slack
+        self.max_affinity_entries = max_affinity_entries
+        self._affinity: "OrderedDict[str, LLMBackend]" = OrderedDict()
+        self._health_task: Optional[asyncio.Task] = None
+
+    def candidates(self, preferred: Optional[LLMBackend] = None) -> List[LLMBackend]:
+        """
+        Order backends by how suitable they are for the next request
+
+        Available backends come first, least loaded first. The preferred backend is
+        moved to the front when it is available and not much busier than the least
+        loaded one. Unavailable backends are kept at the end as a last resort.
+
+        Args:
+            preferred: Backend to favour, e.g., the one holding the conversation's cache
+
+        Returns:
+            Backends in the order they should be tried
+        """
+        now = time.monotonic()
+        available = [b for b in self.backends if b.is_available(now)]
+        unavailable = [b for b in self.backends if not b.is_available(now)]
+        available.sort(key=lambda b: b.load())
+        unavailable.sort(key=lambda b: b.ejected_until)
+
+        if preferred is not None and preferred in available:
+            least = available[0].outstanding
+            if preferred.outstanding <= least + self.affinity_slack:
+                available.remove(preferred)
+                available.insert(0, preferred)
+
+        return available + unavailable
+
+    async def route(
+        self,
+        call: Callable[[LLMBackend], Awaitable[Any]],
+        affinity_key: Optional[str] = None,
+        preferred: Optional[LLMBackend] = None
+    ) -> Tuple[Any, LLMBackend]:
+        """
+        Run a request against the best backend, failing over when a backend is
+        unreachable, times out or answers with a 5xx
+
+        Args:
+            call: Coroutine function performing the request against a backend
+            affinity_key: Conversation key used to keep related requests on one backend
+            preferred: Backend to favour; overrides the remembered affinity
+
+        Returns:
+            Tuple of the call result and the backend that served it
+
+        Raises:
+            Exception: A client or 4xx error at once (another backend would reject
+                       the request too), else the last error if every backend failed
+        """
+        if preferred is None and affinity_key is not None:
+            preferred = self._affinity.get(affinity_key)
+
+        last_error: Optional[Exception] = None
+        for backend in self.candidates(preferred):
+            backend.outstanding += 1
+            try:
+                result = await call(backend)
+            except Exception as e:
+                if not is_failover_error(e):
+                    raise
+                last_error = e
+                self._record_failure(backend)
+                continue
+            finally:
+                backend.outstanding -= 1
+
+            self._record_success(backend)
+            if affinity_key is not None:
+                self._remember(affinity_key, backend)
+            return result, backend
+
+        raise last_error
+
+    def _record_failure(self, backend: LLMBackend) -> None:
+        """Count a failure and eject the backend after too many in a row"""
+        backend.consecutive_failures += 1
+        if backend.consecutive_failures >= self.max_failures:
+            backend.ejected_until = time.monotonic() + self.ejection_seconds
+            print(f"LLM backend '{backend.url}' ejected for {self.ejection_seconds:g}s")
+
+    def _record_success(self, backend: LLMBackend) -> None:
+        """Reset the failure count of a backend"""
+        backend.consecutive_failures = 0
+
+    def _remember(self, key: str, backend: LLMBackend) -> None:
+        """Store the backend serving a conversation, evicting the oldest entries"""
+        self._affinity[key] = backend
+        self._affinity.move_to_end(key)
+        while len(self._affinity) > self.max_affinity_entries:
+            self._affinity.popitem(last=False)
+
+    async def check_health(self, timeout: float = 2.0) -> None:
+        """
+        Probe every backend and update its health state
+
+        Args:
+            timeout: Timeout in seconds for each probe
+        """
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            results = await asyncio.gather(
+                *(client.get(f"{backend.url}/api/tags") for backend in self.backends),
+                return_exceptions=True
+            )
+
+        for backend, result in zip(self.backends, results):
+            healthy = not isinstance(result, Exception) and result.status_code < 500
+            if healthy and not backend.healthy:
+                print(f"LLM backend '{backend.url}' is healthy again")
+            backend.healthy = healthy
+            if healthy:
+                backend.consecutive_failures = 0
+                backend.ejected_until = 0.0
+
+    def start_health_checks(self, interval: float) -> None:
+        """
+        Start probing backends periodically in the background
+
+        Args:
+            interval: Seconds between health checks
+        """
+        if self._health_task is not None:
+            return
+
+        async def _loop():
+            while True:
+                try:
+                    await self.check_health()
+                except Exception as e:
+                    print(f"LLM health check failed: {str(e)}")
+                await asyncio.sleep(interval)
+
+        self._health_task = asyncio.create_task(_loop())
+
+    async def stop_health_checks(self) -> None:
+        """Stop the background health checks"""
+        if self._health_task is None:
+            return
+        self._health_task.cancel()
+        try:
+            await self._health_task
+        except asyncio.CancelledError:
+            pass
+        self._health_task = None
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Get the state of all backends"""
+        return [backend.status() for backend in self.backends]
+
+
+_router: Optional[LLMRouter] = None
+
+
+def get_router() -> LLMRouter:
+    """
+    Get the process-wide router, building it from configuration on first use
+
+    Returns:
+        LLMRouter instance
+    """
+    global _router
+    if _router is None:
+        _router = LLMRouter(
+            parse_backends(config.LLM_BACKENDS, config.LLM_API_BASE_URL, config.LLM_MODEL_NAME),
+            max_failures=config.LLM_MAX_FAILURES,
+            ejection_seconds=config.LLM_EJECTION_SECONDS
+        )
+    return _router
@@ -0,0 +1,220 @@
+from typing import Dict, Any, List, Optional, Callable
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import asyncio
+import heapq
+import itertools
+import time
+from services.metrics import metrics
+import config
+
+# Traffic class of the request being handled in the current task
+current_priority: ContextVar[Optional[str]] = ContextVar("current_priority", default=None)
+
+
+class _Waiter:
+    """A completion call waiting for a backend slot"""
+
+    __slots__ = ("finish_tag", "sequence", "traffic_class", "enqueued_at", "future")
+
+    def __init__(self, finish_tag: float, sequence: int, traffic_class: str, enqueued_at: float, future: asyncio.Future):
+        self.finish_tag = finish_tag
+        self.sequence = sequence
+        self.traffic_class = traffic_class
+        self.enqueued_at = enqueued_at
+        self.future = future
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.finish_tag, self.sequence) < (other.finish_tag, other.sequence)
+
+
+class CompletionScheduler:
+    """
+    Weighted fair queue in front of the LLM backends.
+    At most max_concurrent completions run at once. When calls have to wait,
+    each traffic class gets slots in proportion to its weight, so a burst of
+    bulk calls cannot crowd out interactive ones, and any call that has waited
+    longer than max_wait goes next so low-priority work is never starved.
+    """
+
+    def __init__(
+        self,
+        weights: Dict[str, float],
+        max_concurrent: int = 4,
+        default_class: Optional[str] = None,
+        max_wait: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the scheduler
+
+        Args:
+            weights: Share of backend slots per traffic class, e.g., {'interactive': 8, 'bulk': 1}
+            max_concurrent: Completions running at the same time
+            default_class: Class of calls without a known class (defaults to the heaviest)
+            max_wait: Seconds after which a waiting call is served before any other
+            clock: Time source in seconds
+        """
+        if not weights or min(weights.values()) <= 0:
+            raise ValueError("Every traffic class needs a positive weight")
+        self.weights = weights
+        self.max_concurrent = max_concurrent
+        self.default_class = default_class if default_class in weights else max(weights, key=weights.get)
+        self.max_wait = max_wait
+        self.clock = clock
+        self.active = 0
+        self._virtual_time = 0.0
+        self._last_finish = {name: 0.0 for name in weights}
+        self._waiting: List[_Waiter] = []
+        self._sequence = itertools.count()
+        self._dispatched = {name: 0 for name in weights}
+
+    def resolve(self, traffic_class: Optional[str]) -> str:
+        """Map a requested class to a configured one"""
+        return traffic_class if traffic_class in self.weights else self.default_class
+
+    async def acquire(self, traffic_class: Optional[str] = None) -> str:
+        """
+        Wait for a backend slot
+
+        Args:
+            traffic_class: Class of the call (defaults to the current request's class)
+
+        Returns:
+            The class the slot was granted to, to pass to release()
+        """
+        traffic_class = self.resolve(traffic_class or current_priority.get())
+        # Start-time fair queuing: a class's next call finishes 1/weight after its
+        # previous one, but never earlier than calls already being served
+        finish_tag = max(self._virtual_time, self._last_finish[traffic_class]) + 1 / self.weights[traffic_class]
+        self._last_finish[traffic_class] = finish_tag
+
+        enqueued_at = self.clock()
+        if self.active < self.max_concurrent and not self._waiting:
+            self._grant(traffic_class, finish_tag, enqueued_at)
+            return traffic_class
+
+        waiter = _Waiter(finish_tag, next(self._sequence), traffic_class, enqueued_at,
+                         asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiting, waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just before the cancellation; hand the slot on
+                self.release(traffic_class)
+            raise
+        return traffic_class
+
+    def release(self, traffic_class: str) -> None:
+        """Free a backend slot and wake the next waiting call"""
+        self.active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, traffic_class: Optional[str] = None):
+        """Hold a backend slot for the duration of a completion"""
+        granted = await self.acquire(traffic_class)
+        try:
+            yield granted
+        finally:
+            self.release(granted)
+
+    def _grant(self, traffic_class: str, finish_tag: float, enqueued_at: float) -> None:
+        self.active += 1
+        self._virtual_time = max(self._virtual_time, finish_tag - 1 / self.weights[traffic_class])
+        self._dispatched[traffic_class] += 1
+        metrics.observe(f"llm.queue_wait_ms.{traffic_class}", (self.clock() - enqueued_at) * 1000)
+
+    def _dispatch(self) -> None:
+        while self.active < self.max_concurrent and self._waiting:
+            # Drop calls that were cancelled while waiting
+            self._waiting = [waiter for waiter in self._waiting if not waiter.future.done()]
+            heapq.heapify(self._waiting)
+            if not self._waiting:
+                return
+
+            oldest = min(self._waiting, key=lambda waiter: waiter.enqueued_at)
+            if self.clock() - oldest.enqueued_at >= self.max_wait:
+                metrics.increment("llm.queue_aged")
+                self._waiting.remove(oldest)
+                heapq.heapify(self._waiting)
+                waiter = oldest
+            else:
+                waiter = heapq.heappop(self._waiting)
+            self._grant(waiter.traffic_class, waiter.finish_tag, waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    def status(self) -> Dict[str, Any]:
+        """Get running calls and per-class queue lengths"""
+        waiting = {name: 0 for name in self.weights}
+        for waiter in self._waiting:
+            if not waiter.future.done():
+                waiting[waiter.traffic_class] += 1
+        return {
+            "active": self.active,
+            "max_concurrent": self.max_concurrent,
+            "classes": {
+                name: {"weight": weight, "waiting": waiting[name], "dispatched": self._dispatched[name]}
+                for name, weight in self.weights.items()
+            }
+        }
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse traffic class weights from 'name:weight' entries, comma-separated"""
+    weights = {}
+    for entry in spec.split(","):
+        if entry.strip():
+            name, _, weight = entry.partition(":")
+            weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def parse_api_key_classes(spec: str) -> Dict[str, str]:
+    """Parse 'api_key:class' entries, comma-separated"""
+    classes = {}
+    for entry in spec.split(","):
+        if entry.strip():
+            key, _, traffic_class = entry.partition(":")
+            classes[key.strip()] = traffic_class.strip()
+    return classes
+
+
+def classify(requested: Optional[str], api_key: Optional[str], api_key_classes: Dict[str, str]) -> Optional[str]:
+    """
+    Choose the traffic class of a request
+
+    Args:
+        requested: Class asked for in the priority header (optional)
+        api_key: Client's API key (optional)
+        api_key_classes: Class assigned to each known API key
+
+    Returns:
+        The API key's class if it has one, else the requested class
+    """
+    if api_key and api_key in api_key_classes:
+        return api_key_classes[api_key]
+    return requested
+
+
+_scheduler: Optional[CompletionScheduler] = None
+
+
+def get_scheduler() -> Optional[CompletionScheduler]:
+    """
+    Get the process-wide scheduler, building it from configuration on first use
+
+    Returns:
+        CompletionScheduler instance, or None when LLM_MAX_CONCURRENCY is 0 (no limit)
+    """
+    global _scheduler
+    if _scheduler is None and config.LLM_MAX_CONCURRENCY > 0:
+        _scheduler = CompletionScheduler(
+            parse_weights(config.LLM_PRIORITY_WEIGHTS),
+            max_concurrent=config.LLM_MAX_CONCURRENCY,
+            default_class=config.LLM_DEFAULT_PRIORITY,
+            max_wait=config.LLM_PRIORITY_MAX_WAIT
+        )
+        metrics.register_collector("llm_scheduler", _scheduler.status)
+    return _scheduler
@@ -1,86 +1,540 @@
-from typing import List, Dict, Any
-import json
-import litellm
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
+import asyncio
+import hashlib
+import time
+from contextvars import ContextVar
+import httpx
 from models.schema import Message
+from models.internal import ToolEntry, ToolCallRecord
 from services.mcp_service import MCPServer
+from services.llm_router import LLMBackend, get_router, conversation_key
+from services.llm_scheduler import get_scheduler
+from services.metrics import metrics
+from services.result_shaping import shape_for_llm, estimate_tokens
+from services.serialization import dumps, loads
+from services.shared_cache import TieredCache, get_shared_backend
+from services.startup import LazyModule
 import config
 
-async def generate_response(messages: List[Message], mcp_server: MCPServer) -> Dict[str, Any]:
+# LiteLLM takes seconds to import, so it is loaded on first use
+# (or by the warm-up task started with the application)
+litellm = LazyModule("litellm")
+
+# Timings of the completion round running in the current task
+_round_timings: ContextVar[Optional[Dict[str, Any]]] = ContextVar("round_timings", default=None)
+
+# Completions shared by identical requests (COMPLETION_CACHE_TTL), created on first use
+_completion_cache: Optional[TieredCache] = None
+
+# Instruction for the summary round after tool calls
+SUMMARY_INSTRUCTION = "Based on the previous messages and tool results, provide a clear, concise, and user-friendly summary. Use natural language and avoid technical details unless necessary."
+
+def completion_options() -> Dict[str, Any]:
+    """
+    Get the extra options sent with every completion
+    
+    Returns:
+        Keyword arguments for litellm.acompletion
+    """
+    options = {"client": get_http_client()}
+    if config.LLM_KEEP_ALIVE:
+        # Keep the model loaded between bursts of traffic. LiteLLM's Ollama provider
+        # would put keep_alive into 'options', where Ollama ignores it.
+        options["extra_body"] = {"keep_alive": config.LLM_KEEP_ALIVE}
+    return options
+
+def stabilize_prefix(llm_messages: List[Dict[str, Any]]) -> None:
+    """
+    Put the summary instruction into the leading system message, in place
+    
+    With the instruction at a fixed position, both completion rounds and every
+    later turn share a byte-identical prompt prefix that the backend can reuse.
+    
+    Args:
+        llm_messages: Conversation in LiteLLM format
+    """
+    if llm_messages and llm_messages[0].get("role") == "system":
+        content = llm_messages[0].get("content") or ""
+        if not content.endswith(SUMMARY_INSTRUCTION):
+            llm_messages[0] = {"role": "system", "content": f"{content}\n\n{SUMMARY_INSTRUCTION}".lstrip()}
+    else:
+        llm_messages.insert(0, {"role": "system", "content": SUMMARY_INSTRUCTION})
+
+def stable_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Order tool definitions by name so the tool block does not depend on registration order"""
+    return sorted(tools, key=lambda tool: tool["function"]["name"])
+
+def record_completion_stats(completion: Any, round_name: str, started: float) -> None:
+    """
+    Record latency and token counts of a completion round
+    
+    Ollama reports only newly evaluated prompt tokens, so a falling
+    prompt token count on later rounds shows the prefix cache is being reused.
+    
+    Args:
+        completion: Completion returned by LiteLLM
+        round_name: Name of the round, e.g., 'tool_selection' or 'summary'
+        started: time.perf_counter() value taken before the call
+    """
+    metrics.observe(f"llm.{round_name}.latency_ms", (time.perf_counter() - started) * 1000)
+    usage = getattr(completion, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    if isinstance(prompt_tokens, int):
+        metrics.observe(f"llm.{round_name}.prompt_eval_count", prompt_tokens)
+    if isinstance(completion_tokens, int):
+        metrics.observe(f"llm.{round_name}.eval_count", completion_tokens)
+
+async def capture_backend_timings(response: httpx.Response) -> None:
+    """
+    HTTP response hook recording Ollama's prompt-eval and eval durations
+    
+    LiteLLM keeps only token counts in its response object, so the durations
+    are read from the raw backend response before LiteLLM parses it.
+    
+    Args:
+        response: Response received from the backend
+    """
+    if not response.request.url.path.endswith(("/api/generate", "/api/chat")):
+        return
+    # Streaming responses are left alone so tokens are not buffered here
+    if response.status_code >= 400 or "json" not in response.headers.get("content-type", "") \
+            or "ndjson" in response.headers.get("content-type", ""):
+        return
+    
+    await response.aread()
+    try:
+        data = response.json()
+    except ValueError:
+        return
+    
+    timings = {}
+    for key in ("prompt_eval_duration", "eval_duration", "load_duration"):
+        if isinstance(data.get(key), (int, float)):
+            # Ollama reports durations in nanoseconds
+            name = key.replace("_duration", "_ms")
+            timings[name] = data[key] / 1e6
+            metrics.observe(f"llm.{name}", timings[name])
+    for key in ("prompt_eval_count", "eval_count"):
+        if isinstance(data.get(key), int):
+            timings[key] = data[key]
+    
+    sink = _round_timings.get()
+    if sink is not None:
+        sink.update(timings)
+
+_http_client = None
+
+def get_http_client() -> Any:
+    """
+    Get the HTTP client LiteLLM uses for backend calls, with the timing hook installed
+    
+    Returns:
+        LiteLLM AsyncHTTPHandler shared by all completions
+    """
+    global _http_client
+    if _http_client is None:
+        from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+        _http_client = AsyncHTTPHandler(
+            timeout=config.LLM_REQUEST_TIMEOUT,
+            event_hooks={"response": [capture_backend_timings]}
+        )
+    return _http_client
+
+async def warm_up_model() -> None:
+    """
+    Load the model on every backend with a tiny completion
+    
+    In stable-prefix mode the warm-up sends the system prompt and tool block
+    used by real requests, so their prefix is already evaluated.
+    """
+    messages = [{"role": "system", "content": config.SYSTEM_PROMPT}, {"role": "user", "content": "hi"}]
+    if config.PROMPT_PREFIX_STABLE:
+        stabilize_prefix(messages)
+    
+    for backend in get_router().backends:
+        started = time.perf_counter()
+        try:
+            await litellm.acompletion(
+                model=backend.model_id,
+                messages=messages,
+                api_base=backend.url,
+                max_tokens=1,
+                **completion_options()
+            )
+            print(f"Warmed up '{backend.model}' on {backend.url} in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            print(f"Warm-up of '{backend.model}' on {backend.url} failed: {str(e)}")
+
+def to_plain(value: Any) -> Any:
+    """
+    Convert LiteLLM response objects to plain, JSON-serializable Python values
+    
+    Args:
+        value: Value that may contain LiteLLM/pydantic objects
+    
+    Returns:
+        The value built from dicts, lists and scalars only
+    """
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    if hasattr(value, "model_dump"):
+        return to_plain(value.model_dump())
+    return value
+
+def message_to_dict(message: Any) -> Dict[str, Any]:
+    """
+    Convert an assistant message from LiteLLM to a plain message dictionary
+    that can be stored and sent back to the LLM on a later turn
+    
+    Args:
+        message: Message object from a completion choice
+    
+    Returns:
+        Dictionary with role, content and tool calls (if any)
+    """
+    data = dict(message)
+    plain = {"role": data.get("role", "assistant"), "content": data.get("content")}
+    if data.get("tool_calls"):
+        plain["tool_calls"] = to_plain(data["tool_calls"])
+    return plain
+
+def tool_message_content(mcp_server: MCPServer, tool_name: str, result: Any) -> str:
+    """
+    Build the content of a tool message, in the tool's compact LLM view if it declares one
+    
+    Args:
+        mcp_server: MCP Server the tool is registered with
+        tool_name: Name of the tool that produced the result
+        result: Full result returned by the tool
+    
+    Returns:
+        JSON text sent to the LLM
+    """
+    tool = mcp_server.get_tool(tool_name)
+    view = tool.llm_view if isinstance(tool, ToolEntry) else None
+    content = shape_for_llm(result, view)
+    if view:
+        saved = estimate_tokens(dumps(result)) - estimate_tokens(content)
+        metrics.observe("llm.tool_result_tokens_saved", saved)
+        print(f"Shaped result of tool '{tool_name}' for the LLM: ~{saved} tokens saved")
+    return content
+
+def get_completion_cache() -> Optional[TieredCache]:
+    """Get the completion cache, or None if completions are not cached"""
+    global _completion_cache
+    if config.COMPLETION_CACHE_TTL <= 0:
+        return None
+    if _completion_cache is None:
+        _completion_cache = TieredCache("completion", get_shared_backend(), config.SHARED_CACHE_L1_SIZE)
+    return _completion_cache
+
+def completion_cache_key(model_id: str, llm_messages: List[Dict[str, Any]], options: Dict[str, Any]) -> str:
+    """Key of a completion request: the backend's model, the exact messages and the tool options"""
+    request = dumps({"model": model_id, "messages": to_plain(llm_messages), "options": options})
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+async def complete_round(
+    round_name: str,
+    timings: Dict[str, Any],
+    llm_messages: List[Dict[str, Any]],
+    options: Dict[str, Any],
+    affinity_key: Optional[str] = None,
+    preferred: Optional[LLMBackend] = None,
+    on_token: Optional[Callable[[str], Awaitable[None]]] = None
+) -> Tuple[Any, Optional[LLMBackend]]:
+    """
+    Run one completion round through the router, or answer it from the completion cache.
+    Calls wait for a backend slot in the scheduler under the current request's traffic class.
+    
+    Args:
+        round_name: Name of the round, e.g., 'tool_selection' or 'summary'
+        timings: Per-round timings of the turn, filled in by the backend response hook
+        llm_messages: Conversation sent to the LLM
+        options: Extra completion arguments, e.g., tools and tool_choice
+        affinity_key: Conversation key for backend affinity (optional)
+        preferred: Backend to try first (optional)
+        on_token: Coroutine function called with each piece of content as it is
+                  generated; the completion is streamed when set (optional)
+    
+    Returns:
+        Tuple of the assistant message as a plain dictionary and the backend that
+        produced it (the preferred backend when the message came from the cache)
+    """
+    cache = get_completion_cache()
+    if cache is not None:
+        # Backends may serve different models; look for an answer from any model
+        # the router would send this round to, in the order it would try them
+        for model_id in dict.fromkeys(backend.model_id for backend in get_router().candidates(preferred)):
+            cached = await cache.get(completion_cache_key(model_id, llm_messages, options))
+            if cached is not None:
+                metrics.increment(f"llm.{round_name}.cache_hits")
+                if on_token is not None and cached.get("content"):
+                    await on_token(cached["content"])
+                return cached, preferred
+    
+    scheduler = get_scheduler()
+    traffic_class = await scheduler.acquire() if scheduler is not None else None
+    try:
+        started = time.perf_counter()
+        _round_timings.set(timings.setdefault(round_name, {}))
+        completion, backend = await get_router().route(
+            lambda backend: stream_completion(backend, llm_messages, options, on_token) if on_token is not None
+            else litellm.acompletion(
+                model=backend.model_id,  # Format for Ollama models in LiteLLM
+                messages=llm_messages,
+                api_base=backend.url,
+                **options,
+                **completion_options()
+            ),
+            affinity_key=affinity_key,
+            preferred=preferred
+        )
+    finally:
+        if scheduler is not None:
+            scheduler.release(traffic_class)
+    record_completion_stats(completion, round_name, started)
+    
+    # Converted once; the rest of the turn works on the plain dictionary
+    message = message_to_dict(completion.choices[0].message)
+    if cache is not None:
+        await cache.set(completion_cache_key(backend.model_id, llm_messages, options), message, config.COMPLETION_CACHE_TTL)
+    return message, backend
+
+async def stream_completion(
+    backend: LLMBackend,
+    llm_messages: List[Dict[str, Any]],
+    options: Dict[str, Any],
+    on_token: Callable[[str], Awaitable[None]]
+) -> Any:
+    """
+    Run a streamed completion on a backend, passing content on as it arrives
+    
+    Args:
+        backend: Backend chosen by the router
+        llm_messages: Conversation sent to the LLM
+        options: Extra completion arguments, e.g., tools and tool_choice
+        on_token: Coroutine function called with each piece of content
+    
+    Returns:
+        The completion assembled from the streamed chunks
+    """
+    stream = await litellm.acompletion(
+        model=backend.model_id,
+        messages=llm_messages,
+        api_base=backend.url,
+        stream=True,
+        **options,
+        **completion_options()
+    )
+    chunks = []
+    async for chunk in stream:
+        chunks.append(chunk)
+        content = chunk.choices[0].delta.content if chunk.choices else None
+        if content:
+            await on_token(content)
+    return litellm.stream_chunk_builder(chunks, messages=llm_messages)
+
+def render_template_answer(mcp_server: MCPServer, executed_calls: List[ToolCallRecord]) -> Optional[str]:
+    """
+    Render the final answer from a tool's response template
+    
+    Only a turn with exactly one tool call that succeeded, made to a tool with
+    a response template, can be answered this way.
+    
+    Args:
+        mcp_server: MCP Server the tool is registered with
+        executed_calls: Tool calls of the turn with their results
+    
+    Returns:
+        The answer, or None if the LLM should phrase it
+    """
+    if len(executed_calls) != 1:
+        return None
+    call = executed_calls[0]
+    tool = mcp_server.get_tool(call.name)
+    template = tool.response_template if isinstance(tool, ToolEntry) else None
+    result = call.result
+    if not template or not isinstance(result, dict) or "error" in result:
+        return None
+    try:
+        return template.format_map(result)
+    except (KeyError, IndexError, ValueError, TypeError) as e:
+        print(f"Response template of tool '{call.name}' could not be rendered: {str(e)}")
+        return None
+
+async def generate_response(
+    messages: List[Message],
+    mcp_server: MCPServer,
+    skip_summary: Optional[bool] = None
+) -> Dict[str, Any]:
     """
     Generate a response from the LLM, handling potential tool calls
     
     Args:
         messages: List of message objects
         mcp_server: MCP Server instance for tool handling
-        
+        skip_summary: Answer from the tool's response template instead of a summary
+                      completion when possible (defaults to TEMPLATE_ANSWERS)
+    
     Returns:
         Dictionary containing the assistant's response and any tool calls/results
     """
     # Convert messages to the format expected by litellm
     llm_messages = [{"role": msg.role, "content": msg.content} for msg in messages]
     
+    try:
+        return await run_conversation(llm_messages, mcp_server, skip_summary)
+    except Exception as e:
+        return {"role": "assistant", "content": f"Error generating response: {str(e)}"}
+
+async def run_conversation(
+    llm_messages: List[Dict[str, Any]],
+    mcp_server: MCPServer,
+    skip_summary: Optional[bool] = None,
+    on_event: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+) -> Dict[str, Any]:
+    """
+    Run one assistant turn over a conversation, handling potential tool calls
+    
+    Every message produced during the turn (assistant tool calls, tool results and
+    the final answer) is appended to llm_messages, so callers that keep the list
+    can send it back unchanged on the next turn.
+    
+    Args:
+        llm_messages: Conversation in LiteLLM format, extended in place
+        mcp_server: MCP Server instance for tool handling
+        skip_summary: Answer from the tool's response template instead of a summary
+                      completion when possible (defaults to TEMPLATE_ANSWERS)
+        on_event: Coroutine function called with 'token', 'tool_call', 'tool_chunk' and
+                  'tool_result' events while the turn runs; completions are streamed when set (optional)
+    
+    Returns:
+        Dictionary containing the assistant's final response
+    
+    Raises:
+        Exception: If the LLM call fails; llm_messages is left unchanged
+        asyncio.CancelledError: If the turn is cancelled; llm_messages is left unchanged
+    """
+    stable = config.PROMPT_PREFIX_STABLE
+    if skip_summary is None:
+        skip_summary = config.TEMPLATE_ANSWERS
+    
     # Get available tools from MCP server
     tools = mcp_server.get_tools_for_llm()
+    if stable:
+        tools = stable_tools(tools)
+        stabilize_prefix(llm_messages)
+    
+    turn_start = len(llm_messages)
+    
+    timings = {}
+    executed_calls = []
+    on_token = None
+    if on_event is not None:
+        async def on_token(content: str) -> None:
+            await on_event({"type": "token", "content": content})
     
     try:
-        # Call the LLM with tool calling capabilities
-        completion = await litellm.acompletion(
-            model=f"ollama/{config.LLM_MODEL_NAME}",  # Format for Ollama models in LiteLLM
-            messages=llm_messages,
-            api_base=config.LLM_API_BASE_URL,
-            tools=tools,
-            tool_choice="auto"  # Let the model decide when to call tools
+        # Call the LLM with tool calling capabilities on the least loaded backend,
+        # preferring the one that served earlier turns of this conversation
+        response, backend = await complete_round(
+            "tool_selection",
+            timings,
+            llm_messages,
+            {
+                "tools": tools,
+                "tool_choice": "auto"  # Let the model decide when to call tools
+            },
+            affinity_key=conversation_key(llm_messages),
+            on_token=on_token
         )
         
-        response = completion.choices[0].message
-        
         # Process tool calls if present
-        if "tool_calls" in dict(response) and response["tool_calls"]:
+        if response.get("tool_calls"):
+            # Add the assistant's tool call turn to the conversation once
+            llm_messages.append(response)
+            
             for tool_call in response["tool_calls"]:
                 tool_name = tool_call["function"]["name"]
+                arguments = None
                 try:
                     # Parse tool call arguments
-                    arguments = json.loads(tool_call["function"]["arguments"])
+                    arguments = loads(tool_call["function"]["arguments"])
+                    if on_event is not None:
+                        await on_event({"type": "tool_call", "name": tool_name, "arguments": arguments})
                     
-                    # Execute the tool call
-                    tool_result = await mcp_server.execute_tool(tool_name, arguments)
+                    # Execute the tool call, forwarding the partial output of streaming tools
+                    if on_event is not None:
+                        async def on_chunk(chunk: Any, tool_name: str = tool_name) -> None:
+                            await on_event({"type": "tool_chunk", "name": tool_name, "chunk": chunk})
+                        tool_result = await mcp_server.execute_tool(tool_name, arguments, on_chunk=on_chunk)
+                    else:
+                        tool_result = await mcp_server.execute_tool(tool_name, arguments)
                     
-                    # Add tool result to the conversation
-                    llm_messages.append(response)
+                    # Add the compact form of the result to the conversation
                     llm_messages.append({
                         "role": "tool",
                         "tool_call_id": tool_call["id"],
                         "name": tool_name,
-                        "content": json.dumps(tool_result)
+                        "content": tool_message_content(mcp_server, tool_name, tool_result)
                     })
-                    
+                
                 except Exception as e:
                     # Handle tool execution errors
                     error_message = f"Error executing tool {tool_name}: {str(e)}"
+                    tool_result = {"error": error_message}
                     llm_messages.append({
                         "role": "tool",
                         "tool_call_id": tool_call["id"],
                         "name": tool_name,
-                        "content": json.dumps({"error": error_message})
+                        "content": dumps(tool_result)
                     })
+                
+                # The client gets the full result, whatever the LLM was shown
+                executed_calls.append(ToolCallRecord(tool_name, arguments, tool_result))
+                if on_event is not None:
+                    await on_event({"type": "tool_result", "name": tool_name, "result": tool_result})
             
-            # Add a system message to instruct the LLM to provide a user-friendly summary
-            llm_messages.append({
-                "role": "system",
-                "content": "Based on the previous messages and tool results, provide a clear, concise, and user-friendly summary. Use natural language and avoid technical details unless necessary."
-            })
-            
-            # Get a new response after tool calls
-            final_completion = await litellm.acompletion(
-                model=f"ollama/{config.LLM_MODEL_NAME}",  # Format for Ollama models in LiteLLM
-                messages=llm_messages,
-                api_base=config.LLM_API_BASE_URL
-            )
-            
-            return dict(final_completion.choices[0].message)
+            # A single templated call can be answered without the summary round
+            answer = render_template_answer(mcp_server, executed_calls) if skip_summary else None
+            if answer is not None:
+                metrics.increment("llm.summary_skipped")
+                response = {"role": "assistant", "content": answer}
+                if on_token is not None:
+                    await on_token(answer)
+            else:
+                if stable:
+                    # Same tool block as the first round so the prompt prefix is unchanged;
+                    # the summary instruction already sits in the system prompt
+                    summary_options = {"tools": tools, "tool_choice": "none"}
+                else:
+                    # Add a system message to instruct the LLM to provide a user-friendly summary
+                    llm_messages.append({
+                        "role": "system",
+                        "content": SUMMARY_INSTRUCTION
+                    })
+                    summary_options = {}
+                
+                # Get a new response after tool calls, from the same backend when possible
+                # so its prompt cache for this conversation is still warm
+                response, _ = await complete_round(
+                    "summary", timings, llm_messages, summary_options, preferred=backend, on_token=on_token
+                )
         
-        # Return the original response if no tool calls
-        return dict(response)
+        llm_messages.append(response)
+        # A copy, so the extra keys below stay out of the stored history
+        result = dict(response)
+        if executed_calls:
+            result["tool_calls"] = [call.to_dict() for call in executed_calls]
+        if any(timings.values()):
+            # Backend prompt-eval vs. eval timings per round, to check prefix reuse
+            result["timings"] = timings
+        return result
     
-    except Exception as e:
-        return {"role": "assistant", "content": f"Error generating response: {str(e)}"}
+    except (Exception, asyncio.CancelledError):
+        # Leave the conversation as it was so a failed or cancelled turn can be retried
+        del llm_messages[turn_start:]
+        raise
@@ -0,0 +1,207 @@
+"""
+Event loop lag and blocking-callback monitor.
+
+A background task measures how late its timer fires (loop lag), and every
+callback the loop runs is timed at the same hook asyncio's debug mode uses for
+slow_callback_duration, without the cost of full debug mode. Callbacks that
+block longer than the threshold are attributed to the tool or endpoint the
+task was running, from the profiler's tags.
+"""
+from typing import Dict, Any, List, Optional, Iterator, Callable
+from collections import deque
+from contextlib import contextmanager
+import asyncio
+import time
+from services import profiler as profiling
+from services.metrics import metrics
+
+_original_run = asyncio.events.Handle._run
+_monitors: List["LoopMonitor"] = []
+
+
+def _timed_run(handle: asyncio.events.Handle) -> None:
+    """Handle._run, timed while monitors are installed"""
+    profiling.last_tags = None
+    started = time.perf_counter()
+    _original_run(handle)
+    elapsed = time.perf_counter() - started
+    for monitor in _monitors:
+        if elapsed >= monitor.slow_callback_duration and (monitor.loop is None or monitor.loop is handle._loop):
+            monitor.record_slow_callback(handle, elapsed)
+
+
+class LoopBlockedError(AssertionError):
+    """A tool blocked the event loop for longer than allowed"""
+
+
+class LoopMonitor:
+    """
+    Measures event loop lag and records the callbacks that block the loop.
+    Offenders are keyed by the tool ('tool:get_weather'), else the endpoint
+    ('endpoint:POST /chat'), else the coroutine or callback that ran.
+    """
+
+    def __init__(
+        self,
+        slow_callback_duration: float = 0.1,
+        lag_interval: float = 0.1,
+        max_recent: int = 50,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        clock: Callable[[], float] = time.perf_counter
+    ):
+        """
+        Initialize the monitor
+
+        Args:
+            slow_callback_duration: Seconds a callback may run before it counts as blocking
+            lag_interval: Seconds between lag measurements
+            max_recent: Blocking stretches kept for the report
+            loop: Loop whose callbacks are timed (defaults to the loop running start();
+                  None until then means every loop)
+            clock: Time source of the lag measurements
+        """
+        self.slow_callback_duration = slow_callback_duration
+        self.lag_interval = lag_interval
+        self.loop = loop
+        self.clock = clock
+        self.offenders: Dict[str, Dict[str, float]] = {}
+        self.recent: deque = deque(maxlen=max_recent)
+        self.slow_callbacks = 0
+        self._lag_task: Optional[asyncio.Task] = None
+
+    def install(self) -> None:
+        """Start timing callbacks"""
+        if self in _monitors:
+            return
+        _monitors.append(self)
+        asyncio.events.Handle._run = _timed_run
+
+    def uninstall(self) -> None:
+        """
+        Stop timing callbacks; the original Handle._run is restored with the
+        last monitor, unless something else has wrapped it since
+        """
+        if self in _monitors:
+            _monitors.remove(self)
+        if not _monitors and asyncio.events.Handle._run is _timed_run:
+            asyncio.events.Handle._run = _original_run
+
+    @staticmethod
+    def attribute(handle: asyncio.events.Handle) -> Dict[str, Any]:
+        """Tags and offender name of a callback that just ran"""
+        callback = handle._callback
+        task = getattr(callback, "__self__", None)
+        tags = profiling.last_tags
+        if not tags and isinstance(task, asyncio.Task):
+            tags = profiling._task_tags.get(task)
+        tags = {name: profiling.tag_value(value) for name, value in (tags or {}).items()}
+
+        if "tool" in tags:
+            offender = f"tool:{tags['tool']}"
+        elif "endpoint" in tags:
+            offender = f"endpoint:{tags['endpoint']}"
+        elif isinstance(task, asyncio.Task):
+            coro = task.get_coro()
+            offender = f"task:{getattr(coro, '__qualname__', task.get_name())}"
+        else:
+            offender = f"callback:{getattr(callback, '__qualname__', repr(callback))}"
+        return {"offender": offender, **tags}
+
+    def record_slow_callback(self, handle: asyncio.events.Handle, elapsed: float) -> None:
+        """Count a callback that blocked the loop"""
+        record = {**self.attribute(handle), "ms": round(elapsed * 1000, 1), "at": time.time()}
+        stats = self.offenders.get(record["offender"])
+        if stats is None:
+            stats = self.offenders[record["offender"]] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+        stats["count"] += 1
+        stats["total_ms"] += record["ms"]
+        stats["max_ms"] = max(stats["max_ms"], record["ms"])
+        self.recent.append(record)
+        self.slow_callbacks += 1
+        metrics.increment("loop.slow_callbacks")
+        metrics.observe("loop.slow_callback_ms", record["ms"])
+        print(f"Event loop blocked for {record['ms']:.0f} ms by {record['offender']}")
+
+    async def _measure_lag(self) -> None:
+        while True:
+            expected = self.clock() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            lag = max(0.0, self.clock() - expected)
+            metrics.observe("loop.lag_ms", lag * 1000)
+            metrics.set_gauge("loop.lag_ms", lag * 1000)
+
+    def start(self) -> None:
+        """Time the running loop's callbacks and measure its lag in the background"""
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        # asyncio's own debug mode reports at its threshold too; keep them in step
+        if loop.get_debug():
+            self.slow_callback_duration = loop.slow_callback_duration
+        self.install()
+        if self._lag_task is None:
+            self._lag_task = asyncio.create_task(self._measure_lag())
+
+    async def stop(self) -> None:
+        """Stop measuring"""
+        self.uninstall()
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+
+    def check(self, max_block_ms: Optional[float] = None, tools_only: bool = True) -> None:
+        """
+        Fail if the loop was blocked for too long
+
+        Args:
+            max_block_ms: Longest stretch allowed (defaults to the slow callback threshold)
+            tools_only: Only count stretches attributed to a tool
+
+        Raises:
+            LoopBlockedError: Listing the offenders over the limit
+        """
+        limit = self.slow_callback_duration * 1000 if max_block_ms is None else max_block_ms
+        over = {
+            name: stats for name, stats in self.offenders.items()
+            if stats["max_ms"] > limit and (not tools_only or name.startswith("tool:"))
+        }
+        if over:
+            details = ", ".join(f"{name} ({stats['max_ms']:.0f} ms)" for name, stats in over.items())
+            raise LoopBlockedError(f"Event loop blocked for more than {limit:g} ms by {details}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Lag percentiles and blocking offenders, for /metrics"""
+        return {
+            "lag_ms": metrics.summary("loop.lag_ms"),
+            "slow_callback_ms": self.slow_callback_duration * 1000,
+            "slow_callbacks": self.slow_callbacks,
+            "offenders": dict(sorted(self.offenders.items(), key=lambda item: -item[1]["total_ms"])),
+            "recent": list(self.recent)[-10:]
+        }
+
+
+@contextmanager
+def watch_loop(max_block_ms: float, tools_only: bool = True) -> Iterator[LoopMonitor]:
+    """
+    Fail the block when a tool blocks any event loop for longer than max_block_ms
+
+    Callbacks are timed from the next one on, so inside a coroutine run the
+    watched code in its own task:
+
+        with watch_loop(50):
+            await asyncio.create_task(mcp_server.execute_tool("calculate", {...}))
+
+    Raises:
+        LoopBlockedError: On exit, if a callback blocked the loop for too long
+    """
+    monitor = LoopMonitor(slow_callback_duration=max_block_ms / 1000)
+    monitor.install()
+    try:
+        yield monitor
+    finally:
+        monitor.uninstall()
+    monitor.check(max_block_ms, tools_only)
@@ -0,0 +1,306 @@
+"""
+Model Context Protocol transports for the tool registry.
+
+JSON-RPC 2.0 messages with 'initialize', 'ping', 'tools/list' and
+'tools/call', over streamable HTTP (POST /mcp) or stdio:
+
+    python -m services.mcp_protocol
+"""
+from typing import Dict, Any, List, Optional, Callable, Awaitable, BinaryIO
+import asyncio
+import sys
+from starlette.responses import Response
+from services.mcp_service import MCPServer
+from services.metrics import metrics
+from services.serialization import dumps, dumps_bytes, loads
+import config
+
+PROTOCOL_VERSION = "2025-03-26"
+SUPPORTED_VERSIONS = ("2024-11-05", "2025-03-26", "2025-06-18")
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+# Sends a JSON-RPC notification to the client: (method, params) -> None
+Notifier = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+class MCPError(Exception):
+    """A JSON-RPC error answered to the client"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class MCPProtocolHandler:
+    """
+    Answers JSON-RPC messages from MCP clients with the tools of an MCPServer.
+    Batches run their requests concurrently, and the 'tools/list' result is
+    serialized once per registry change.
+    """
+
+    def __init__(
+        self,
+        mcp_server: MCPServer,
+        server_name: str = "agent-ai-tool-server",
+        server_version: str = "1.0.0",
+        max_batch: int = 50
+    ):
+        """
+        Initialize the handler
+
+        Args:
+            mcp_server: Registry whose tools are exposed
+            server_name: Name reported to clients on 'initialize'
+            server_version: Version reported to clients on 'initialize'
+            max_batch: Largest batch accepted
+        """
+        self.mcp_server = mcp_server
+        self.server_name = server_name
+        self.server_version = server_version
+        self.max_batch = max_batch
+        self._listed_tools: Optional[List[Dict[str, Any]]] = None
+        self._tools_list_json = b""
+
+    def tools_list_json(self) -> bytes:
+        """Serialized 'tools/list' result, rebuilt only when the registry changed"""
+        # get_tools_for_llm returns the same list until a tool is (un)registered
+        tools = self.mcp_server.get_tools_for_llm()
+        if tools is not self._listed_tools:
+            self._tools_list_json = dumps_bytes({"tools": [
+                {
+                    "name": tool["function"]["name"],
+                    "description": tool["function"]["description"],
+                    "inputSchema": tool["function"]["parameters"]
+                }
+                for tool in tools
+            ]})
+            self._listed_tools = tools
+        return self._tools_list_json
+
+    async def handle_message(self, data: bytes, notify: Optional[Notifier] = None) -> Optional[bytes]:
+        """
+        Answer one JSON-RPC message or batch
+
+        Args:
+            data: Raw message
+            notify: Sends notifications, e.g. progress of streaming tools (optional)
+
+        Returns:
+            Serialized response, or None when the message held only notifications
+        """
+        try:
+            message = loads(data)
+        except ValueError:
+            metrics.increment("mcp.errors")
+            return error_response(None, PARSE_ERROR, "Parse error")
+
+        if isinstance(message, list):
+            if not message or len(message) > self.max_batch:
+                return error_response(None, INVALID_REQUEST, f"Batches must hold 1 to {self.max_batch} messages")
+            metrics.observe("mcp.batch_size", len(message))
+            responses = await asyncio.gather(*(self.handle_request(item, notify) for item in message))
+            responses = [response for response in responses if response is not None]
+            return b"[" + b",".join(responses) + b"]" if responses else None
+        return await self.handle_request(message, notify)
+
+    async def handle_request(self, message: Any, notify: Optional[Notifier] = None) -> Optional[bytes]:
+        """
+        Answer one JSON-RPC request
+
+        Args:
+            message: Parsed request or notification
+            notify: Sends notifications to the client (optional)
+
+        Returns:
+            Serialized response, or None for notifications
+        """
+        if not isinstance(message, dict) or message.get("jsonrpc") != "2.0" or not isinstance(message.get("method"), str):
+            metrics.increment("mcp.errors")
+            request_id = message.get("id") if isinstance(message, dict) else None
+            return error_response(request_id, INVALID_REQUEST, "Invalid request")
+
+        method = message["method"]
+        if "id" not in message:
+            # Notifications ('notifications/initialized', 'notifications/cancelled') need no answer
+            return None
+
+        request_id = message["id"]
+        params = message.get("params") or {}
+        metrics.increment("mcp.requests")
+        try:
+            if not isinstance(params, dict):
+                raise MCPError(INVALID_PARAMS, "Params must be an object")
+            if method == "tools/list":
+                return result_response(request_id, self.tools_list_json())
+            if method == "tools/call":
+                result = await self.call_tool(params, notify)
+            elif method == "initialize":
+                result = self.initialize(params)
+            elif method == "ping":
+                result = {}
+            else:
+                raise MCPError(METHOD_NOT_FOUND, f"Method '{method}' not found")
+            return result_response(request_id, dumps_bytes(result))
+        except MCPError as e:
+            metrics.increment("mcp.errors")
+            return error_response(request_id, e.code, e.message)
+        except Exception as e:
+            metrics.increment("mcp.errors")
+            return error_response(request_id, INTERNAL_ERROR, str(e))
+
+    def initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Result of 'initialize': the negotiated version and the server's capabilities"""
+        requested = params.get("protocolVersion")
+        return {
+            "protocolVersion": requested if requested in SUPPORTED_VERSIONS else PROTOCOL_VERSION,
+            "capabilities": {"tools": {"listChanged": False}},
+            "serverInfo": {"name": self.server_name, "version": self.server_version}
+        }
+
+    async def call_tool(self, params: Dict[str, Any], notify: Optional[Notifier] = None) -> Dict[str, Any]:
+        """
+        Result of 'tools/call'
+
+        Tool failures are results with 'isError' set, as the protocol asks, so the
+        calling model can see them; unknown tools and bad arguments are errors.
+        Chunks of streaming tools are sent as progress notifications when the
+        request carries a progress token.
+        """
+        name = params.get("name")
+        arguments = params.get("arguments") or {}
+        if self.mcp_server.get_tool(name) is None:
+            raise MCPError(INVALID_PARAMS, f"Unknown tool: {name}")
+        if not isinstance(arguments, dict):
+            raise MCPError(INVALID_PARAMS, "Tool arguments must be an object")
+
+        on_chunk = None
+        progress_token = (params.get("_meta") or {}).get("progressToken")
+        if notify is not None and progress_token is not None:
+            progress = 0
+
+            async def on_chunk(chunk: Any) -> None:
+                nonlocal progress
+                progress += 1
+                await notify("notifications/progress", {
+                    "progressToken": progress_token,
+                    "progress": progress,
+                    "message": chunk if isinstance(chunk, str) else dumps(chunk)
+                })
+
+        metrics.increment(f"mcp.tool_calls.{name}")
+        try:
+            result = await self.mcp_server.execute_tool(name, arguments, on_chunk=on_chunk)
+        except Exception as e:
+            return {"content": [{"type": "text", "text": str(e)}], "isError": True}
+
+        response = {
+            "content": [{"type": "text", "text": dumps(result)}],
+            "isError": isinstance(result, dict) and "error" in result
+        }
+        if isinstance(result, dict):
+            response["structuredContent"] = result
+        return response
+
+    async def http_response(self, body: bytes) -> Response:
+        """
+        Answer a POST of the streamable HTTP transport
+
+        Args:
+            body: Request body
+
+        Returns:
+            JSON response, or 202 Accepted when the body held only notifications
+        """
+        response = await self.handle_message(body)
+        if response is None:
+            return Response(status_code=202)
+        return Response(content=response, media_type="application/json")
+
+    async def serve_stream(self, read_line: Callable[[], Awaitable[bytes]], write: Callable[[bytes], Awaitable[None]]) -> None:
+        """
+        Answer newline-delimited messages until the input ends (stdio transport)
+
+        Messages are handled concurrently and answered as they finish.
+
+        Args:
+            read_line: Returns the next line, or b"" at the end of the input
+            write: Writes one serialized message
+        """
+        lock = asyncio.Lock()
+        tasks = set()
+
+        async def send(data: bytes) -> None:
+            async with lock:
+                await write(data + b"\n")
+
+        async def notify(method: str, params: Dict[str, Any]) -> None:
+            await send(dumps_bytes({"jsonrpc": "2.0", "method": method, "params": params}))
+
+        async def answer(line: bytes) -> None:
+            response = await self.handle_message(line, notify)
+            if response is not None:
+                await send(response)
+
+        while True:
+            line = await read_line()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            task = asyncio.create_task(answer(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+def result_response(request_id: Any, result_json: bytes) -> bytes:
+    """JSON-RPC response around an already serialized result"""
+    return b'{"jsonrpc":"2.0","id":' + dumps_bytes(request_id) + b',"result":' + result_json + b"}"
+
+
+def error_response(request_id: Any, code: int, message: str) -> bytes:
+    """JSON-RPC error response"""
+    return dumps_bytes({"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}})
+
+
+async def serve_stdio(mcp_server: MCPServer, stdout: Optional[BinaryIO] = None) -> None:
+    """
+    Serve the registry to an MCP client over stdin and stdout
+
+    Anything the server prints is sent to stderr, so stdout carries only
+    protocol messages.
+
+    Args:
+        mcp_server: Registry whose tools are exposed
+        stdout: Binary stream for protocol messages (defaults to standard output)
+    """
+    stdin = sys.stdin.buffer
+    if stdout is None:
+        stdout = sys.stdout.buffer
+        sys.stdout = sys.stderr
+
+    async def read_line() -> bytes:
+        return await asyncio.to_thread(stdin.readline)
+
+    async def write(data: bytes) -> None:
+        stdout.write(data)
+        stdout.flush()
+
+    await MCPProtocolHandler(mcp_server, max_batch=config.MCP_MAX_BATCH).serve_stream(read_line, write)
+
+
+if __name__ == "__main__":
+    # Registration logs go to stderr too
+    protocol_stdout = sys.stdout.buffer
+    sys.stdout = sys.stderr
+    server = MCPServer()
+    server.load_tools_from_modules()
+    asyncio.run(serve_stdio(server, protocol_stdout))
@@ -0,0 +1,350 @@
+from typing import Dict, Any, List, Optional, Callable, Tuple
+import asyncio
+import hashlib
+import json
+import time
+import httpx
+from services.metrics import metrics
+from services.serialization import dumps_bytes, loads
+
+PROTOCOL_VERSION = "2025-03-26"
+
+# JSON-RPC 'invalid params', which MCP servers answer for unknown tools
+INVALID_PARAMS = -32602
+
+
+class RemoteMCPError(Exception):
+    """A JSON-RPC error answered by a remote MCP server"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{message} (code {code})")
+        self.code = code
+
+
+def parse_event_stream(text: str) -> List[Any]:
+    """
+    Parse the JSON-RPC messages of a text/event-stream body
+
+    Args:
+        text: Body of the response
+
+    Returns:
+        Messages of the 'data' fields, one per event
+    """
+    messages = []
+    data: List[str] = []
+    for line in text.splitlines() + [""]:
+        if line.startswith("data:"):
+            data.append(line[5:].lstrip())
+        elif not line and data:
+            messages.append(loads("\n".join(data)))
+            data = []
+    return messages
+
+
+class RemoteMCPServer:
+    """
+    Client of an MCP server reached over streamable HTTP.
+    Requests share one pooled, keep-alive HTTP client; requests made within
+    batch_window of each other are pipelined as a single JSON-RPC batch, and at
+    most max_concurrency tool calls are in flight. The tool list is cached
+    until it is older than schema_ttl or the server announces a change.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        prefix: Optional[str] = None,
+        max_concurrency: int = 8,
+        timeout: float = 30.0,
+        schema_ttl: float = 300.0,
+        batch_window: float = 0.002,
+        max_batch: int = 20,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the client
+
+        Args:
+            name: Name of the remote, used in metrics and logs
+            url: MCP endpoint, e.g. 'http://tools.internal:8000/mcp'
+            prefix: Prepended to the remote's tool names when they are registered
+                    (defaults to '<name>_')
+            max_concurrency: Tool calls in flight, and pooled connections
+            timeout: Seconds to wait for a response
+            schema_ttl: Seconds the tool list is reused without asking the server
+            batch_window: Seconds requests wait to be sent together in one batch
+            max_batch: Requests per batch
+            transport: HTTP transport (optional; e.g. an ASGI app in tests)
+            clock: Time source
+        """
+        self.name = name
+        self.url = url
+        self.prefix = f"{name}_" if prefix is None else prefix
+        self.max_concurrency = max_concurrency
+        self.schema_ttl = schema_ttl
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.clock = clock
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            transport=transport
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+
+        self.session_id: Optional[str] = None
+        self.protocol_version: Optional[str] = None
+        self._init_lock = asyncio.Lock()
+        self._next_id = 0
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+        self.tools: List[Dict[str, Any]] = []
+        self.version: Optional[str] = None
+        self.fetched_at: Optional[float] = None
+        self.stale = True
+        # Set by the registry to pick up changes of the tool list
+        self.on_list_changed: Optional[Callable[[], None]] = None
+
+    async def _post(self, payload: Any) -> List[Any]:
+        """Send a message or batch and return the messages answered"""
+        headers = {"Content-Type": "application/json", "Accept": "application/json, text/event-stream"}
+        if self.session_id:
+            headers["Mcp-Session-Id"] = self.session_id
+        if self.protocol_version:
+            headers["MCP-Protocol-Version"] = self.protocol_version
+        metrics.increment(f"mcp_remote.posts.{self.name}")
+        response = await self.client.post(self.url, content=dumps_bytes(payload), headers=headers)
+        response.raise_for_status()
+        self.session_id = response.headers.get("mcp-session-id", self.session_id)
+        if response.status_code == 202 or not response.content:
+            return []
+
+        if response.headers.get("content-type", "").startswith("text/event-stream"):
+            bodies = parse_event_stream(response.text)
+        else:
+            bodies = [loads(response.content)]
+        messages = []
+        for body in bodies:
+            messages.extend(body if isinstance(body, list) else [body])
+        for message in messages:
+            if message.get("method") == "notifications/tools/list_changed":
+                self.mark_stale()
+        return messages
+
+    async def initialize(self) -> None:
+        """Open the MCP session, once"""
+        async with self._init_lock:
+            if self.protocol_version is not None:
+                return
+            self._next_id += 1
+            messages = await self._post({
+                "jsonrpc": "2.0",
+                "id": self._next_id,
+                "method": "initialize",
+                "params": {
+                    "protocolVersion": PROTOCOL_VERSION,
+                    "capabilities": {},
+                    "clientInfo": {"name": "agent-ai-tool-server", "version": "1.0.0"}
+                }
+            })
+            result = next((message for message in messages if "result" in message or "error" in message), {})
+            if "error" in result:
+                raise RemoteMCPError(result["error"].get("code", 0), result["error"].get("message", ""))
+            self.protocol_version = result.get("result", {}).get("protocolVersion", PROTOCOL_VERSION)
+            await self._post({"jsonrpc": "2.0", "method": "notifications/initialized"})
+            print(f"Connected to MCP server '{self.name}' at {self.url}")
+
+    async def request(self, method: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Send a request, pipelined with the others made within the batch window
+
+        Args:
+            method: JSON-RPC method
+            params: Its parameters (optional)
+
+        Returns:
+            The request's result
+
+        Raises:
+            RemoteMCPError: If the server answered with an error
+            httpx.HTTPError: If the server could not be reached
+        """
+        if self.protocol_version is None:
+            await self.initialize()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._next_id += 1
+        self._pending.append(({"jsonrpc": "2.0", "id": self._next_id, "method": method, "params": params or {}}, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        """Send the pending requests as one batch"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        metrics.observe("mcp_remote.batch_size", len(batch))
+        try:
+            payload = batch[0][0] if len(batch) == 1 else [message for message, _ in batch]
+            answers = {message.get("id"): message for message in await self._post(payload) if "id" in message}
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for message, future in batch:
+            if future.done():
+                continue
+            answer = answers.get(message["id"])
+            if answer is None:
+                future.set_exception(RemoteMCPError(0, f"No response to '{message['method']}'"))
+            elif "error" in answer:
+                future.set_exception(RemoteMCPError(answer["error"].get("code", 0), answer["error"].get("message", "")))
+            else:
+                future.set_result(answer.get("result"))
+
+    def mark_stale(self) -> None:
+        """Fetch the tool list again on next use"""
+        self.stale = True
+        if self.on_list_changed is not None:
+            self.on_list_changed()
+
+    async def list_tools(self, force: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get the remote's tools, from the cache when it is fresh
+
+        Args:
+            force: Ask the server even if the cached list is fresh
+
+        Returns:
+            Tool descriptions as served ('name', 'description', 'inputSchema')
+        """
+        fresh = self.fetched_at is not None and self.clock() - self.fetched_at < self.schema_ttl
+        if not force and not self.stale and fresh:
+            return self.tools
+
+        tools: List[Dict[str, Any]] = []
+        cursor = None
+        while True:
+            result = await self.request("tools/list", {"cursor": cursor} if cursor else None)
+            tools.extend(result.get("tools", []))
+            cursor = result.get("nextCursor")
+            if not cursor:
+                break
+        self.tools = tools
+        self.version = hashlib.sha1(json.dumps(tools, sort_keys=True).encode("utf-8")).hexdigest()
+        self.fetched_at = self.clock()
+        self.stale = False
+        metrics.increment(f"mcp_remote.list_fetches.{self.name}")
+        return tools
+
+    async def call_tool(self, name: str, arguments: Dict[str, Any]) -> Any:
+        """
+        Call one of the remote's tools
+
+        Args:
+            name: Tool name on the remote (without the prefix)
+            arguments: Arguments of the call
+
+        Returns:
+            The structured result when the server sends one, else the parsed text
+            content; failed calls give {'error': ...} like local tools
+        """
+        async with self.semaphore:
+            self.in_flight += 1
+            started = time.perf_counter()
+            try:
+                result = await self.request("tools/call", {"name": name, "arguments": arguments})
+            except RemoteMCPError as e:
+                if e.code == INVALID_PARAMS:
+                    # The tool may be gone; the list is fetched again
+                    self.mark_stale()
+                raise
+            finally:
+                self.in_flight -= 1
+                metrics.observe(f"mcp_remote.call_ms.{self.name}", (time.perf_counter() - started) * 1000)
+
+        structured = result.get("structuredContent")
+        text = "".join(item.get("text", "") for item in result.get("content", []) if item.get("type") == "text")
+        if result.get("isError"):
+            if isinstance(structured, dict) and "error" in structured:
+                return structured
+            return {"error": text or f"Tool '{name}' failed on MCP server '{self.name}'"}
+        if structured is not None:
+            return structured
+        try:
+            return loads(text)
+        except ValueError:
+            return {"text": text}
+
+    def tool_function(self, name: str) -> Callable:
+        """Proxy registered as the function of a remote tool"""
+        async def call_remote_tool(**arguments: Any) -> Any:
+            return await self.call_tool(name, arguments)
+        return call_remote_tool
+
+    def status(self) -> Dict[str, Any]:
+        """Cached tools and load of the remote"""
+        return {
+            "url": self.url,
+            "tools": len(self.tools),
+            "stale": self.stale,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency
+        }
+
+    async def close(self) -> None:
+        """Close the pooled connections"""
+        await self.client.aclose()
+
+
+def parse_remote_servers(spec: str, **options: Any) -> List[RemoteMCPServer]:
+    """
+    Parse the remote MCP servers from configuration
+
+    Accepts either a JSON list of objects with 'name', 'url' and optionally
+    'prefix' and 'max_concurrency', or a comma-separated list of
+    'name|url|prefix' entries where prefix is optional.
+
+    Args:
+        spec: Remote server specification string
+        **options: Passed to every RemoteMCPServer (timeouts, batch window, ...)
+
+    Returns:
+        List of remote servers
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        return []
+
+    if spec.startswith("["):
+        return [
+            RemoteMCPServer(
+                entry["name"], entry["url"], entry.get("prefix"),
+                **{**options, **({"max_concurrency": entry["max_concurrency"]} if "max_concurrency" in entry else {})}
+            )
+            for entry in json.loads(spec)
+        ]
+
+    remotes = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        parts = entry.split("|")
+        remotes.append(RemoteMCPServer(parts[0], parts[1], parts[2] if len(parts) > 2 else None, **options))
+    return remotes
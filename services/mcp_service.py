@@ -1,7 +1,23 @@
-from typing import Dict, Any, List, Callable, Optional
-import inspect
+from typing import Dict, Any, List, Callable, Optional, Union, Awaitable, Iterable, Iterator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+import importlib
+import asyncio
 import json
+import os
+import sys
+import threading
 from models.schema import Tool
+from models.internal import ToolEntry, RegistrySnapshot
+from services.tool_discovery import build_manifest
+from services.shared_cache import TieredCache, get_shared_backend
+from services.tool_streaming import ToolRun
+from services.mcp_remote import RemoteMCPServer
+from services.profiler import tagged
+import config
+
+# Registry snapshot a request started with, kept for all of its reads
+_pinned_snapshot: ContextVar[Optional[RegistrySnapshot]] = ContextVar("pinned_snapshot", default=None)
 
 class MCPServer:
     """
@@ -11,16 +27,94 @@ class MCPServer:
     
     def __init__(self):
         """Initialize the MCP server with an empty tools registry"""
-        self.tools: Dict[str, Tool] = {}
+        self._snapshot = RegistrySnapshot(0, {}, self)
+        # Serializes writers; readers only load the published snapshot
+        self._write_lock = threading.Lock()
+        # Tools registered by load_tools_from_modules, replaced on reload
+        self._module_tools: List[str] = []
+        self._result_cache: Optional[TieredCache] = None
+        # Remote MCP servers, and the names their tools are registered under
+        self.remotes: Dict[str, RemoteMCPServer] = {}
+        self._remote_tools: Dict[str, List[str]] = {}
+        self._remote_versions: Dict[str, Optional[str]] = {}
+        self._remote_syncs: Dict[str, asyncio.Task] = {}
+    
+    @property
+    def result_cache(self) -> TieredCache:
+        """Cache of results for tools with a cache_ttl (created on first use)"""
+        if self._result_cache is None:
+            self._result_cache = TieredCache("tool", get_shared_backend(), config.SHARED_CACHE_L1_SIZE)
+        return self._result_cache
+    
+    @property
+    def snapshot(self) -> RegistrySnapshot:
+        """The registry as the current request sees it: the snapshot it is pinned to, else the latest"""
+        pinned = _pinned_snapshot.get()
+        if pinned is not None and pinned.owner is self:
+            return pinned
+        return self._snapshot
+    
+    @property
+    def latest(self) -> RegistrySnapshot:
+        """The most recently published snapshot"""
+        return self._snapshot
     
-    def register_tool(self, tool: Tool) -> None:
+    @property
+    def tools(self) -> Mapping[str, ToolEntry]:
+        """Registered tools by name (read-only; see update)"""
+        return self.snapshot.tools
+    
+    @contextmanager
+    def pinned(self) -> Iterator[RegistrySnapshot]:
         """
-        Register a tool with the MCP server
+        Serve every read in the block, including in tasks it starts, from the current snapshot
+        
+        Changes published meanwhile are seen by blocks entered afterwards. Nested
+        blocks keep the outer block's snapshot.
+        """
+        current = _pinned_snapshot.get()
+        if current is not None and current.owner is self:
+            yield current
+            return
+        token = _pinned_snapshot.set(self._snapshot)
+        try:
+            yield self._snapshot
+        finally:
+            _pinned_snapshot.reset(token)
+    
+    def update(self, register: Iterable[Union[Tool, ToolEntry]] = (), unregister: Iterable[str] = ()) -> RegistrySnapshot:
+        """
+        Change the registry and publish the result as one new snapshot
+        
+        Tools are unregistered first, so a tool can be replaced by unregistering
+        and registering the same name.
         
         Args:
-            tool: Tool object to register
+            register: Tools to add or replace
+            unregister: Names of tools to remove (unknown names are ignored)
+            
+        Returns:
+            The published snapshot
         """
-        self.tools[tool.name] = tool
+        entries = [tool if isinstance(tool, ToolEntry) else ToolEntry.from_tool(tool) for tool in register]
+        with self._write_lock:
+            tools = dict(self._snapshot.tools)
+            for name in unregister:
+                tools.pop(name, None)
+            for entry in entries:
+                tools[entry.name] = entry
+            # Publishing is a single reference assignment
+            self._snapshot = RegistrySnapshot(self._snapshot.version + 1, tools, self)
+        return self._snapshot
+    
+    def register_tool(self, tool: Union[Tool, ToolEntry]) -> None:
+        """
+        Register a tool with the MCP server, replacing one of the same name
+        
+        Args:
+            tool: Tool object to register (stored as a compact ToolEntry)
+        """
+        self.update(register=[tool])
         print(f"Tool '{tool.name}' registered successfully")
     
     def unregister_tool(self, tool_name: str) -> bool:
@@ -33,12 +127,24 @@ class MCPServer:
         Returns:
             True if tool was unregistered, False if tool was not found
         """
-        if tool_name in self.tools:
-            del self.tools[tool_name]
+        if tool_name in self._snapshot.tools:
+            self.update(unregister=[tool_name])
             print(f"Tool '{tool_name}' unregistered successfully")
             return True
         return False
     
+    def get_tool(self, tool_name: str) -> Optional[ToolEntry]:
+        """
+        Get a registered tool by name
+        
+        Args:
+            tool_name: Name of the tool
+            
+        Returns:
+            The tool, or None if it is not registered
+        """
+        return self.tools.get(tool_name)
+    
     def list_tools(self) -> List[Dict[str, Any]]:
         """
         List all registered tools
@@ -55,65 +161,266 @@ class MCPServer:
         """
         Get tools in the format expected by LLMs for function calling
         
+        The list is built once per registry change and shared by every
+        request, so callers must not modify it.
+        
         Returns:
             List of tool definitions in OpenAI function calling format
         """
-        llm_tools = []
-        for name, tool in self.tools.items():
-            llm_tools.append({
-                "type": "function",
-                "function": {
-                    "name": name,
-                    "description": tool.description,
-                    "parameters": tool.parameters
-                }
-            })
-        return llm_tools
+        return self.snapshot.llm_tools
+    
+    def stream_tool(self, tool_name: str, arguments: Dict[str, Any]) -> ToolRun:
+        """
+        Start executing a tool, with its partial output as an async iterator
+        
+        Tools whose function is an async generator stream their chunks through
+        the returned run; the result is available on it once iteration ends.
+        
+        Args:
+            tool_name: Name of the tool to execute
+            arguments: Arguments to pass to the tool
+            
+        Returns:
+            The run, to iterate with 'async for'
+            
+        Raises:
+            ValueError: If tool is not found
+        """
+        tool = self.snapshot.tools.get(tool_name)
+        if tool is None:
+            raise ValueError(f"Tool '{tool_name}' not found")
+        
+        # Reuse a recent result for the same arguments, possibly from another worker;
+        # the lookup runs when the run is iterated, so it can await the shared tier
+        on_result = cached = None
+        if tool.cache_ttl:
+            cache_key = f"{tool_name}:{json.dumps(arguments, sort_keys=True, default=str)}"
+            
+            async def cached() -> Any:
+                return await self.result_cache.get(cache_key)
+            
+            async def on_result(result: Any) -> None:
+                # Failures are retried on the next call, including partial results listing them
+                if not (isinstance(result, dict) and ("error" in result or result.get("errors"))):
+                    await self.result_cache.set(cache_key, result, tool.cache_ttl)
+        
+        if tool.function is None and tool.module:
+            # Tools discovered from the manifest are imported on their first call;
+            # the function is memoized on the entry, shared by the snapshots holding it
+            tool.function = self._import_function(tool)
+        
+        return ToolRun(
+            tool_name, tool.function, arguments, on_result=on_result, cached=cached,
+            max_chars=config.TOOL_STREAM_MAX_CHARS, max_items=config.TOOL_STREAM_MAX_ITEMS
+        )
     
-    async def execute_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Any:
+    async def execute_tool(
+        self,
+        tool_name: str,
+        arguments: Dict[str, Any],
+        on_chunk: Optional[Callable[[Any], Awaitable[None]]] = None
+    ) -> Any:
         """
         Execute a tool with the given arguments
         
         Args:
             tool_name: Name of the tool to execute
             arguments: Arguments to pass to the tool
+            on_chunk: Coroutine function called with each partial chunk of a streaming tool (optional)
             
         Returns:
-            Result of the tool execution
+            Result of the tool execution; for streaming tools, the bounded aggregate of
+            their chunks unless they yielded a FinalResult
             
         Raises:
             ValueError: If tool is not found
             Exception: If tool execution fails
         """
-        if tool_name not in self.tools:
-            raise ValueError(f"Tool '{tool_name}' not found")
+        run = self.stream_tool(tool_name, arguments)
+        with tagged(tool=tool_name):
+            async for chunk in run:
+                if on_chunk is not None:
+                    await on_chunk(chunk)
+        return run.result
+    
+    def _import_function(self, tool: ToolEntry) -> Callable:
+        """
+        Import the module of a lazily registered tool and get its function
         
-        tool = self.tools[tool_name]
+        Args:
+            tool: Tool registered from the manifest
+            
+        Returns:
+            The tool's function
+        """
+        module = importlib.import_module(tool.module)
+        function = getattr(module, tool.function_name, None)
+        if function is None:
+            raise ValueError(f"Tool '{tool.name}': '{tool.module}' has no function '{tool.function_name}'")
+        print(f"Tool module '{tool.module}' imported for '{tool.name}'")
+        return function
+    
+    def import_tool(self, tool: Union[Tool, ToolEntry], reload_module: bool = False) -> ToolEntry:
+        """
+        Import the function of a tool given by module and function name
         
-        try:
-            # Check if the function is async
-            if inspect.iscoroutinefunction(tool.function):
-                result = await tool.function(**arguments)
-            else:
-                result = tool.function(**arguments)
-            
-            return result
-        except Exception as e:
-            raise Exception(f"Error executing tool '{tool_name}': {str(e)}")
-    
-    def load_tools_from_modules(self) -> None:
-        """
-        Load and register all tools from the tools directory
-        This method should be called during application startup
-        """
-        # Import here to avoid circular imports
-        from tools.weather import register_weather_tool
-        from tools.time_tool import register_time_tool
-        from tools.calculator import register_calculator_tool
-        from tools.currency import register_currency_tool
-        
-        # Register all tools
-        register_weather_tool(self)
-        register_time_tool(self)
-        register_calculator_tool(self)
-        register_currency_tool(self)
+        Args:
+            tool: Tool with 'module' and 'function_name' set
+            reload_module: Re-import the module if it is already imported
+            
+        Returns:
+            Registry entry with its function resolved, ready to register
+            
+        Only modules of the packages in TOOL_IMPORT_PACKAGES can be imported
+        or reloaded, and the function must be defined in one of them.
+            
+        Raises:
+            ImportError: If the module cannot be imported
+            ValueError: If the module is outside the allowed packages, or has no such function
+        """
+        entry = tool if isinstance(tool, ToolEntry) else ToolEntry.from_tool(tool)
+        packages = [package.strip() for package in config.TOOL_IMPORT_PACKAGES.split(",") if package.strip()]
+        
+        def allowed(module: Optional[str]) -> bool:
+            return any(module == package or (module or "").startswith(f"{package}.") for package in packages)
+        
+        if not allowed(entry.module):
+            raise ValueError(f"Tool '{entry.name}': module '{entry.module}' is not in an allowed tool package")
+        if reload_module and entry.module in sys.modules:
+            importlib.reload(sys.modules[entry.module])
+        entry.function = self._import_function(entry)
+        if not callable(entry.function):
+            raise ValueError(f"Tool '{entry.name}': '{entry.module}.{entry.function_name}' is not callable")
+        if not allowed(getattr(entry.function, "__module__", None)):
+            # e.g. 'system' imported into a tool module from os
+            raise ValueError(f"Tool '{entry.name}': '{entry.function_name}' is not defined in an allowed tool package")
+        return entry
+    
+    async def add_remote_server(self, remote: RemoteMCPServer) -> int:
+        """
+        Register the tools of a remote MCP server, proxied through execute_tool
+        
+        The remote's tool list is kept up to date when it announces a change.
+        
+        Args:
+            remote: Client of the remote server
+            
+        Returns:
+            Number of tools registered from the remote
+        """
+        self.remotes[remote.name] = remote
+        remote.on_list_changed = lambda: self._schedule_remote_sync(remote)
+        return await self.sync_remote(remote)
+    
+    def _schedule_remote_sync(self, remote: RemoteMCPServer) -> None:
+        """Fetch a remote's tool list in the background, once at a time"""
+        task = self._remote_syncs.get(remote.name)
+        if task is not None and not task.done():
+            return
+        
+        async def sync() -> None:
+            try:
+                await self.sync_remote(remote)
+            except Exception as e:
+                print(f"Tools of MCP server '{remote.name}' could not be refreshed: {str(e)}")
+        
+        self._remote_syncs[remote.name] = asyncio.ensure_future(sync())
+    
+    async def sync_remote(self, remote: RemoteMCPServer, force: bool = False) -> int:
+        """
+        Re-register a remote's tools if its tool list changed
+        
+        Args:
+            remote: Client of the remote server
+            force: Ask the remote even if its cached list is fresh
+            
+        Returns:
+            Number of tools registered from the remote
+        """
+        tools = await remote.list_tools(force)
+        if remote.version == self._remote_versions.get(remote.name):
+            return len(self._remote_tools.get(remote.name, []))
+        
+        previous = self._remote_tools.get(remote.name, [])
+        entries = []
+        for tool in tools:
+            name = remote.prefix + tool["name"]
+            if name in self._snapshot.tools and name not in previous:
+                print(f"Tool '{name}' of MCP server '{remote.name}' skipped: the name is taken")
+                continue
+            entries.append(ToolEntry(
+                name,
+                tool.get("description", ""),
+                tool.get("inputSchema") or {"type": "object", "properties": {}},
+                function=remote.tool_function(tool["name"])
+            ))
+        # The remote's old and new tools are swapped in one snapshot
+        self.update(register=entries, unregister=previous)
+        self._remote_tools[remote.name] = [entry.name for entry in entries]
+        self._remote_versions[remote.name] = remote.version
+        print(f"Registered {len(entries)} tools of MCP server '{remote.name}'")
+        return len(entries)
+    
+    async def refresh_remotes(self) -> None:
+        """Pick up tool list changes of every remote whose cached list expired"""
+        for remote in list(self.remotes.values()):
+            try:
+                await self.sync_remote(remote)
+            except Exception as e:
+                print(f"Tools of MCP server '{remote.name}' could not be refreshed: {str(e)}")
+    
+    async def close_remotes(self) -> None:
+        """Close the connections to the remote servers"""
+        for task in self._remote_syncs.values():
+            task.cancel()
+        for remote in self.remotes.values():
+            await remote.close()
+    
+    def load_tools_from_modules(
+        self,
+        package_dir: Optional[str] = None,
+        package_name: str = "tools",
+        reload_modules: bool = False
+    ) -> RegistrySnapshot:
+        """
+        Load and register all tools from the tools directory and package entry points
+        This method should be called during application startup, and can be
+        called again to pick up changed tool modules without a restart
+        
+        Tools are registered from a cached manifest of their names and schemas;
+        their modules are only imported when a tool is first executed. Modules
+        whose tools cannot be described statically are imported right away.
+        The tools are published as one snapshot that replaces those of the
+        previous load; tools registered otherwise are kept.
+        
+        Args:
+            package_dir: Directory to scan (defaults to the 'tools' package)
+            package_name: Importable name of the package in package_dir
+            reload_modules: Re-import tool modules that are already imported
+            
+        Returns:
+            The published snapshot
+        """
+        if package_dir is None:
+            package_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools")
+        
+        manifest = build_manifest(package_dir, package_name, config.TOOL_MANIFEST_PATH or None)
+        
+        # Registered into a staging registry, then published at once
+        staging = MCPServer()
+        for module_name, description in manifest["modules"].items():
+            if reload_modules and module_name in sys.modules:
+                importlib.reload(sys.modules[module_name])
+            if description["eager"]:
+                module = importlib.import_module(module_name)
+                for register_name in description["register"]:
+                    getattr(module, register_name)(staging)
+                continue
+            
+            for entry in description["tools"]:
+                staging.register_tool(Tool(**entry))
+        
+        loaded = list(staging.latest.tools)
+        snapshot = self.update(register=staging.latest.tools.values(), unregister=self._module_tools)
+        self._module_tools = loaded
+        return snapshot
@@ -0,0 +1,135 @@
+from typing import Dict, Any, Callable, Optional
+from collections import deque
+import threading
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    """
+    Get a percentile from an already sorted sequence (nearest rank)
+
+    Args:
+        sorted_values: Values sorted in ascending order
+        fraction: Percentile as a fraction, e.g., 0.95
+
+    Returns:
+        Value at the requested percentile, or 0.0 for an empty sequence
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Metrics:
+    """
+    In-process metrics registry with counters, gauges and histograms.
+    Histograms keep a bounded window of recent samples for percentiles.
+    """
+
+    def __init__(self, max_samples: int = 1024):
+        """
+        Initialize an empty registry
+
+        Args:
+            max_samples: Number of recent samples kept per histogram
+        """
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._histograms: Dict[str, deque] = {}
+        self._histogram_counts: Dict[str, int] = {}
+        self._collectors: Dict[str, Callable[[], Any]] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        """Increase a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """Record a sample in a histogram"""
+        with self._lock:
+            samples = self._histograms.get(name)
+            if samples is None:
+                samples = self._histograms[name] = deque(maxlen=self.max_samples)
+            samples.append(value)
+            self._histogram_counts[name] = self._histogram_counts.get(name, 0) + 1
+
+    def counter(self, name: str) -> float:
+        """Get the current value of a counter"""
+        return self._counters.get(name, 0)
+
+    def summary(self, name: str) -> Optional[Dict[str, float]]:
+        """
+        Summarize a histogram
+
+        Args:
+            name: Histogram name
+
+        Returns:
+            Dictionary with count and percentiles, or None if nothing was recorded
+        """
+        with self._lock:
+            samples = self._histograms.get(name)
+            if not samples:
+                return None
+            values = sorted(samples)
+            count = self._histogram_counts[name]
+        return {
+            "count": count,
+            "p50": percentile(values, 0.50),
+            "p95": percentile(values, 0.95),
+            "p99": percentile(values, 0.99),
+            "max": values[-1]
+        }
+
+    def register_collector(self, name: str, collector: Callable[[], Any]) -> None:
+        """
+        Register a callable whose result is included in every snapshot.
+        Used for derived values such as hit rates.
+
+        Args:
+            name: Key under which the collector's result is reported
+            collector: Callable returning a JSON-serializable value
+        """
+        self._collectors[name] = collector
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get all metrics
+
+        Returns:
+            Dictionary of counters, gauges, histogram summaries and collector results
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            names = list(self._histograms)
+        snapshot = {
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": {name: self.summary(name) for name in names}
+        }
+        for name, collector in self._collectors.items():
+            try:
+                snapshot[name] = collector()
+            except Exception as e:
+                snapshot[name] = {"error": str(e)}
+        return snapshot
+
+    def reset(self) -> None:
+        """Clear all recorded values, keeping registered collectors"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+            self._histogram_counts.clear()
+
+
+# Process-wide registry exposed on /metrics
+metrics = Metrics()
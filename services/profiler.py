@@ -0,0 +1,295 @@
+"""
+Sampling profiler for live workers.
+
+A background thread snapshots the stacks of every thread at a fixed
+interval; nothing is instrumented while no profile runs. Stacks are tagged
+with the endpoint and tool their task or executor thread was working for,
+and are reported as collapsed stacks ('frame;frame;frame count' lines) that
+flamegraph.pl, speedscope or inferno read directly.
+"""
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
+import functools
+import os
+import sys
+import threading
+import time
+import weakref
+from services.metrics import metrics
+
+# Tags of running tasks (event loop thread) and of executor threads
+_task_tags: "weakref.WeakKeyDictionary[asyncio.Task, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+_thread_tags: Dict[int, Dict[str, Any]] = {}
+
+# Innermost tags entered or left by a task most recently; the loop monitor
+# clears it before each callback to attribute blocking that happened inside
+# a block opened and closed within one step
+last_tags: Optional[Dict[str, Any]] = None
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Frames under every thread's stack, left out of the hottest frames
+_BOOTSTRAP_FRAMES = (
+    "Thread._bootstrap (threading.py:",
+    "Thread._bootstrap_inner (threading.py:",
+    "Thread.run (threading.py:",
+    "_worker (thread.py:"
+)
+
+
+def _running_task() -> Optional[asyncio.Task]:
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
+
+
+def current_tags() -> Dict[str, Any]:
+    """Tags of the current task, or of the current thread outside the event loop"""
+    task = _running_task()
+    if task is not None:
+        return _task_tags.get(task, {})
+    return _thread_tags.get(threading.get_ident(), {})
+
+
+@contextmanager
+def tagged(**tags: Any) -> Iterator[None]:
+    """
+    Tag the samples taken while the block runs, e.g. tagged(tool="get_weather")
+
+    Tags stack: inner blocks add to (or override) the tags of outer ones.
+    Tasks created inside the block and work sent to the default executor
+    inherit them once install() has run. A tag may be an ASGI scope, which is
+    reported as the method and route template of the request.
+    """
+    global last_tags
+    task = _running_task()
+    key = task if task is not None else threading.get_ident()
+    registry = _task_tags if task is not None else _thread_tags
+    previous = registry.get(key)
+    registry[key] = merged = {**(previous or {}), **tags}
+    if task is not None:
+        last_tags = merged
+    try:
+        yield
+    finally:
+        if task is not None:
+            last_tags = merged
+        if previous is None:
+            registry.pop(key, None)
+        else:
+            registry[key] = previous
+
+
+def _tagging_task_factory(loop: asyncio.AbstractEventLoop, coro: Any, **kwargs: Any) -> asyncio.Task:
+    """Create tasks that inherit the tags of the task creating them"""
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    parent = asyncio.current_task(loop)
+    tags = _task_tags.get(parent) if parent is not None else None
+    if tags:
+        _task_tags[task] = tags
+    return task
+
+
+class TaggingExecutor(ThreadPoolExecutor):
+    """Thread pool whose workers carry the tags of the task that submitted the work"""
+
+    def submit(self, fn, *args, **kwargs):
+        tags = current_tags()
+        if not tags:
+            return super().submit(fn, *args, **kwargs)
+
+        def run(*args: Any, **kwargs: Any) -> Any:
+            thread_id = threading.get_ident()
+            _thread_tags[thread_id] = tags
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _thread_tags.pop(thread_id, None)
+
+        return super().submit(functools.wraps(fn)(run), *args, **kwargs)
+
+
+def install(loop: asyncio.AbstractEventLoop) -> None:
+    """Propagate tags to new tasks and to the loop's default executor"""
+    loop.set_task_factory(_tagging_task_factory)
+    loop.set_default_executor(TaggingExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4)))
+
+
+def tag_value(value: Any) -> str:
+    """Readable value of a tag"""
+    if isinstance(value, dict):
+        # An ASGI scope; the route is set once the router has matched the request
+        route = value.get("route")
+        path = getattr(route, "path", None) or value.get("path", "?")
+        method = value.get("method") or value.get("type", "").upper()
+        return f"{method} {path}"
+    return str(value)
+
+
+def _format_tag(name: str, value: Any) -> str:
+    return f"[{name}:{tag_value(value)}]"
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of all threads of the process.
+    The event loop thread's samples carry the tags of the task running at that
+    moment; executor threads carry the tags of the work they run. One profile
+    runs at a time.
+    """
+
+    def __init__(self, max_depth: int = 128):
+        """
+        Initialize the profiler
+
+        Args:
+            max_depth: Innermost frames kept per stack
+        """
+        self.max_depth = max_depth
+        self.busy = False
+        self._labels: Dict[Any, str] = {}
+
+    def _label(self, code: Any) -> str:
+        """'function (file:line)' label of a code object, cached"""
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            if filename.startswith(_ROOT):
+                filename = os.path.relpath(filename, _ROOT)
+            else:
+                # Keep the package-relative part of library paths
+                marker = filename.rfind("site-packages" + os.sep)
+                filename = filename[marker + 14:] if marker >= 0 else os.path.basename(filename)
+            name = getattr(code, "co_qualname", code.co_name)
+            label = f"{name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+            self._labels[code] = label
+        return label
+
+    def sample(
+        self,
+        counts: Counter,
+        loop: Optional[asyncio.AbstractEventLoop],
+        loop_thread: Optional[int],
+        include_idle: bool = False
+    ) -> None:
+        """Add one snapshot of every thread's stack to counts"""
+        own = threading.get_ident()
+        task = asyncio.current_task(loop) if loop is not None else None
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            if thread_id == loop_thread:
+                root, tags = "event-loop", _task_tags.get(task, {}) if task is not None else {}
+            else:
+                root, tags = names.get(thread_id, f"thread-{thread_id}"), _thread_tags.get(thread_id, {})
+
+            stack: List[str] = []
+            leaf = frame.f_code
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if self._idle(leaf):
+                if not include_idle and thread_id != loop_thread:
+                    continue
+                stack = ["(idle)"]
+            stack.reverse()
+            counts[";".join([root, *(_format_tag(name, value) for name, value in tags.items()), *stack])] += 1
+
+    @staticmethod
+    def _idle(code: Any) -> bool:
+        """Whether a thread is parked waiting for work or events"""
+        filename = os.path.basename(code.co_filename)
+        return (filename == "selectors.py" and code.co_name == "select") or \
+            (filename == "threading.py" and code.co_name == "wait") or \
+            (filename == "thread.py" and code.co_name == "_worker")
+
+    async def profile(self, seconds: float, interval: float = 0.005, include_idle: bool = False) -> Dict[str, Any]:
+        """
+        Sample all threads for a while
+
+        Args:
+            seconds: Length of the profile
+            interval: Seconds between samples
+            include_idle: Keep samples of threads parked waiting for work
+
+        Returns:
+            Dictionary with the collapsed stack counts ('stacks'), the number of
+            samples and the time spent sampling
+
+        Raises:
+            RuntimeError: If a profile is already running
+        """
+        if self.busy:
+            raise RuntimeError("A profile is already running")
+        self.busy = True
+        loop = asyncio.get_running_loop()
+        loop_thread = threading.get_ident()
+        counts: Counter = Counter()
+        stop = threading.Event()
+        stats = {"samples": 0, "sampling_s": 0.0}
+
+        def run() -> None:
+            deadline = time.perf_counter() + seconds
+            while not stop.is_set() and time.perf_counter() < deadline:
+                started = time.perf_counter()
+                self.sample(counts, loop, loop_thread, include_idle)
+                elapsed = time.perf_counter() - started
+                stats["samples"] += 1
+                stats["sampling_s"] += elapsed
+                stop.wait(max(0.0, interval - elapsed))
+
+        sampler = threading.Thread(target=run, name="profiler", daemon=True)
+        started = time.perf_counter()
+        try:
+            sampler.start()
+            while sampler.is_alive():
+                await asyncio.sleep(min(0.05, seconds))
+        finally:
+            stop.set()
+            self.busy = False
+        duration = time.perf_counter() - started
+        metrics.increment("profiler.runs")
+        metrics.observe("profiler.overhead_pct", stats["sampling_s"] / duration * 100 if duration else 0.0)
+        return {
+            "stacks": counts,
+            "samples": stats["samples"],
+            "duration_s": duration,
+            "interval_ms": interval * 1000,
+            "sampling_overhead_pct": stats["sampling_s"] / duration * 100 if duration else 0.0
+        }
+
+
+def collapsed(stacks: Counter) -> str:
+    """Collapsed stack lines, most frequent first"""
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def tag_totals(stacks: Counter) -> Dict[str, int]:
+    """Samples per tag, e.g. {'[tool:get_weather]': 120}"""
+    totals: Counter = Counter()
+    for stack, count in stacks.items():
+        for frame in stack.split(";"):
+            if frame.startswith("[") and frame.endswith("]"):
+                totals[frame] += count
+    return dict(totals.most_common())
+
+
+def hot_frames(stacks: Counter, limit: int = 20) -> List[Tuple[str, int]]:
+    """
+    Frames that were on the stack (inclusive samples), most frequent first;
+    thread bootstrap frames, on every thread's stack, are left out
+    """
+    totals: Counter = Counter()
+    for stack, count in stacks.items():
+        for frame in set(stack.split(";")[1:]):
+            if not frame.startswith(("[", *_BOOTSTRAP_FRAMES)):
+                totals[frame] += count
+    return totals.most_common(limit)
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,255 @@
+from typing import Dict, Any, Optional, Callable, Tuple, Iterable
+from collections import OrderedDict
+import asyncio
+import json
+import time
+import requests
+from services.metrics import metrics
+import config
+
+# Free-tier quotas of the bundled tools' providers, by host
+DEFAULT_PROVIDER_QUOTAS = {
+    "api.openweathermap.org": {"per_minute": 60, "per_day": 1000},
+    "open.er-api.com": {"per_minute": 30, "per_day": 1500}
+}
+
+# Period in seconds of each quota key
+QUOTA_PERIODS = {"per_second": 1, "per_minute": 60, "per_hour": 3600, "per_day": 86400}
+
+
+class QuotaExceededError(requests.exceptions.RequestException):
+    """Raised when a call would have to wait too long for quota"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at capacity tokens per period"""
+
+    def __init__(self, capacity: float, period: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize a full bucket
+
+        Args:
+            capacity: Maximum tokens (the burst size)
+            period: Seconds to refill the bucket from empty
+            clock: Time source in seconds
+        """
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    @property
+    def remaining(self) -> float:
+        self._refill()
+        return self.tokens
+
+    def wait_time(self, tokens: float = 1) -> float:
+        """Seconds until the bucket holds the given number of tokens"""
+        self._refill()
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    def consume(self, tokens: float = 1) -> bool:
+        """Take tokens if available"""
+        self._refill()
+        if self.tokens < tokens:
+            return False
+        self.tokens -= tokens
+        return True
+
+
+class ProviderQuota:
+    """All quotas of one upstream provider, with a FIFO queue of waiting calls"""
+
+    def __init__(self, name: str, limits: Dict[str, float], clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the quota
+
+        Args:
+            name: Provider name, usually its host
+            limits: Calls allowed per period, e.g., {'per_minute': 60, 'per_day': 1000}
+            clock: Time source in seconds
+        """
+        self.name = name
+        self.buckets: Dict[str, TokenBucket] = {}
+        for key, capacity in limits.items():
+            if key not in QUOTA_PERIODS:
+                raise ValueError(f"Unknown quota period '{key}' for '{name}'")
+            self.buckets[key] = TokenBucket(capacity, QUOTA_PERIODS[key], clock)
+        self.waiting = 0
+        self.rejected = 0
+        self._queue = asyncio.Lock()
+
+    def wait_time(self) -> float:
+        return max((bucket.wait_time() for bucket in self.buckets.values()), default=0.0)
+
+    def pressure(self) -> float:
+        """How much of the tightest quota is used up, from 0.0 to 1.0"""
+        return max((1 - bucket.remaining / bucket.capacity for bucket in self.buckets.values()), default=0.0)
+
+    async def acquire(self, max_wait: float) -> None:
+        """
+        Take one call from every quota, waiting in line if needed
+
+        Args:
+            max_wait: Longest a call may wait for quota, in seconds
+
+        Raises:
+            QuotaExceededError: If the call would have to wait longer than max_wait
+        """
+        self.waiting += 1
+        try:
+            # asyncio.Lock wakes waiters in arrival order, which makes it a FIFO queue
+            async with self._queue:
+                delay = self.wait_time()
+                if delay > max_wait:
+                    self.rejected += 1
+                    metrics.increment("quota.rejected")
+                    raise QuotaExceededError(f"Quota for {self.name} exhausted, retry in {delay:.0f}s", delay)
+                if delay > 0:
+                    metrics.increment("quota.delayed")
+                    metrics.observe("quota.wait_ms", delay * 1000)
+                    await asyncio.sleep(delay)
+                for bucket in self.buckets.values():
+                    bucket.consume()
+        finally:
+            self.waiting -= 1
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "remaining": {key: int(bucket.remaining) for key, bucket in self.buckets.items()},
+            "waiting": self.waiting,
+            "rejected": self.rejected
+        }
+
+
+class QuotaManager:
+    """Quota-aware gate for calls to external providers, keyed by host"""
+
+    def __init__(
+        self,
+        providers: Dict[str, Dict[str, float]],
+        max_wait: float = 10.0,
+        pressure_threshold: float = 0.8,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Initialize the manager
+
+        Args:
+            providers: Quota limits by host, e.g., {'open.er-api.com': {'per_minute': 30}}
+            max_wait: Longest a call may wait in the queue, in seconds
+            pressure_threshold: Fraction of a quota used up from which cached
+                                data is preferred over fresh calls
+            clock: Time source in seconds
+        """
+        self.limits = providers
+        self.max_wait = max_wait
+        self.pressure_threshold = pressure_threshold
+        self.clock = clock
+        self.reset()
+
+    def reset(self) -> None:
+        """Refill every quota and forget the counters"""
+        self.providers = {host: ProviderQuota(host, limits, self.clock) for host, limits in self.limits.items()}
+
+    async def acquire(self, host: str) -> None:
+        """Wait for quota for one call to a host (hosts without a quota pass at once)"""
+        provider = self.providers.get(host)
+        if provider is not None:
+            await provider.acquire(self.max_wait)
+
+    def under_pressure(self, host: str) -> bool:
+        """Whether a host's quota is nearly used up"""
+        provider = self.providers.get(host)
+        return provider is not None and provider.pressure() >= self.pressure_threshold
+
+    def status(self) -> Dict[str, Any]:
+        """Remaining budget and queue length per provider"""
+        return {host: provider.status() for host, provider in self.providers.items()}
+
+
+class ClientRateLimiter:
+    """Per-client token buckets for the public endpoints"""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None, max_clients: int = 10000,
+                 clock: Callable[[], float] = time.monotonic, api_keys: Iterable[str] = ()):
+        """
+        Initialize the limiter
+
+        Args:
+            per_minute: Requests each client may make per minute
+            burst: Requests a client may make at once (defaults to per_minute)
+            max_clients: Number of client buckets kept (least recently seen dropped first)
+            clock: Time source in seconds
+            api_keys: Configured API keys, which get a bucket of their own
+        """
+        self.capacity = burst or per_minute
+        self.period = self.capacity / per_minute * 60
+        self.max_clients = max_clients
+        self.clock = clock
+        self.api_keys = frozenset(api_keys)
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def client_id(self, api_key: Optional[str], address: Optional[str]) -> str:
+        """
+        Bucket key of a request
+
+        API keys are not authenticated here, so only configured keys identify a
+        client; any other key would give its caller a fresh bucket per value.
+
+        Args:
+            api_key: The request's X-API-Key header (optional)
+            address: The client's address (optional)
+
+        Returns:
+            'key:<api_key>' for a configured key, else 'addr:<address>'
+        """
+        if api_key and api_key in self.api_keys:
+            return f"key:{api_key}"
+        return f"addr:{address or 'unknown'}"
+
+    def check(self, client: str) -> Tuple[bool, float]:
+        """
+        Count a request from a client
+
+        Args:
+            client: Client identifier, e.g., its API key or address
+
+        Returns:
+            Tuple of whether the request is allowed and the seconds to wait if not
+        """
+        bucket = self.buckets.get(client)
+        if bucket is None:
+            bucket = self.buckets[client] = TokenBucket(self.capacity, self.period, self.clock)
+            while len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        self.buckets.move_to_end(client)
+        if bucket.consume():
+            return True, 0.0
+        return False, bucket.wait_time()
+
+
+def parse_provider_quotas(spec: Optional[str]) -> Dict[str, Dict[str, float]]:
+    """Parse provider quotas from JSON, falling back to the free-tier defaults"""
+    return json.loads(spec) if spec else DEFAULT_PROVIDER_QUOTAS
+
+
+# Shared manager used by the upstream client
+quota_manager = QuotaManager(
+    parse_provider_quotas(config.QUOTA_LIMITS),
+    max_wait=config.QUOTA_MAX_WAIT,
+    pressure_threshold=config.QUOTA_PRESSURE_THRESHOLD
+)
+metrics.register_collector("quota", quota_manager.status)
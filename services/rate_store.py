@@ -0,0 +1,329 @@
+"""
+Local columnar store of daily exchange rates.
+
+One float64 file per currency holds its rate against the base currency for
+each day since EPOCH (NaN where no rate is known), memory-mapped for reads.
+Lookups and range aggregations are NumPy slices of those arrays.
+
+Fed by periodic snapshots of the latest rate table and by offline bulk
+imports of wide CSV files ('date,EUR,GBP,...', one row per day):
+
+    python -m services.rate_store import rates.csv [--base EUR]
+"""
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import date, datetime, timedelta, timezone
+import csv
+import os
+import re
+import sys
+import threading
+import numpy as np
+import config
+
+# Day 0 of every column
+EPOCH = date(1999, 1, 1)
+
+# Columns grow by this many days at a time
+GROWTH_DAYS = 366
+
+# Days looked back for the last known rate when a day has none (weekends, holidays)
+MAX_GAP_DAYS = 7
+
+CURRENCY_CODE = re.compile(r"[A-Z]{3}")
+
+
+def day_index(day: date) -> int:
+    """Position of a day in the columns"""
+    index = (day - EPOCH).days
+    if index < 0:
+        raise ValueError(f"Dates before {EPOCH.isoformat()} are not stored")
+    return index
+
+
+def parse_date(value: Any) -> date:
+    """Parse an ISO date ('YYYY-MM-DD') or pass a date through"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value).strip()[:10])
+
+
+class RateStore:
+    """
+    Daily exchange rates against one base currency, one memory-mapped column
+    per currency. A single process should write; any number can read.
+    """
+
+    def __init__(self, path: str, base: str = "USD"):
+        """
+        Initialize the store
+
+        Args:
+            path: Directory of the column files (created if missing)
+            base: Currency every stored rate is quoted against
+        """
+        self.path = path
+        self.base = base.upper()
+        self._columns: Dict[str, np.memmap] = {}
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, currency: str) -> str:
+        return os.path.join(self.path, f"{currency}.f64")
+
+    def currencies(self) -> List[str]:
+        """Currencies with a column, plus the base currency"""
+        names = {name[:-4] for name in os.listdir(self.path) if name.endswith(".f64")}
+        return sorted(names | {self.base})
+
+    def column(self, currency: str, min_days: int = 0) -> Optional[np.memmap]:
+        """
+        Memory-mapped rates of a currency, indexed by day since EPOCH
+
+        Args:
+            currency: Currency code
+            min_days: Length needed; a column shorter than that is reopened in
+                      case another process extended it
+
+        Returns:
+            The column, or None if the currency is unknown
+
+        Raises:
+            ValueError: If the code is not three letters (it names a file)
+        """
+        currency = currency.upper()
+        if not CURRENCY_CODE.fullmatch(currency):
+            raise ValueError(f"Invalid currency code '{currency}'")
+        mapped = self._columns.get(currency)
+        if mapped is not None and len(mapped) >= min_days:
+            return mapped
+        filename = self._file(currency)
+        if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+            return None
+        mapped = np.memmap(filename, dtype=np.float64, mode="r")
+        self._columns[currency] = mapped
+        return mapped
+
+    def _writable(self, currency: str, days: int) -> np.memmap:
+        """Column of a currency opened for writing, grown to at least 'days' days"""
+        filename = self._file(currency)
+        length = os.path.getsize(filename) // 8 if os.path.exists(filename) else 0
+        if length < days:
+            grown = -(-days // GROWTH_DAYS) * GROWTH_DAYS
+            with open(filename, "ab") as handle:
+                handle.write(np.full(grown - length, np.nan, dtype=np.float64).tobytes())
+        # Readers pick up the new length on their next lookup past the old end
+        self._columns.pop(currency, None)
+        return np.memmap(filename, dtype=np.float64, mode="r+")
+
+    def write_columns(self, days: np.ndarray, rates: Dict[str, np.ndarray]) -> int:
+        """
+        Store rates for many days at once
+
+        Args:
+            days: Day indexes (since EPOCH)
+            rates: Rates against the base per currency, aligned with days (NaN to skip)
+
+        Returns:
+            Number of rates stored
+        """
+        if len(days) == 0:
+            return 0
+        stored = 0
+        size = int(days.max()) + 1
+        with self._lock:
+            for currency, values in rates.items():
+                currency = currency.upper()
+                if currency == self.base or not CURRENCY_CODE.fullmatch(currency):
+                    continue
+                known = ~np.isnan(values)
+                if not known.any():
+                    continue
+                column = self._writable(currency, size)
+                column[days[known]] = values[known]
+                column.flush()
+                stored += int(known.sum())
+        return stored
+
+    def write_snapshot(self, day: date, rates: Dict[str, float], base: Optional[str] = None) -> int:
+        """
+        Store one day's rate table
+
+        Args:
+            day: Day the rates apply to
+            rates: Rate per currency, quoted against 'base'
+            base: Currency the table is quoted against (defaults to the store's base)
+
+        Returns:
+            Number of rates stored
+        """
+        names = [name.upper() for name in rates]
+        values = np.array([float(rates[name]) for name in rates], dtype=np.float64)
+        names, table = self._rebase(names, values[np.newaxis, :], (base or self.base).upper())
+        values = table[0]
+        return self.write_columns(np.array([day_index(day)]), {name: values[[i]] for i, name in enumerate(names)})
+
+    def _rebase(self, names: List[str], table: np.ndarray, base: str) -> Tuple[List[str], np.ndarray]:
+        """
+        Convert a (days x currencies) table quoted against 'base' to the store's base
+
+        Returns:
+            The column names, with the table's base added when it had no column,
+            and the converted table
+        """
+        if base == self.base:
+            return names, table
+        if self.base not in names:
+            raise ValueError(f"The table needs a {self.base} column to be rebased from {base}")
+        # X per store base = (X per table base) / (store base per table base)
+        store_base = table[:, [names.index(self.base)]]
+        rebased = table / store_base
+        if base not in names:
+            names = names + [base]
+            rebased = np.hstack([rebased, 1.0 / store_base])
+        return names, rebased
+
+    def import_csv(self, filename: str, base: Optional[str] = None) -> int:
+        """
+        Bulk import a wide CSV file: a 'date' column, then one column per currency
+
+        Args:
+            filename: CSV file; empty cells and 'N/A' are skipped
+            base: Currency the file's rates are quoted against (defaults to the store's base)
+
+        Returns:
+            Number of rates stored
+        """
+        with open(filename, newline="") as handle:
+            reader = csv.reader(handle)
+            header = next(reader)
+            names = [name.strip().upper() for name in header[1:]]
+            day_values = []
+            rows = []
+            for row in reader:
+                if not row or not row[0].strip():
+                    continue
+                day_values.append(day_index(parse_date(row[0])))
+                rows.append([cell.strip() for cell in row[1:len(names) + 1]])
+
+        table = np.full((len(rows), len(names)), np.nan, dtype=np.float64)
+        for position, cells in enumerate(rows):
+            table[position, :len(cells)] = [float(cell) if cell and cell.upper() != "N/A" else np.nan for cell in cells]
+        names, table = self._rebase(names, table, (base or self.base).upper())
+        days = np.array(day_values, dtype=np.int64)
+        return self.write_columns(days, {name: table[:, i] for i, name in enumerate(names)})
+
+    def series(self, currency: str, start: date, end: date) -> np.ndarray:
+        """
+        Rates of a currency against the base for a range of days
+
+        Args:
+            currency: Currency code
+            start: First day
+            end: Last day (inclusive)
+
+        Returns:
+            One rate per day, NaN where unknown
+
+        Raises:
+            ValueError: If the currency code is invalid
+        """
+        first, last = day_index(start), day_index(end) + 1
+        if not CURRENCY_CODE.fullmatch(currency.upper()):
+            raise ValueError(f"Invalid currency code '{currency.upper()}'")
+        if currency.upper() == self.base:
+            return np.ones(last - first)
+        column = self.column(currency, last)
+        out = np.full(last - first, np.nan)
+        if column is not None and first < len(column):
+            part = column[first:min(last, len(column))]
+            out[:len(part)] = part
+        return out
+
+    def cross_series(self, from_currency: str, to_currency: str, start: date, end: date) -> np.ndarray:
+        """Units of to_currency per unit of from_currency for each day of a range"""
+        return self.series(to_currency, start, end) / self.series(from_currency, start, end)
+
+    def cross_rate(self, from_currency: str, to_currency: str, day: date) -> Optional[Tuple[float, date]]:
+        """
+        Rate on a day, or on the last earlier day with one (up to MAX_GAP_DAYS back)
+
+        Returns:
+            The rate and the day it was recorded, or None if unknown
+        """
+        window = self.cross_series(from_currency, to_currency, max(EPOCH, day - timedelta(days=MAX_GAP_DAYS)), day)
+        known = np.flatnonzero(~np.isnan(window))
+        if len(known) == 0:
+            return None
+        position = known[-1]
+        return float(window[position]), day - timedelta(days=len(window) - 1 - int(position))
+
+    def trend(self, from_currency: str, to_currency: str, start: date, end: date) -> Optional[Dict[str, Any]]:
+        """
+        Summary of a currency pair over a range of days
+
+        Returns:
+            First and last rate, change, min, max, mean and volatility, or None
+            if no rate is known in the range
+        """
+        rates = self.cross_series(from_currency, to_currency, start, end)
+        known = np.flatnonzero(~np.isnan(rates))
+        if len(known) == 0:
+            return None
+        values = rates[known]
+        first, last = float(values[0]), float(values[-1])
+        # Standard deviation of the daily log returns between known days
+        returns = np.diff(np.log(values))
+        return {
+            "first": {"date": (start + timedelta(days=int(known[0]))).isoformat(), "rate": first},
+            "last": {"date": (start + timedelta(days=int(known[-1]))).isoformat(), "rate": last},
+            "change_pct": (last / first - 1) * 100,
+            "min": {"date": (start + timedelta(days=int(known[np.argmin(values)]))).isoformat(), "rate": float(values.min())},
+            "max": {"date": (start + timedelta(days=int(known[np.argmax(values)]))).isoformat(), "rate": float(values.max())},
+            "mean": float(values.mean()),
+            "volatility_pct": float(returns.std() * 100) if len(returns) > 1 else 0.0,
+            "days_with_data": int(len(known))
+        }
+
+    def close(self) -> None:
+        """Drop the memory maps"""
+        self._columns.clear()
+
+
+_rate_store: Optional[RateStore] = None
+
+
+def get_rate_store() -> RateStore:
+    """Get the process-wide rate store (created on first use)"""
+    global _rate_store
+    if _rate_store is None:
+        _rate_store = RateStore(config.RATE_STORE_PATH, config.RATE_STORE_BASE)
+    return _rate_store
+
+
+async def snapshot_latest_rates(store: Optional[RateStore] = None) -> int:
+    """
+    Store today's table of the exchange-rate API
+
+    Returns:
+        Number of rates stored
+    """
+    from services.upstream import upstream
+
+    store = store or get_rate_store()
+    data = await upstream.get_json(f"https://open.er-api.com/v6/latest/{store.base}")
+    if data.get("result") != "success":
+        raise ValueError("Failed to fetch exchange rates")
+    day = datetime.fromtimestamp(data["time_last_update_unix"], tz=timezone.utc).date()
+    return store.write_snapshot(day, data["rates"], data.get("base_code", store.base))
+
+
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    if len(arguments) < 2 or arguments[0] != "import":
+        print("Usage: python -m services.rate_store import <file.csv> [--base CODE]")
+        sys.exit(2)
+    file_base = arguments[arguments.index("--base") + 1] if "--base" in arguments else None
+    count = get_rate_store().import_csv(arguments[1], file_base)
+    print(f"Imported {count} rates into {config.RATE_STORE_PATH}")
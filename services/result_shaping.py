@@ -0,0 +1,104 @@
+from typing import Dict, Any, List, Optional
+import re
+from services.serialization import dumps
+
+# Strings that are a number followed by a unit, e.g., "12.3°C", "60%" or "3.1 m/s"
+NUMBER_WITH_UNIT = re.compile(r"\s*(-?\d+(?:\.\d+)?)\s*(?:°\s*[CFK]|%|[A-Za-z/]+)?\s*")
+
+# Marker left where items or text were cut to fit a size cap
+TRUNCATION_MARKER = "...[truncated {count} {unit}]"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a prompt fragment (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def _parse_number(value: str) -> Any:
+    match = NUMBER_WITH_UNIT.fullmatch(value)
+    if not match:
+        return value
+    number = match.group(1)
+    return float(number) if "." in number else int(number)
+
+
+def _transform(value: Any, parse_numbers: bool, digits: Optional[int]) -> Any:
+    if isinstance(value, dict):
+        return {key: _transform(item, parse_numbers, digits) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_transform(item, parse_numbers, digits) for item in value]
+    if parse_numbers and isinstance(value, str):
+        value = _parse_number(value)
+    if digits is not None and isinstance(value, float):
+        value = round(value, digits)
+    return value
+
+
+def _is_marker(item: Any) -> bool:
+    return isinstance(item, str) and item.startswith("...[truncated")
+
+
+def _record_lists(value: Any, found: List[List[Any]]) -> List[List[Any]]:
+    """Collect the lists of records (dicts or rows) in a result, which can lose items"""
+    if isinstance(value, dict):
+        for item in value.values():
+            _record_lists(item, found)
+    elif isinstance(value, list):
+        if any(isinstance(item, (dict, list)) for item in value):
+            found.append(value)
+        for item in value:
+            _record_lists(item, found)
+    return found
+
+
+def _cap(value: Any, max_chars: int) -> str:
+    """Serialize a result, dropping records and then text until it fits"""
+    text = dumps(value)
+    original_lengths: Dict[int, int] = {}
+    while len(text) > max_chars:
+        lists = [items for items in _record_lists(value, []) if len([i for i in items if not _is_marker(i)]) > 1]
+        if not lists:
+            break
+        # Halve the largest list of records and note how many were left out
+        largest = max(lists, key=lambda items: len(dumps(items)))
+        records = [item for item in largest if not _is_marker(item)]
+        total = original_lengths.setdefault(id(largest), len(records))
+        keep = len(records) // 2
+        largest[:] = records[:keep] + [TRUNCATION_MARKER.format(count=total - keep, unit="items")]
+        text = dumps(value)
+
+    if len(text) > max_chars:
+        marker = TRUNCATION_MARKER.format(count=len(text) - max_chars, unit="chars")
+        text = text[:max(0, max_chars - len(marker))] + marker
+    return text
+
+
+def shape_for_llm(result: Any, view: Optional[Dict[str, Any]]) -> str:
+    """
+    Build the compact form of a tool result that is sent back to the LLM
+
+    Args:
+        result: Result returned by the tool
+        view: The tool's LLM view with any of these keys:
+              'fields' (keys to keep), 'parse_numbers' (turn "12.3°C" into 12.3),
+              'round' (decimal places for floats), 'rename' (old key -> short key)
+              and 'max_chars' (size cap, with truncation markers)
+
+    Returns:
+        JSON text for the tool message
+    """
+    if not view or (isinstance(result, dict) and "error" in result):
+        # Errors are passed through so the model sees exactly what went wrong
+        return dumps(result)
+
+    # Every step builds new containers, so the caller's result is never modified
+    shaped = result
+    if isinstance(shaped, dict) and view.get("fields"):
+        shaped = {key: shaped[key] for key in view["fields"] if key in shaped}
+    shaped = _transform(shaped, view.get("parse_numbers", False), view.get("round"))
+    if isinstance(shaped, dict) and view.get("rename"):
+        shaped = {view["rename"].get(key, key): item for key, item in shaped.items()}
+
+    if view.get("max_chars"):
+        return _cap(shaped, view["max_chars"])
+    return dumps(shaped)
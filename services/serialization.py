@@ -0,0 +1,85 @@
+from typing import Any
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
+from uuid import UUID
+import json
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # Fall back to the standard library encoder
+    orjson = None
+
+HAS_ORJSON = orjson is not None
+
+
+def _default(value: Any) -> Any:
+    """Convert values the JSON encoders don't handle natively"""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    # numpy scalars and arrays, without importing numpy
+    if hasattr(value, "dtype"):
+        if hasattr(value, "tolist"):
+            return value.tolist()
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if HAS_ORJSON:
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(value: Any) -> bytes:
+        """
+        Serialize a value to UTF-8 JSON
+
+        Args:
+            value: Value to serialize; datetimes, Decimals, numpy values and
+                   pydantic models are converted on the way
+
+        Returns:
+            Compact JSON bytes
+        """
+        return orjson.dumps(value, default=_default, option=_OPTIONS)
+
+    def dumps(value: Any) -> str:
+        """Serialize a value to a compact JSON string"""
+        return orjson.dumps(value, default=_default, option=_OPTIONS).decode("utf-8")
+
+    loads = orjson.loads
+else:
+    def dumps_bytes(value: Any) -> bytes:
+        """
+        Serialize a value to UTF-8 JSON
+
+        Args:
+            value: Value to serialize; datetimes, Decimals, numpy values and
+                   pydantic models are converted on the way
+
+        Returns:
+            Compact JSON bytes
+        """
+        return dumps(value).encode("utf-8")
+
+    def dumps(value: Any) -> str:
+        """Serialize a value to a compact JSON string"""
+        return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":"))
+
+    loads = json.loads
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with the fast encoder instead of json.dumps"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
@@ -0,0 +1,214 @@
+from typing import Dict, Any, List, Optional
+from collections import OrderedDict
+from itertools import islice
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class Session:
+    """
+    A server-side conversation.
+    Holds the full tool-augmented message history in LiteLLM format.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        messages: Optional[List[Dict[str, Any]]] = None,
+        created_at: Optional[float] = None,
+        last_active: Optional[float] = None
+    ):
+        now = time.time()
+        self.session_id = session_id
+        self.messages = messages if messages is not None else []
+        self.created_at = created_at or now
+        self.last_active = last_active or now
+        # Serializes turns so concurrent requests cannot interleave their messages
+        self.lock = asyncio.Lock()
+
+    def touch(self) -> None:
+        """Mark the session as used now"""
+        self.last_active = time.time()
+
+
+class SessionStore:
+    """
+    Bounded in-memory LRU store for sessions.
+    Least recently used sessions are spilled to SQLite when a spill path is
+    configured (otherwise dropped), and idle sessions expire.
+    """
+
+    def __init__(self, max_sessions: int = 1000, idle_ttl: float = 1800, spill_path: Optional[str] = None):
+        """
+        Initialize the store
+
+        Args:
+            max_sessions: Maximum number of sessions kept in memory
+            idle_ttl: Seconds of inactivity after which a session expires
+            spill_path: SQLite file for sessions evicted from memory (optional)
+        """
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if spill_path:
+            self._db = sqlite3.connect(spill_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, messages TEXT NOT NULL, created_at REAL, last_active REAL)"
+            )
+            self._db.commit()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(self, system_prompt: Optional[str] = None) -> Session:
+        """
+        Create a new session
+
+        Args:
+            system_prompt: Optional system message the conversation starts with
+
+        Returns:
+            The new session
+        """
+        messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        session = Session(uuid.uuid4().hex, messages)
+        self.save(session)
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """
+        Get a session by id, loading it back from the spill file if needed
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            The session, or None if it does not exist or has expired
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._load_spilled(session_id)
+            if session is None:
+                return None
+            self._sessions[session_id] = session
+            self._evict()
+
+        if self._is_expired(session):
+            self.delete(session_id)
+            return None
+
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def save(self, session: Session) -> None:
+        """
+        Store a session after a turn, marking it as most recently used
+
+        Args:
+            session: Session to store
+        """
+        session.touch()
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+        self._evict()
+
+    def delete(self, session_id: str) -> bool:
+        """
+        Delete a session from memory and the spill file
+
+        Args:
+            session_id: Session identifier
+
+        Returns:
+            True if the session existed
+        """
+        found = self._sessions.pop(session_id, None) is not None
+        if self._db is not None:
+            with self._db_lock:
+                cursor = self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                self._db.commit()
+            found = found or cursor.rowcount > 0
+        return found
+
+    def expire(self) -> int:
+        """
+        Remove sessions that have been idle longer than the TTL
+
+        Returns:
+            Number of sessions removed
+        """
+        expired = [
+            sid for sid, session in self._sessions.items()
+            if self._is_expired(session) and not session.lock.locked()
+        ]
+        for session_id in expired:
+            del self._sessions[session_id]
+
+        removed = len(expired)
+        if self._db is not None:
+            with self._db_lock:
+                cursor = self._db.execute(
+                    "DELETE FROM sessions WHERE last_active < ?", (time.time() - self.idle_ttl,)
+                )
+                self._db.commit()
+            removed += cursor.rowcount
+        return removed
+
+    def _is_expired(self, session: Session) -> bool:
+        return time.time() - session.last_active > self.idle_ttl
+
+    def _evict(self) -> None:
+        """
+        Move least recently used sessions out of memory until within bounds.
+        Sessions in the middle of a turn are skipped: their lock is held, and a
+        copy loaded back from the spill file would get a lock of its own. The
+        most recently used session always stays.
+        """
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        evicted = []
+        for session_id, session in islice(self._sessions.items(), len(self._sessions) - 1):
+            if len(evicted) == excess:
+                break
+            if not session.lock.locked():
+                evicted.append(session_id)
+        for session_id in evicted:
+            session = self._sessions.pop(session_id)
+            if self._db is not None and not self._is_expired(session):
+                self._spill(session)
+
+    def _spill(self, session: Session) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (id, messages, created_at, last_active) VALUES (?, ?, ?, ?)",
+                (session.session_id, json.dumps(session.messages), session.created_at, session.last_active)
+            )
+            self._db.commit()
+
+    def _load_spilled(self, session_id: str) -> Optional[Session]:
+        """Take a session out of the spill file"""
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT messages, created_at, last_active FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._db.commit()
+        return Session(session_id, json.loads(row[0]), row[1], row[2])
+
+    def close(self) -> None:
+        """Close the spill file"""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
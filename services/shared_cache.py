@@ -0,0 +1,593 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from urllib.parse import urlsplit
+import asyncio
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from services.metrics import metrics
+from services.serialization import dumps_bytes, loads
+import config
+
+# Pub/sub channel (Redis protocol) used to tell other workers to drop L1 entries
+INVALIDATION_CHANNEL = "agent_ai:invalidate"
+
+# Seconds the shared tier is skipped after an error; doubles on each failed retry
+BACKOFF_MIN = 1.0
+BACKOFF_MAX = 30.0
+
+
+class CacheUnavailable(Exception):
+    """The shared cache is skipped after a recent error"""
+
+
+class CacheBackend(ABC):
+    """
+    Shared (L2) cache storage that all worker processes can reach.
+    Values are bytes; keys are namespaced by the caller. The methods block;
+    on the event loop, call them through run().
+    """
+
+    def __init__(self):
+        # Identifies this process so it can skip its own invalidation messages
+        self.origin = uuid.uuid4().hex
+        self._listeners: List[Callable[[str], None]] = []
+        self._backoff = 0.0
+        self._retry_at = 0.0
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Get a value, or None if it is not stored or has expired"""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Store a value for ttl seconds"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Drop a value"""
+
+    @abstractmethod
+    def publish_invalidation(self, key: str) -> None:
+        """Tell the other workers to drop their L1 copy of a key"""
+
+    @abstractmethod
+    def _poll_invalidations(self) -> List[str]:
+        """Keys invalidated by other workers since the last poll"""
+
+    def _invalidations_due(self) -> bool:
+        """Whether _poll_invalidations may have anything to return"""
+        return True
+
+    def store(self, key: str, value: bytes, ttl: float) -> None:
+        """Store a value and tell the other workers; backends override this to do both in one round trip"""
+        self.set(key, value, ttl)
+        self.publish_invalidation(key)
+
+    def invalidate(self, key: str) -> None:
+        """Drop a value and tell the other workers; backends override this to do both in one round trip"""
+        self.delete(key)
+        self.publish_invalidation(key)
+
+    async def run(self, operation: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run a blocking backend method in a worker thread
+
+        After an error the backend is skipped for BACKOFF_MIN seconds, doubling
+        up to BACKOFF_MAX while it keeps failing, so a dead server is not
+        re-dialed on every call.
+
+        Raises:
+            CacheUnavailable: While the backend is skipped
+            Exception: The error of the operation
+        """
+        if time.monotonic() < self._retry_at:
+            raise CacheUnavailable("Shared cache skipped after a recent error")
+        try:
+            result = await asyncio.to_thread(operation, *args)
+        except Exception:
+            self._backoff = min(self._backoff * 2, BACKOFF_MAX) if self._backoff else BACKOFF_MIN
+            self._retry_at = time.monotonic() + self._backoff
+            raise
+        self._backoff = 0.0
+        return result
+
+    def add_listener(self, listener: Callable[[str], None]) -> None:
+        """Register a callback for keys invalidated by other workers"""
+        self._listeners.append(listener)
+
+    async def process_invalidations(self) -> None:
+        """Deliver pending invalidations from other workers to the listeners"""
+        if not self._invalidations_due():
+            return
+        for key in await self.run(self._poll_invalidations):
+            for listener in self._listeners:
+                listener(key)
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Local-only shared cache in a SQLite database in WAL mode, for workers on
+    one host. Invalidations go through a table that each worker polls.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.5):
+        """
+        Initialize the backend; the database is opened on first use so the
+        backend can be created before uvicorn forks its workers
+
+        Args:
+            path: SQLite database file shared by the workers
+            poll_interval: Minimum seconds between checks for invalidations
+        """
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last_invalidation = 0
+        self._last_poll = 0.0
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS invalidations ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, origin TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            # Only invalidations published from now on concern this worker
+            self._last_invalidation = conn.execute("SELECT COALESCE(MAX(id), 0) FROM invalidations").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl)
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def publish_invalidation(self, key: str) -> None:
+        with self._lock:
+            self._insert_invalidation(self._connect(), key)
+
+    def _insert_invalidation(self, conn: sqlite3.Connection, key: str) -> None:
+        now = time.time()
+        conn.execute(
+            "INSERT INTO invalidations (key, origin, created_at) VALUES (?, ?, ?)", (key, self.origin, now)
+        )
+        # Workers poll every fraction of a second, so old messages can go
+        conn.execute("DELETE FROM invalidations WHERE created_at < ?", (now - 60,))
+
+    def store(self, key: str, value: bytes, ttl: float) -> None:
+        # One transaction, so one commit for the value and its invalidation
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, time.time() + ttl)
+                )
+                self._insert_invalidation(conn, key)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._insert_invalidation(conn, key)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _invalidations_due(self) -> bool:
+        return time.monotonic() - self._last_poll >= self.poll_interval
+
+    def _poll_invalidations(self) -> List[str]:
+        self._last_poll = time.monotonic()
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id, key, origin FROM invalidations WHERE id > ? ORDER BY id", (self._last_invalidation,)
+            ).fetchall()
+        if rows:
+            self._last_invalidation = rows[-1][0]
+        return [key for _, key, origin in rows if origin != self.origin]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+
+class RespConnection:
+    """Minimal blocking client for the Redis serialization protocol (RESP2)"""
+
+    def __init__(self, host: str, port: int, db: int = 0, timeout: float = 2.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._reader = None
+
+    def connect(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile("rb")
+        if self.db:
+            self.command("SELECT", self.db)
+
+    def close(self) -> None:
+        # May race with the subscriber thread closing the same connection
+        sock, reader = self._sock, self._reader
+        self._sock = None
+        self._reader = None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            try:
+                reader.close()
+                sock.close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def encode(*args: Any) -> bytes:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        return b"".join(parts)
+
+    def send(self, *args: Any) -> None:
+        if self._sock is None:
+            self.connect()
+        self._sock.sendall(self.encode(*args))
+
+    def read_reply(self) -> Any:
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by the cache server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RespError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            return None if count < 0 else [self.read_reply() for _ in range(count)]
+        raise RespError(f"Unexpected reply type {kind!r}")
+
+    def command(self, *args: Any) -> Any:
+        """Send a command and read its reply, reconnecting once if the connection dropped"""
+        try:
+            self.send(*args)
+            return self.read_reply()
+        except (OSError, ConnectionError):
+            self.close()
+            self.send(*args)
+            return self.read_reply()
+
+    def _pipeline(self, commands: List[tuple]) -> List[Any]:
+        if self._sock is None:
+            self.connect()
+        self._sock.sendall(b"".join(self.encode(*args) for args in commands))
+        replies, error = [], None
+        # Read every reply, even after an error one, to keep the connection in step
+        for _ in commands:
+            try:
+                replies.append(self.read_reply())
+            except RespError as e:
+                replies.append(None)
+                error = error or e
+        if error is not None:
+            raise error
+        return replies
+
+    def pipeline(self, *commands: tuple) -> List[Any]:
+        """Send several commands in one write and read their replies, reconnecting once if the connection dropped"""
+        try:
+            return self._pipeline(list(commands))
+        except (OSError, ConnectionError):
+            self.close()
+            return self._pipeline(list(commands))
+
+
+class RespCacheBackend(CacheBackend):
+    """
+    Shared cache on a Redis-protocol server (Redis, Valkey, or a local stand-in).
+    Invalidations are fanned out with PUBLISH and received by a subscriber thread.
+    """
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        """
+        Initialize the backend; connections are opened on first use
+
+        Args:
+            url: Server URL, e.g., 'redis://localhost:6379/0'
+            timeout: Socket timeout in seconds for commands
+        """
+        super().__init__()
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.db = int(parts.path.strip("/") or 0)
+        self.timeout = timeout
+        self._conn = RespConnection(self.host, self.port, self.db, timeout)
+        self._lock = threading.Lock()
+        self._pending: "queue.Queue[str]" = queue.Queue()
+        self._subscriber: Optional[threading.Thread] = None
+        self._subscription: Optional[RespConnection] = None
+        self._closed = threading.Event()
+
+    def _command(self, *args: Any) -> Any:
+        with self._lock:
+            return self._conn.command(*args)
+
+    def get(self, key: str) -> Optional[bytes]:
+        self._ensure_subscriber()
+        return self._command("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._command("SET", key, value, "PX", max(1, int(ttl * 1000)))
+
+    def delete(self, key: str) -> None:
+        self._command("DEL", key)
+
+    def publish_invalidation(self, key: str) -> None:
+        self._command("PUBLISH", INVALIDATION_CHANNEL, f"{self.origin} {key}")
+
+    def store(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._conn.pipeline(
+                ("SET", key, value, "PX", max(1, int(ttl * 1000))),
+                ("PUBLISH", INVALIDATION_CHANNEL, f"{self.origin} {key}")
+            )
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._conn.pipeline(("DEL", key), ("PUBLISH", INVALIDATION_CHANNEL, f"{self.origin} {key}"))
+
+    def _ensure_subscriber(self) -> None:
+        if self._subscriber is None:
+            self._subscriber = threading.Thread(target=self._listen, name="cache-invalidations", daemon=True)
+            self._subscriber.start()
+
+    def _listen(self) -> None:
+        backoff = 0.1
+        while not self._closed.is_set():
+            connection = RespConnection(self.host, self.port, self.db, timeout=None)
+            self._subscription = connection
+            try:
+                connection.send("SUBSCRIBE", INVALIDATION_CHANNEL)
+                while not self._closed.is_set():
+                    reply = connection.read_reply()
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        origin, _, key = reply[2].decode("utf-8").partition(" ")
+                        if origin != self.origin:
+                            self._pending.put(key)
+                    backoff = 0.1
+            except (OSError, ConnectionError, RespError) as e:
+                if not self._closed.is_set():
+                    print(f"Cache invalidation subscriber disconnected: {str(e)}")
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 5.0)
+            finally:
+                connection.close()
+
+    def _invalidations_due(self) -> bool:
+        return not self._pending.empty()
+
+    def _poll_invalidations(self) -> List[str]:
+        keys = []
+        while True:
+            try:
+                keys.append(self._pending.get_nowait())
+            except queue.Empty:
+                return keys
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._subscription is not None:
+            # Unblocks the subscriber thread waiting for a message
+            self._subscription.close()
+        with self._lock:
+            self._conn.close()
+
+
+class TieredCache:
+    """
+    Two-level cache: an in-process L1 (LRU with expiry) in front of an
+    optional shared L2 backend. Writes and invalidations are fanned out so
+    other workers drop their L1 copies. L2 calls run in worker threads, off
+    the event loop. Backend errors never fail a lookup; the cache just
+    behaves as L1-only until the backend is back.
+    """
+
+    def __init__(self, namespace: str, backend: Optional[CacheBackend] = None, max_entries: int = 1024):
+        """
+        Initialize the cache
+
+        Args:
+            namespace: Prefix separating this cache's keys in the backend, e.g., 'tool'
+            backend: Shared L2 backend (optional)
+            max_entries: Maximum number of L1 entries
+        """
+        self.namespace = namespace
+        self.backend = backend
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Any]" = OrderedDict()
+        if backend is not None:
+            backend.add_listener(self._on_invalidation)
+
+    def _backend_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _on_invalidation(self, backend_key: str) -> None:
+        prefix = f"{self.namespace}:"
+        if backend_key.startswith(prefix):
+            self.entries.pop(backend_key[len(prefix):], None)
+
+    async def _backend_call(self, call: Awaitable[Any]) -> Any:
+        try:
+            return await call
+        except CacheUnavailable:
+            metrics.increment("shared_cache.skipped")
+            return None
+        except Exception as e:
+            metrics.increment("shared_cache.errors")
+            print(f"Shared cache unavailable, using the local cache only: {str(e)}")
+            return None
+
+    async def get(self, key: str) -> Any:
+        """
+        Get a cached value
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The value, or None if it is not cached or has expired
+        """
+        if self.backend is not None:
+            await self._backend_call(self.backend.process_invalidations())
+
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > now:
+                self.entries.move_to_end(key)
+                metrics.increment("shared_cache.l1_hits")
+                return value
+            del self.entries[key]
+
+        if self.backend is not None:
+            raw = await self._backend_call(self.backend.run(self.backend.get, self._backend_key(key)))
+            if raw is not None:
+                stored = loads(raw)
+                if stored["expires_at"] > now:
+                    self._store_local(key, stored["value"], stored["expires_at"])
+                    metrics.increment("shared_cache.l2_hits")
+                    return stored["value"]
+
+        metrics.increment("shared_cache.misses")
+        return None
+
+    async def set(self, key: str, value: Any, ttl: float) -> None:
+        """
+        Cache a JSON-serializable value in both levels
+
+        Args:
+            key: Cache key
+            value: Value to cache
+            ttl: Seconds the value stays valid
+        """
+        expires_at = time.time() + ttl
+        self._store_local(key, value, expires_at)
+        if self.backend is not None:
+            data = dumps_bytes({"value": value, "expires_at": expires_at})
+            await self._backend_call(self.backend.run(self.backend.store, self._backend_key(key), data, ttl))
+
+    async def invalidate(self, key: str) -> None:
+        """Drop a value from both levels and from the other workers' L1"""
+        self.entries.pop(key, None)
+        if self.backend is not None:
+            await self._backend_call(self.backend.run(self.backend.invalidate, self._backend_key(key)))
+
+    def _store_local(self, key: str, value: Any, expires_at: float) -> None:
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all L1 entries of this worker"""
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"l1_entries": len(self.entries), "shared": type(self.backend).__name__ if self.backend else None}
+
+
+def create_backend(kind: str, path: str = "", url: str = "") -> Optional[CacheBackend]:
+    """
+    Create a shared cache backend
+
+    Args:
+        kind: 'sqlite', 'redis', or empty for no shared tier
+        path: Database file for the SQLite backend
+        url: Server URL for the Redis-protocol backend
+
+    Returns:
+        The backend, or None if kind is empty
+    """
+    if not kind:
+        return None
+    if kind == "sqlite":
+        return SQLiteCacheBackend(path)
+    if kind == "redis":
+        return RespCacheBackend(url)
+    raise ValueError(f"Unknown shared cache backend '{kind}'")
+
+
+_shared_backend: Optional[CacheBackend] = None
+_shared_backend_created = False
+
+
+def get_shared_backend() -> Optional[CacheBackend]:
+    """Get the process-wide shared cache backend configured in SHARED_CACHE_BACKEND"""
+    global _shared_backend, _shared_backend_created
+    if not _shared_backend_created:
+        _shared_backend = create_backend(config.SHARED_CACHE_BACKEND, config.SHARED_CACHE_PATH, config.SHARED_CACHE_URL)
+        _shared_backend_created = True
+    return _shared_backend
@@ -0,0 +1,93 @@
+from typing import Dict, Any, Optional
+from contextlib import contextmanager
+import importlib
+import time
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is only imported on first attribute access.
+    Lets heavy dependencies stay out of the import path of the application.
+    """
+
+    def __init__(self, name: str):
+        """
+        Initialize the proxy
+
+        Args:
+            name: Fully qualified name of the module to import later
+        """
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the real module has been imported"""
+        return self._module is not None
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self._load(), attribute)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.is_loaded else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+class StartupProfiler:
+    """
+    Records how long each startup phase takes and whether the app is ready
+    to serve traffic. Reported on /health.
+    """
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+        self._created = time.perf_counter()
+        self._ready_at: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Time a startup phase
+
+        Args:
+            name: Name of the phase, e.g., 'tool_registration'
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float) -> None:
+        """
+        Record the duration of a phase measured elsewhere
+
+        Args:
+            name: Name of the phase
+            seconds: Duration in seconds
+        """
+        self.phases[name] = round(seconds * 1000, 2)
+        print(f"Startup phase '{name}' took {self.phases[name]:.1f} ms")
+
+    def mark_ready(self) -> None:
+        """Mark the application as ready to serve traffic"""
+        self.ready = True
+        self._ready_at = time.perf_counter()
+        print(f"Application ready after {(self._ready_at - self._created) * 1000:.1f} ms")
+
+    def report(self) -> Dict[str, Any]:
+        """Get the readiness state and phase durations in milliseconds"""
+        report = {"ready": self.ready, "phases_ms": dict(self.phases)}
+        if self._ready_at is not None:
+            report["time_to_ready_ms"] = round((self._ready_at - self._created) * 1000, 2)
+        return report
+
+
+# Process-wide profiler, created when the application is first imported
+startup_profiler = StartupProfiler()
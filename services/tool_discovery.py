@@ -0,0 +1,197 @@
+from typing import Dict, Any, List, Optional, Tuple
+import ast
+import importlib.metadata
+import importlib.util
+import json
+import os
+
+# Bump when the manifest format changes so stale caches are rebuilt
+MANIFEST_VERSION = 1
+
+# Package entry point group other distributions can use to contribute tools,
+# e.g., [project.entry-points."agent_ai.tools"] my_tools = "my_package.tools"
+ENTRY_POINT_GROUP = "agent_ai.tools"
+
+
+class ManifestError(Exception):
+    """Raised when a tool module cannot be described without importing it"""
+
+
+def _literal(node: ast.AST, module_name: str) -> Any:
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        raise ManifestError(f"Non-literal tool definition in '{module_name}' (line {node.lineno})")
+
+
+def _tool_entry(call: ast.Call, module_name: str) -> Dict[str, Any]:
+    """Describe a Tool(...) call whose arguments are all literals except the function name"""
+    if call.args:
+        raise ManifestError(f"Tool in '{module_name}' (line {call.lineno}) uses positional arguments")
+
+    entry: Dict[str, Any] = {"module": module_name}
+    for keyword in call.keywords:
+        if keyword.arg == "function":
+            if not isinstance(keyword.value, ast.Name):
+                raise ManifestError(f"Tool function in '{module_name}' (line {call.lineno}) is not a module-level name")
+            entry["function_name"] = keyword.value.id
+        elif keyword.arg is None:
+            raise ManifestError(f"Tool in '{module_name}' (line {call.lineno}) uses ** arguments")
+        else:
+            entry[keyword.arg] = _literal(keyword.value, module_name)
+
+    if "name" not in entry or "function_name" not in entry:
+        raise ManifestError(f"Tool in '{module_name}' (line {call.lineno}) has no name or function")
+    return entry
+
+
+def _is_tool_call(node: ast.AST) -> bool:
+    return isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "Tool"
+
+
+def scan_module_source(source: str, module_name: str) -> List[Dict[str, Any]]:
+    """
+    Describe the tools a module registers by reading its source, without importing it
+
+    Looks at every top-level 'register_*' function and collects the Tool(...)
+    objects it passes to register_tool(), either directly or through a variable.
+
+    Args:
+        source: Python source of the module
+        module_name: Importable name of the module, e.g., 'tools.weather'
+
+    Returns:
+        List of manifest entries (the Tool fields plus 'module' and 'function_name')
+
+    Raises:
+        ManifestError: If a registered tool is not defined with literal arguments
+    """
+    tree = ast.parse(source)
+    entries = []
+
+    for function in tree.body:
+        if not isinstance(function, (ast.FunctionDef, ast.AsyncFunctionDef)) or not function.name.startswith("register_"):
+            continue
+
+        definitions: Dict[str, ast.Call] = {}
+        for node in ast.walk(function):
+            if isinstance(node, ast.Assign) and _is_tool_call(node.value):
+                for target in node.targets:
+                    if isinstance(target, ast.Name):
+                        definitions[target.id] = node.value
+
+        for node in ast.walk(function):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "register_tool"):
+                continue
+            if len(node.args) != 1:
+                raise ManifestError(f"Unexpected register_tool() call in '{module_name}' (line {node.lineno})")
+            argument = node.args[0]
+            if _is_tool_call(argument):
+                entries.append(_tool_entry(argument, module_name))
+            elif isinstance(argument, ast.Name) and argument.id in definitions:
+                entries.append(_tool_entry(definitions[argument.id], module_name))
+            else:
+                raise ManifestError(f"Cannot resolve tool registered in '{module_name}' (line {node.lineno})")
+
+    return entries
+
+
+def register_functions(source: str) -> List[str]:
+    """Get the names of the top-level 'register_*' functions defined in a module's source"""
+    tree = ast.parse(source)
+    return [
+        node.name for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("register_")
+    ]
+
+
+def find_tool_modules(package_dir: str, package_name: str) -> List[Tuple[str, str]]:
+    """
+    List the tool modules in a package directory and from package entry points
+
+    Args:
+        package_dir: Directory of the local tools package
+        package_name: Importable name of the local tools package
+
+    Returns:
+        List of (module name, source file path) tuples
+    """
+    modules = []
+    for filename in sorted(os.listdir(package_dir)):
+        if filename.endswith(".py") and not filename.startswith("_"):
+            modules.append((f"{package_name}.{filename[:-3]}", os.path.join(package_dir, filename)))
+
+    for entry_point in importlib.metadata.entry_points(group=ENTRY_POINT_GROUP):
+        module_name = entry_point.value.split(":")[0]
+        try:
+            spec = importlib.util.find_spec(module_name)
+        except (ImportError, ValueError) as e:
+            print(f"Skipping tool entry point '{entry_point.name}': {str(e)}")
+            continue
+        if spec is None or not spec.origin or not spec.origin.endswith(".py"):
+            print(f"Skipping tool entry point '{entry_point.name}': no Python source for '{module_name}'")
+            continue
+        modules.append((module_name, spec.origin))
+
+    return modules
+
+
+def _describe_module(module_name: str, path: str, stat: os.stat_result) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as source_file:
+        source = source_file.read()
+
+    description = {"path": path, "mtime": stat.st_mtime_ns, "size": stat.st_size}
+    try:
+        description["tools"] = scan_module_source(source, module_name)
+        description["eager"] = False
+    except (ManifestError, SyntaxError) as e:
+        # Fall back to importing the module and calling its register functions
+        print(f"Tool module '{module_name}' will be imported at startup: {str(e)}")
+        description["tools"] = []
+        description["eager"] = True
+        description["register"] = register_functions(source)
+    return description
+
+
+def build_manifest(package_dir: str, package_name: str, cache_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build the tool manifest, reusing cached entries for unchanged modules
+
+    Args:
+        package_dir: Directory of the local tools package
+        package_name: Importable name of the local tools package
+        cache_path: JSON file the manifest is cached in (optional)
+
+    Returns:
+        Manifest with one description per tool module
+    """
+    cached: Dict[str, Any] = {}
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, encoding="utf-8") as cache_file:
+                data = json.load(cache_file)
+            if data.get("version") == MANIFEST_VERSION:
+                cached = data.get("modules", {})
+        except (OSError, ValueError):
+            cached = {}
+
+    modules = {}
+    changed = False
+    for module_name, path in find_tool_modules(package_dir, package_name):
+        stat = os.stat(path)
+        previous = cached.get(module_name)
+        if previous and previous["path"] == path and previous["mtime"] == stat.st_mtime_ns and previous["size"] == stat.st_size:
+            modules[module_name] = previous
+        else:
+            modules[module_name] = _describe_module(module_name, path, stat)
+            changed = True
+
+    manifest = {"version": MANIFEST_VERSION, "modules": modules}
+    if cache_path and (changed or set(modules) != set(cached)):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+            with open(cache_path, "w", encoding="utf-8") as cache_file:
+                json.dump(manifest, cache_file)
+        except OSError as e:
+            print(f"Could not write tool manifest cache: {str(e)}")
+    return manifest
@@ -0,0 +1,184 @@
+from typing import Dict, Any, List, Optional, Callable, AsyncIterator, Awaitable
+import inspect
+from services.metrics import metrics
+from services.result_shaping import TRUNCATION_MARKER
+
+
+class FinalResult:
+    """
+    Yielded by a streaming tool to set its result explicitly.
+    The value replaces the aggregate of the chunks and is not sent to clients
+    as a chunk.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+class ResultAggregator:
+    """
+    Bounded aggregate of the chunks of a streaming tool.
+    Text chunks are concatenated and other chunks collected as items, up to a
+    size cap; whatever does not fit is only counted.
+    """
+
+    def __init__(self, max_chars: int = 16384, max_items: int = 200):
+        """
+        Initialize the aggregate
+
+        Args:
+            max_chars: Text kept from string chunks
+            max_items: Non-string chunks kept
+        """
+        self.max_chars = max_chars
+        self.max_items = max_items
+        self.text_parts: List[str] = []
+        self.text_length = 0
+        self.omitted_chars = 0
+        self.items: List[Any] = []
+        self.omitted_items = 0
+        self.chunks = 0
+        self.final: Optional[FinalResult] = None
+
+    def add(self, chunk: Any) -> None:
+        """Add one chunk"""
+        self.chunks += 1
+        if isinstance(chunk, str):
+            room = self.max_chars - self.text_length
+            if room > 0:
+                part = chunk[:room]
+                self.text_parts.append(part)
+                self.text_length += len(part)
+            self.omitted_chars += len(chunk) - max(0, min(room, len(chunk)))
+        elif len(self.items) < self.max_items:
+            self.items.append(chunk)
+        else:
+            self.omitted_items += 1
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.omitted_chars or self.omitted_items)
+
+    def result(self) -> Any:
+        """
+        Get the result of the tool
+
+        Returns:
+            The FinalResult value if the tool yielded one, else a dictionary with
+            'text' and/or 'items', 'chunks' and, when the cap was hit, 'truncated'
+        """
+        if self.final is not None:
+            return self.final.value
+        result: Dict[str, Any] = {}
+        if self.text_parts or not self.items:
+            text = "".join(self.text_parts)
+            if self.omitted_chars:
+                text += TRUNCATION_MARKER.format(count=self.omitted_chars, unit="chars")
+            result["text"] = text
+        if self.items:
+            items = list(self.items)
+            if self.omitted_items:
+                items.append(TRUNCATION_MARKER.format(count=self.omitted_items, unit="items"))
+            result["items"] = items
+        result["chunks"] = self.chunks
+        if self.truncated:
+            result["truncated"] = True
+        return result
+
+
+class ToolRun:
+    """
+    One execution of a tool, iterated for its partial output.
+
+    Iterating yields the chunks of async generator tools as they are produced;
+    other tools yield nothing. After the iteration ends, 'result' holds the
+    tool's result: the return value, the FinalResult it yielded or the bounded
+    aggregate of its chunks. Chunks are not kept once they have been yielded.
+
+        run = mcp_server.stream_tool("search", {"query": "..."})
+        async for chunk in run:
+            ...
+        print(run.result)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        function: Optional[Callable] = None,
+        arguments: Optional[Dict[str, Any]] = None,
+        result: Any = None,
+        on_result: Optional[Callable[[Any], Any]] = None,
+        cached: Optional[Callable[[], Awaitable[Any]]] = None,
+        max_chars: int = 16384,
+        max_items: int = 200
+    ):
+        """
+        Initialize the run
+
+        Args:
+            name: Name of the tool
+            function: Tool function; None when the result is already known
+            arguments: Arguments to call the function with
+            result: Known result, e.g. from the result cache (used when function is None)
+            on_result: Called, or awaited if it is a coroutine function, with the result
+                       once the tool has finished (optional)
+            cached: Coroutine function returning a cached result, or None to run the
+                    tool; awaited when iteration starts (optional)
+            max_chars: Text kept from the string chunks of a streaming tool
+            max_items: Other chunks kept from a streaming tool
+        """
+        self.name = name
+        self.function = function
+        self.arguments = arguments or {}
+        self.result = result
+        self.on_result = on_result
+        self.cached = cached
+        self.max_chars = max_chars
+        self.max_items = max_items
+        self.done = function is None
+
+    @property
+    def streaming(self) -> bool:
+        """Whether the tool produces its output in chunks"""
+        return inspect.isasyncgenfunction(self.function)
+
+    async def __aiter__(self) -> AsyncIterator[Any]:
+        if self.done:
+            return
+        if self.cached is not None:
+            cached = await self.cached()
+            if cached is not None:
+                self.result = cached
+                self.done = True
+                return
+        try:
+            if self.streaming:
+                aggregator = ResultAggregator(self.max_chars, self.max_items)
+                stream = self.function(**self.arguments)
+                try:
+                    async for chunk in stream:
+                        if isinstance(chunk, FinalResult):
+                            aggregator.final = chunk
+                            continue
+                        aggregator.add(chunk)
+                        metrics.increment("tools.stream_chunks")
+                        yield chunk
+                finally:
+                    # Also runs the tool's cleanup when the consumer stops early
+                    await stream.aclose()
+                if aggregator.truncated:
+                    metrics.increment("tools.stream_truncated")
+                self.result = aggregator.result()
+            elif inspect.iscoroutinefunction(self.function):
+                self.result = await self.function(**self.arguments)
+            else:
+                self.result = self.function(**self.arguments)
+        except Exception as e:
+            raise Exception(f"Error executing tool '{self.name}': {str(e)}")
+        self.done = True
+        if self.on_result is not None:
+            outcome = self.on_result(self.result)
+            if inspect.isawaitable(outcome):
+                await outcome
@@ -0,0 +1,323 @@
+from typing import Dict, Any, Optional
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+import asyncio
+import random
+import time
+import requests
+from services.metrics import metrics, percentile
+from services.http_cache import ResponseCache, parse_policies
+from services.shared_cache import get_shared_backend
+from services.quota import QuotaManager, QuotaExceededError, quota_manager
+import config
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling a host whose circuit breaker is open"""
+
+
+class RetryableStatusError(requests.exceptions.HTTPError):
+    """Raised for responses worth retrying (5xx and 429)"""
+
+
+class LatencyTracker:
+    """Keeps recent latencies of a host to derive the hedging delay"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        """
+        Initialize the tracker
+
+        Args:
+            window: Number of recent latencies kept
+            min_samples: Samples needed before a hedging delay is learned
+        """
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        """95th percentile latency in seconds, or None until enough samples were seen"""
+        if len(self.samples) < self.min_samples:
+            return None
+        return percentile(sorted(self.samples), 0.95)
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker.
+    Opens after consecutive failures, rejects calls while open, and lets a
+    single trial call through after the reset timeout (half-open).
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Initialize a closed breaker
+
+        Args:
+            failure_threshold: Consecutive failures that open the breaker
+            reset_timeout: Seconds the breaker stays open before a trial call
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go to the host now"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            # A failed trial call re-opens the breaker for another timeout
+            self.opened_at = time.monotonic()
+
+
+def _is_retryable(error: Exception) -> bool:
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, RetryableStatusError))
+
+
+class UpstreamClient:
+    """
+    Wrapper for idempotent GET calls to external tool APIs.
+    Sends a hedged duplicate once a request outlives the host's learned p95
+    latency, retries transient errors with jittered backoff, and stops calling
+    a host while its circuit breaker is open. Every request waits for the
+    host's quota, if it has one. Requests run in worker threads so they never
+    block the event loop.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 5.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        hedge: bool = True,
+        fallback_size: int = 256,
+        cache: Optional[ResponseCache] = None,
+        quota: Optional[QuotaManager] = None
+    ):
+        """
+        Initialize the client
+
+        Args:
+            timeout: Timeout in seconds for each request
+            max_retries: Retries after the first attempt for transient errors
+            backoff_base: Base delay in seconds for exponential backoff
+            backoff_max: Maximum backoff delay in seconds
+            failure_threshold: Consecutive failed calls that open a host's breaker
+            reset_timeout: Seconds before an open breaker allows a trial call
+            hedge: Whether to send hedged duplicate requests
+            fallback_size: Number of last good responses kept for open breakers
+            cache: Response cache consulted before calling the upstream (optional)
+            quota: Quota manager that paces requests per host (optional)
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.hedge = hedge
+        self.fallback_size = fallback_size
+        self.cache = cache
+        self.quota = quota
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget learned latencies, breaker states, quota usage and cached or fallback responses"""
+        if self.cache is not None:
+            self.cache.clear()
+        if self.quota is not None:
+            self.quota.reset()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyTracker] = {}
+        self._fallbacks: "OrderedDict[str, Any]" = OrderedDict()
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        """Get the circuit breaker of a host"""
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+        return self._breakers[host]
+
+    def latency(self, host: str) -> LatencyTracker:
+        """Get the latency tracker of a host"""
+        if host not in self._latencies:
+            self._latencies[host] = LatencyTracker()
+        return self._latencies[host]
+
+    async def get_json(self, url: str) -> Any:
+        """
+        GET a URL and decode its JSON body
+
+        Args:
+            url: URL to fetch
+
+        Returns:
+            Decoded JSON body, possibly served by the response cache; the last
+            good body for this URL if the host's breaker is open or its quota
+            is exhausted and one is available
+
+        Raises:
+            CircuitOpenError: If the breaker is open and nothing is cached
+            QuotaExceededError: If the host's quota is exhausted and nothing is cached
+            requests.exceptions.RequestException: If all attempts failed
+        """
+        if self.cache is not None:
+            return await self.cache.get(url, self._get_uncached)
+        return await self._get_uncached(url)
+
+    async def _get_uncached(self, url: str) -> Any:
+        host = urlsplit(url).netloc
+        breaker = self.breaker(host)
+        metrics.increment("upstream.requests")
+
+        if not breaker.allow():
+            metrics.increment("upstream.short_circuited")
+            if url in self._fallbacks:
+                return self._fallbacks[url]
+            raise CircuitOpenError(f"Circuit breaker open for {host}")
+
+        try:
+            data = await self._get_with_retries(url, host)
+        except QuotaExceededError:
+            breaker.trial_in_flight = False
+            if url in self._fallbacks:
+                metrics.increment("upstream.quota_fallbacks")
+                return self._fallbacks[url]
+            raise
+        except Exception as e:
+            if _is_retryable(e):
+                breaker.record_failure()
+                if breaker.state != "closed":
+                    print(f"Circuit breaker for {host} is open after {breaker.failures} failures")
+            elif isinstance(e, requests.exceptions.HTTPError):
+                # A client error still means the host is up
+                breaker.record_success()
+            else:
+                # Not the host's fault (e.g., a bug or bad input); don't penalize it
+                breaker.trial_in_flight = False
+            raise
+
+        breaker.record_success()
+        self._remember(url, data)
+        return data
+
+    async def _get_with_retries(self, url: str, host: str) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return await self._hedged_get(url, host)
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                # Full jitter keeps retries from many callers spreading out
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+                attempt += 1
+                metrics.increment("upstream.retries")
+                await asyncio.sleep(delay)
+
+    async def _hedged_get(self, url: str, host: str) -> Any:
+        primary = asyncio.ensure_future(self._fetch(url, host))
+        hedge_delay = self.latency(host).p95() if self.hedge else None
+        if self.quota is not None and self.quota.under_pressure(host):
+            # A duplicate request would spend quota that is running out
+            hedge_delay = None
+        if hedge_delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        metrics.increment("upstream.hedged")
+        pending = {primary, asyncio.ensure_future(self._fetch(url, host))}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _fetch(self, url: str, host: str) -> Any:
+        if self.quota is not None:
+            await self.quota.acquire(host)
+        started = time.perf_counter()
+        response = await asyncio.to_thread(requests.get, url, timeout=self.timeout)
+        elapsed = time.perf_counter() - started
+        self.latency(host).record(elapsed)
+        metrics.observe(f"upstream.{host}.latency_ms", elapsed * 1000)
+
+        status = response.status_code
+        if isinstance(status, int) and (status >= 500 or status == 429):
+            raise RetryableStatusError(f"{status} from {host}", response=response)
+        response.raise_for_status()
+        return response.json()
+
+    def _remember(self, url: str, data: Any) -> None:
+        self._fallbacks[url] = data
+        self._fallbacks.move_to_end(url)
+        while len(self._fallbacks) > self.fallback_size:
+            self._fallbacks.popitem(last=False)
+
+    def status(self) -> Dict[str, Any]:
+        """Get breaker state and learned hedging delay per host"""
+        return {
+            host: {
+                "breaker": breaker.state,
+                "failures": breaker.failures,
+                "hedge_after_ms": (self.latency(host).p95() or 0) * 1000
+            }
+            for host, breaker in self._breakers.items()
+        }
+
+
+# Shared client used by the tools in tools/
+upstream = UpstreamClient(
+    timeout=config.UPSTREAM_TIMEOUT,
+    max_retries=config.UPSTREAM_MAX_RETRIES,
+    failure_threshold=config.UPSTREAM_BREAKER_THRESHOLD,
+    reset_timeout=config.UPSTREAM_BREAKER_RESET,
+    hedge=config.UPSTREAM_HEDGE,
+    cache=ResponseCache(
+        parse_policies(config.HTTP_CACHE_POLICIES),
+        max_entries=config.HTTP_CACHE_MAX_ENTRIES,
+        max_bytes=config.HTTP_CACHE_MAX_BYTES,
+        shared=get_shared_backend(),
+        under_pressure=lambda url: quota_manager.under_pressure(urlsplit(url).netloc)
+    ) if config.HTTP_CACHE_ENABLED else None,
+    quota=quota_manager
+)
+metrics.register_collector("upstream", upstream.status)
+if upstream.cache is not None:
+    metrics.register_collector("http_cache", upstream.cache.stats)
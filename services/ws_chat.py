@@ -0,0 +1,203 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+import asyncio
+from starlette.websockets import WebSocket, WebSocketDisconnect
+from services.metrics import metrics
+from services.serialization import dumps, loads
+
+# Close codes (RFC 6455)
+CLOSE_GOING_AWAY = 1001
+CLOSE_MESSAGE_TOO_BIG = 1009
+CLOSE_TRY_AGAIN_LATER = 1013
+
+# Runs one assistant turn: (history, skip_summary, on_event) -> final response
+TurnRunner = Callable[[List[Dict[str, Any]], Optional[bool], Callable[[Dict[str, Any]], Awaitable[None]]], Awaitable[Dict[str, Any]]]
+
+
+def trim_history(messages: List[Dict[str, Any]], max_chars: int) -> int:
+    """
+    Drop the oldest turns until the serialized history fits, in place
+
+    The leading system message is kept, and whole turns are dropped (from one
+    user message up to the next) so no tool result loses its tool call.
+
+    Args:
+        messages: Conversation in LiteLLM format
+        max_chars: Size limit of the serialized history
+
+    Returns:
+        Number of messages dropped
+    """
+    start = 1 if messages and messages[0].get("role") == "system" else 0
+    dropped = 0
+    while len(dumps(messages)) > max_chars:
+        # The turn to drop runs up to the next user message after the oldest one
+        end = next((index for index in range(start + 1, len(messages)) if messages[index].get("role") == "user"), None)
+        if end is None:
+            break
+        del messages[start:end]
+        dropped += end - start
+    return dropped
+
+
+class ChatConnection:
+    """
+    A conversation held on one WebSocket.
+    The history lives on the connection, so clients send only new messages.
+    Turns stream 'token', 'tool_call', 'tool_chunk' and 'tool_result' events
+    and end with 'done'; a running turn can be cancelled. Idle connections are
+    pinged and closed when they stop answering. No task runs between turns.
+
+    Client messages: {"type": "message", "content": ..., "skip_summary": ...},
+    {"type": "cancel"}, {"type": "reset"}, {"type": "ping"} and {"type": "pong"}.
+    """
+
+    # Open connections, counted from reserve() to release()
+    active = 0
+
+    @classmethod
+    def reserve(cls, limit: int) -> bool:
+        """
+        Take a connection slot if fewer than limit are in use; the check and
+        the count happen in one step, so concurrent handshakes cannot overshoot
+        """
+        if cls.active >= limit:
+            return False
+        cls.active += 1
+        return True
+
+    @classmethod
+    def release(cls) -> None:
+        """Give back a slot taken with reserve()"""
+        cls.active -= 1
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        run_turn: TurnRunner,
+        system_prompt: Optional[str] = None,
+        heartbeat_interval: float = 30.0,
+        max_missed_heartbeats: int = 2,
+        max_message_bytes: int = 16384,
+        max_history_chars: int = 32768,
+        check_rate: Optional[Callable[[], Tuple[bool, float]]] = None
+    ):
+        """
+        Initialize the connection
+
+        Args:
+            websocket: Accepted WebSocket
+            run_turn: Coroutine function running one assistant turn over the history
+            system_prompt: System message the conversation starts with (optional)
+            heartbeat_interval: Seconds of client silence before a ping is sent
+            max_missed_heartbeats: Unanswered pings after which the connection is closed
+            max_message_bytes: Largest client message accepted; also set the server's
+                               WebSocket size limit (uvicorn ws_max_size) to this, as
+                               the check here runs once the message has been received
+            max_history_chars: Size of the serialized history before old turns are dropped
+            check_rate: Called for every user message; returns whether it is allowed
+                        and the seconds to wait if not (optional)
+        """
+        self.websocket = websocket
+        self.run_turn = run_turn
+        self.heartbeat_interval = heartbeat_interval
+        self.max_missed_heartbeats = max_missed_heartbeats
+        self.max_message_bytes = max_message_bytes
+        self.max_history_chars = max_history_chars
+        self.check_rate = check_rate
+        self.system_prompt = system_prompt
+        self.messages: List[Dict[str, Any]] = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        self.turn: Optional[asyncio.Task] = None
+
+    async def send(self, event: Dict[str, Any]) -> None:
+        await self.websocket.send_text(dumps(event))
+
+    async def serve(self) -> None:
+        """Handle client messages until the connection closes"""
+        missed = 0
+        try:
+            while True:
+                try:
+                    text = await asyncio.wait_for(self.websocket.receive_text(), timeout=self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    if self.turn is not None and not self.turn.done():
+                        # A running turn is streaming; the client is not idle
+                        continue
+                    missed += 1
+                    if missed > self.max_missed_heartbeats:
+                        metrics.increment("ws.heartbeat_timeouts")
+                        await self.websocket.close(code=CLOSE_GOING_AWAY)
+                        return
+                    await self.send({"type": "ping"})
+                    continue
+                missed = 0
+
+                if len(text.encode("utf-8")) > self.max_message_bytes:
+                    await self.websocket.close(code=CLOSE_MESSAGE_TOO_BIG)
+                    return
+                await self.handle(text)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            if self.turn is not None and not self.turn.done():
+                self.turn.cancel()
+
+    async def handle(self, text: str) -> None:
+        """Handle one client message"""
+        try:
+            message = loads(text)
+            kind = message.get("type")
+        except (ValueError, AttributeError):
+            await self.send({"type": "error", "detail": "Messages must be JSON objects"})
+            return
+
+        if kind == "ping":
+            await self.send({"type": "pong"})
+        elif kind == "pong":
+            pass
+        elif kind == "cancel":
+            if self.turn is not None and not self.turn.done():
+                self.turn.cancel()
+        elif kind == "reset":
+            if self.turn is not None and not self.turn.done():
+                await self.send({"type": "error", "detail": "A turn is in progress"})
+                return
+            self.messages = [{"role": "system", "content": self.system_prompt}] if self.system_prompt else []
+            await self.send({"type": "reset"})
+        elif kind == "message" and isinstance(message.get("content"), str):
+            if self.turn is not None and not self.turn.done():
+                await self.send({"type": "error", "detail": "A turn is in progress; send 'cancel' first"})
+                return
+            if self.check_rate is not None:
+                allowed, retry_after = self.check_rate()
+                if not allowed:
+                    metrics.increment("http.rate_limited")
+                    await self.send({"type": "error", "detail": "Rate limit exceeded", "retry_after": retry_after})
+                    return
+            self.turn = asyncio.create_task(self._run_turn(message["content"], message.get("skip_summary")))
+        else:
+            await self.send({"type": "error", "detail": f"Unknown message type '{kind}'"})
+
+    async def _run_turn(self, content: str, skip_summary: Optional[bool]) -> None:
+        metrics.increment("ws.turns")
+        self.messages.append({"role": "user", "content": content})
+        turn_start = len(self.messages) - 1
+        try:
+            response = await self.run_turn(self.messages, skip_summary, self.send)
+        except asyncio.CancelledError:
+            # The runner rolls back its own messages; drop the user message too
+            del self.messages[turn_start:]
+            metrics.increment("ws.cancelled")
+            try:
+                await self.send({"type": "cancelled"})
+            except Exception:
+                pass
+            return
+        except Exception as e:
+            del self.messages[turn_start:]
+            await self.send({"type": "error", "detail": f"Error generating response: {str(e)}"})
+            return
+
+        dropped = trim_history(self.messages, self.max_history_chars)
+        if dropped:
+            metrics.increment("ws.history_trimmed", dropped)
+        await self.send({"type": "done", "response": response})
@@ -0,0 +1,119 @@
+"""
+Local stand-in for a Redis-protocol server, used by the shared cache tests.
+Supports PING, SELECT, GET, SET (with EX/PX), DEL, FLUSHDB, PUBLISH and SUBSCRIBE.
+"""
+import socketserver
+import threading
+import time
+
+
+def encode(value):
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, str):
+        return f"+{value}\r\n".encode()
+    if isinstance(value, list):
+        return f"*{len(value)}\r\n".encode() + b"".join(encode(item) for item in value)
+    return f"${len(value)}\r\n".encode() + value + b"\r\n"
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                args = self.read_command()
+            except (OSError, ValueError):
+                return
+            if args is None:
+                return
+            name = args[0].decode().upper()
+            server.commands.append(name)
+
+            if name == "PING":
+                reply = "PONG"
+            elif name == "SELECT" or name == "FLUSHDB":
+                if name == "FLUSHDB":
+                    server.data.clear()
+                reply = "OK"
+            elif name == "GET":
+                value, expires_at = server.data.get(args[1], (None, None))
+                if expires_at is not None and expires_at <= time.time():
+                    server.data.pop(args[1], None)
+                    value = None
+                reply = value
+            elif name == "SET":
+                expires_at = None
+                options = [arg.decode().upper() for arg in args[3:]]
+                if "PX" in options:
+                    expires_at = time.time() + int(options[options.index("PX") + 1]) / 1000
+                elif "EX" in options:
+                    expires_at = time.time() + int(options[options.index("EX") + 1])
+                server.data[args[1]] = (args[2], expires_at)
+                reply = "OK"
+            elif name == "DEL":
+                reply = sum(1 for key in args[1:] if server.data.pop(key, None) is not None)
+            elif name == "PUBLISH":
+                with server.lock:
+                    subscribers = list(server.subscribers.get(args[1], []))
+                for subscriber in subscribers:
+                    try:
+                        subscriber.wfile.write(encode([b"message", args[1], args[2]]))
+                    except OSError:
+                        pass
+                reply = len(subscribers)
+            elif name == "SUBSCRIBE":
+                with server.lock:
+                    for index, channel in enumerate(args[1:], start=1):
+                        server.subscribers.setdefault(channel, []).append(self)
+                        self.wfile.write(encode([b"subscribe", channel, index]))
+                continue
+            else:
+                self.wfile.write(f"-ERR unknown command '{name}'\r\n".encode())
+                continue
+            self.wfile.write(encode(reply))
+
+    def finish(self):
+        with self.server.lock:
+            for subscribers in self.server.subscribers.values():
+                if self in subscribers:
+                    subscribers.remove(self)
+        super().finish()
+
+
+class RespStandIn(socketserver.ThreadingTCPServer):
+    """In-memory Redis-protocol server on a free local port"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), RespHandler)
+        self.data = {}
+        self.subscribers = {}
+        self.commands = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"redis://127.0.0.1:{self.server_address[1]}/0"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
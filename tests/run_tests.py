@@ -6,12 +6,35 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Import all test modules
-from tests.test_weather import TestWeatherTool
+from tests.test_weather import TestWeatherTool, TestWeatherBatchTool
 from tests.test_time_tool import TestTimeTool
 from tests.test_calculator import TestCalculator
 from tests.test_currency import TestCurrencyTool
 from tests.test_mcp_service import TestMCPService
 from tests.test_llm_service import TestLLMService
+from tests.test_llm_router import TestLLMRouter
+from tests.test_intent_router import TestIntentRouter
+from tests.test_metrics import TestMetrics
+from tests.test_session_store import TestSessionStore
+from tests.test_startup import TestStartup
+from tests.test_tool_discovery import TestToolDiscovery
+from tests.test_upstream import TestUpstream
+from tests.test_http_cache import TestHttpCache
+from tests.test_serialization import TestSerialization
+from tests.test_result_shaping import TestResultShaping
+from tests.test_shared_cache import TestSharedCache
+from tests.test_quota import TestQuota
+from tests.test_job_queue import TestJobQueue
+from tests.test_llm_scheduler import TestLLMScheduler
+from tests.test_ws_chat import TestWebSocketChat
+from tests.test_internal_models import TestInternalModels
+from tests.test_tool_streaming import TestToolStreaming
+from tests.test_mcp_protocol import TestMCPProtocol
+from tests.test_mcp_remote import TestMCPRemote
+from tests.test_rate_store import TestRateStore
+from tests.test_profiler import TestProfiler
+from tests.test_loop_monitor import TestLoopMonitor
+from tests.test_tool_registry import TestToolRegistry
 
 def run_all_tests():
     """Run all test cases"""
@@ -25,7 +48,31 @@ def run_all_tests():
         loader.loadTestsFromTestCase(TestCalculator),
         loader.loadTestsFromTestCase(TestCurrencyTool),
         loader.loadTestsFromTestCase(TestMCPService),
-        loader.loadTestsFromTestCase(TestLLMService)
+        loader.loadTestsFromTestCase(TestLLMService),
+        loader.loadTestsFromTestCase(TestLLMRouter),
+        loader.loadTestsFromTestCase(TestIntentRouter),
+        loader.loadTestsFromTestCase(TestMetrics),
+        loader.loadTestsFromTestCase(TestSessionStore),
+        loader.loadTestsFromTestCase(TestStartup),
+        loader.loadTestsFromTestCase(TestToolDiscovery),
+        loader.loadTestsFromTestCase(TestUpstream),
+        loader.loadTestsFromTestCase(TestHttpCache),
+        loader.loadTestsFromTestCase(TestWeatherBatchTool),
+        loader.loadTestsFromTestCase(TestSerialization),
+        loader.loadTestsFromTestCase(TestResultShaping),
+        loader.loadTestsFromTestCase(TestSharedCache),
+        loader.loadTestsFromTestCase(TestQuota),
+        loader.loadTestsFromTestCase(TestJobQueue),
+        loader.loadTestsFromTestCase(TestLLMScheduler),
+        loader.loadTestsFromTestCase(TestWebSocketChat),
+        loader.loadTestsFromTestCase(TestInternalModels),
+        loader.loadTestsFromTestCase(TestToolStreaming),
+        loader.loadTestsFromTestCase(TestMCPProtocol),
+        loader.loadTestsFromTestCase(TestMCPRemote),
+        loader.loadTestsFromTestCase(TestRateStore),
+        loader.loadTestsFromTestCase(TestProfiler),
+        loader.loadTestsFromTestCase(TestLoopMonitor),
+        loader.loadTestsFromTestCase(TestToolRegistry)
     ])
     
     # Run the tests
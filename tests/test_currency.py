@@ -2,10 +2,15 @@ import unittest
 from unittest.mock import patch, MagicMock
 import asyncio
 from tools.currency import convert_currency
+from services.upstream import upstream
 
 class TestCurrencyTool(unittest.TestCase):
     """Test cases for currency conversion tool"""
 
+    def setUp(self):
+        """Start every test without cached upstream responses"""
+        upstream.reset()
+
     @patch('tools.currency.requests.get')
     async def test_convert_currency_success(self, mock_get):
         # Mock successful API response
@@ -32,6 +37,10 @@ class TestCurrencyTool(unittest.TestCase):
         self.assertEqual(result["amount"], 100)
         self.assertEqual(result["converted_amount"], 85.0)
         self.assertEqual(result["rate"], 0.85)
+        
+        # Fractional amounts are not truncated
+        result = await convert_currency(12.5, "USD", "EUR")
+        self.assertAlmostEqual(result["converted_amount"], 10.625)
     
     @patch('tools.currency.requests.get')
     async def test_convert_currency_invalid_from_currency(self, mock_get):
@@ -0,0 +1,171 @@
+import unittest
+from unittest.mock import patch, MagicMock, AsyncMock
+import asyncio
+import requests
+from services.http_cache import ResponseCache, CachePolicy, parse_policies, redact_url
+from services.upstream import UpstreamClient
+
+URL = "https://rates.example.com/latest/USD"
+
+class FakeClock:
+    """Manually advanced time source"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeUpstream:
+    """Records fetches and returns numbered responses"""
+
+    def __init__(self):
+        self.calls = 0
+        self.error = None
+
+    async def fetch(self, url):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if self.error:
+            raise self.error
+        return {"version": self.calls}
+
+class TestHttpCache(unittest.TestCase):
+    """Test cases for the upstream response cache"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.clock = FakeClock()
+        self.upstream = FakeUpstream()
+        policies = [CachePolicy("https://rates.example.com/*", soft_ttl=60, hard_ttl=300, stale_if_error=600)]
+        self.cache = ResponseCache(policies, max_entries=3, clock=self.clock)
+
+    async def test_fresh_entry_is_served_from_cache(self):
+        """Test that an entry within its soft TTL does not hit the upstream"""
+        self.assertEqual(await self.cache.get(URL, self.upstream.fetch), {"version": 1})
+        self.clock.now += 59
+        self.assertEqual(await self.cache.get(URL, self.upstream.fetch), {"version": 1})
+        self.assertEqual(self.upstream.calls, 1)
+
+    async def test_stale_entry_is_served_while_refreshing(self):
+        """Test stale-while-revalidate between the soft and hard TTL"""
+        await self.cache.get(URL, self.upstream.fetch)
+        self.clock.now += 120
+
+        # The stale body comes back at once and a single refresh starts
+        self.assertEqual(await self.cache.get(URL, self.upstream.fetch), {"version": 1})
+        self.assertEqual(await self.cache.get(URL, self.upstream.fetch), {"version": 1})
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(self.upstream.calls, 2)
+        self.assertEqual(await self.cache.get(URL, self.upstream.fetch), {"version": 2})
+
+    async def test_expired_entry_is_refetched(self):
+        """Test that an entry past its hard TTL is not served when the upstream works"""
+        await self.cache.get(URL, self.upstream.fetch)
+        self.clock.now += 301
+        self.assertEqual(await self.cache.get(URL, self.upstream.fetch), {"version": 2})
+
+    async def test_stale_if_error(self):
+        """Test that an expired entry is served when the upstream fails, within the grace period"""
+        await self.cache.get(URL, self.upstream.fetch)
+        self.upstream.error = requests.exceptions.ConnectionError("down")
+
+        with patch("builtins.print"):
+            self.clock.now += 500
+            self.assertEqual(await self.cache.get(URL, self.upstream.fetch), {"version": 1})
+
+            self.clock.now += 500
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                await self.cache.get(URL, self.upstream.fetch)
+
+    async def test_credentials_stay_out_of_logs_and_shared_keys(self):
+        """Test that API keys in URLs are masked in logs and not used as shared cache keys"""
+        url = "https://rates.example.com/latest?base=USD&appid=SECRET123"
+        shared = MagicMock()
+        shared.run = AsyncMock(return_value=None)
+        cache = ResponseCache(self.cache.policies, clock=self.clock, shared=shared)
+        await cache.get(url, self.upstream.fetch)
+        self.upstream.error = requests.exceptions.HTTPError(f"401 Client Error: Unauthorized for url: {url}")
+
+        with patch("builtins.print") as mock_print:
+            self.clock.now += 500
+            await cache.get(url, self.upstream.fetch)
+            await asyncio.sleep(0.01)
+        logged = " ".join(str(call.args[0]) for call in mock_print.call_args_list)
+        self.assertIn("appid=***", logged)
+        self.assertNotIn("SECRET123", logged)
+        keys = [call.args[1] for call in shared.run.call_args_list]
+        self.assertTrue(keys)
+        self.assertFalse(any("SECRET123" in key for key in keys))
+        self.assertEqual(redact_url("https://x.example.com/?q=paris&api_key=abc&limit=1"), "https://x.example.com/?q=paris&api_key=***&limit=1")
+
+    async def test_concurrent_misses_share_one_fetch(self):
+        """Test that simultaneous requests for a missing URL fetch it once"""
+        results = await asyncio.gather(*[self.cache.get(URL, self.upstream.fetch) for _ in range(5)])
+        self.assertEqual(results, [{"version": 1}] * 5)
+        self.assertEqual(self.upstream.calls, 1)
+
+    async def test_unmatched_urls_are_not_cached(self):
+        """Test that URLs without a policy always go to the upstream"""
+        other = "https://other.example.com/data"
+        await self.cache.get(other, self.upstream.fetch)
+        await self.cache.get(other, self.upstream.fetch)
+        self.assertEqual(self.upstream.calls, 2)
+        self.assertEqual(len(self.cache.entries), 0)
+
+    def test_bounded_by_entries_and_bytes(self):
+        """Test least recently used eviction by entry count and total size"""
+        for index in range(5):
+            self.cache.put(f"{URL}/{index}", {"index": index})
+        self.assertEqual(list(self.cache.entries), [f"{URL}/{index}" for index in (2, 3, 4)])
+
+        small = ResponseCache(self.cache.policies, max_entries=100, max_bytes=50, clock=self.clock)
+        small.put(f"{URL}/a", {"data": "x" * 20})
+        small.put(f"{URL}/b", {"data": "y" * 20})
+        self.assertEqual(list(small.entries), [f"{URL}/b"])
+        self.assertLessEqual(small.total_bytes, 50)
+
+        # Bodies larger than the whole cache are not stored
+        small.put(f"{URL}/c", {"data": "z" * 100})
+        self.assertNotIn(f"{URL}/c", small.entries)
+
+    def test_parse_policies(self):
+        """Test policy parsing and validation"""
+        policies = parse_policies('[{"pattern": "https://a.example.com/*", "soft_ttl": 1, "hard_ttl": 2}]')
+        self.assertTrue(policies[0].matches("https://a.example.com/x?y=1"))
+        self.assertFalse(policies[0].matches("https://b.example.com/x"))
+        self.assertTrue(parse_policies(""))
+        with self.assertRaises(ValueError):
+            CachePolicy("*", soft_ttl=10, hard_ttl=5)
+
+    @patch('services.upstream.requests.get')
+    async def test_upstream_client_uses_cache(self, mock_get):
+        """Test that the upstream client only calls the host on a cache miss"""
+        response = MagicMock()
+        response.status_code = 200
+        response.json.return_value = {"rates": {"EUR": 0.9}}
+        mock_get.return_value = response
+
+        client = UpstreamClient(cache=self.cache)
+        self.assertEqual(await client.get_json(URL), {"rates": {"EUR": 0.9}})
+        self.assertEqual(await client.get_json(URL), {"rates": {"EUR": 0.9}})
+        self.assertEqual(mock_get.call_count, 1)
+
+        client.reset()
+        self.assertEqual(len(self.cache.entries), 0)
+
+# Function to convert async tests to sync for unittest
+def sync_test(coro):
+    def wrapper(*args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+# Apply the decorator to all async test methods
+for attr in dir(TestHttpCache):
+    if attr.startswith('test_') and asyncio.iscoroutinefunction(getattr(TestHttpCache, attr)):
+        setattr(TestHttpCache, attr, sync_test(getattr(TestHttpCache, attr)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import gc
+import json
+import tracemalloc
+import litellm
+from models.internal import ToolEntry, ToolCallRecord
+from models.schema import Tool
+from services.llm_service import run_conversation
+from services.mcp_service import MCPServer
+
+PARAMETERS = {"type": "object", "properties": {"input": {"type": "string"}}, "required": ["input"]}
+
+def traced(build):
+    """Bytes still allocated after build() returns, and the peak while it ran"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current, peak
+
+class TestInternalModels(unittest.TestCase):
+    """Test cases for the compact representations used on the request path"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.mcp_server = MCPServer()
+
+    def test_entry_smaller_than_model(self):
+        """Test that registry entries take less memory than the validated models"""
+        tools = [Tool(name=f"tool_{index}", description="Test tool", parameters=PARAMETERS) for index in range(1000)]
+        _, entries_size, _ = traced(lambda: [ToolEntry.from_tool(tool) for tool in tools])
+        _, models_size, _ = traced(lambda: [Tool(name=f"tool_{index}", description="Test tool", parameters=PARAMETERS)
+                                            for index in range(1000)])
+        self.assertLess(entries_size, models_size)
+
+    def test_register_converts_and_caches_definitions(self):
+        """Test that the LLM tool block is built once and rebuilt after registry changes"""
+        self.mcp_server.register_tool(Tool(name="first", description="First tool", parameters=PARAMETERS))
+        self.assertIsInstance(self.mcp_server.get_tool("first"), ToolEntry)
+
+        tools = self.mcp_server.get_tools_for_llm()
+        again, allocated, _ = traced(self.mcp_server.get_tools_for_llm)
+        self.assertIs(again, tools)
+        self.assertLess(allocated, 256)
+        self.assertEqual(tools[0], {"type": "function", "function": {"name": "first", "description": "First tool", "parameters": PARAMETERS}})
+
+        self.mcp_server.register_tool(ToolEntry("second", "Second tool", PARAMETERS))
+        self.assertEqual([tool["function"]["name"] for tool in self.mcp_server.get_tools_for_llm()], ["first", "second"])
+        self.mcp_server.unregister_tool("first")
+        self.assertEqual([tool["function"]["name"] for tool in self.mcp_server.get_tools_for_llm()], ["second"])
+
+    def test_call_record(self):
+        """Test the client shape of an executed tool call"""
+        record = ToolCallRecord("calculate", {"expression": "1 + 1"}, {"result": 2})
+        self.assertEqual(record.to_dict(), {"name": "calculate", "arguments": {"expression": "1 + 1"}, "result": {"result": 2}})
+        with self.assertRaises(AttributeError):
+            record.extra = True
+
+    async def test_request_memory_budget(self):
+        """Test that concurrent tool-calling turns stay within a per-request memory budget"""
+        async def fake_acompletion(**kwargs):
+            if any(message["role"] == "tool" for message in kwargs["messages"]):
+                message = {"role": "assistant", "content": "Done."}
+            else:
+                message = {"role": "assistant", "content": None, "tool_calls": [
+                    {"id": "call_1", "type": "function", "function": {"name": "echo", "arguments": json.dumps({"input": "x"})}}
+                ]}
+            return litellm.ModelResponse(choices=[{"index": 0, "finish_reason": "stop", "message": message}])
+
+        async def echo(input):
+            return {"echo": input}
+
+        self.mcp_server.register_tool(ToolEntry("echo", "Echo the input", PARAMETERS, function=echo))
+        concurrency = 50
+
+        async def run_all():
+            histories = [[{"role": "user", "content": "Echo x"}] for _ in range(concurrency)]
+            return await asyncio.gather(*(run_conversation(history, self.mcp_server, skip_summary=False) for history in histories))
+
+        with patch("services.llm_service.litellm.acompletion", side_effect=fake_acompletion), patch("builtins.print"):
+            await run_all()
+            gc.collect()
+            tracemalloc.start()
+            try:
+                results = await run_all()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+        self.assertTrue(all(result["content"] == "Done." for result in results))
+        self.assertEqual(results[0]["tool_calls"], [{"name": "echo", "arguments": {"input": "x"}, "result": {"echo": "x"}}])
+        # About 8 KiB per request at the time of writing; the budget leaves headroom
+        self.assertLess(peak / concurrency, 32 * 1024)
+
+# Function to convert async tests to sync for unittest
+def sync_test(coro):
+    def wrapper(*args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+# Apply the decorator to all async test methods
+for attr in dir(TestInternalModels):
+    if attr.startswith('test_') and asyncio.iscoroutinefunction(getattr(TestInternalModels, attr)):
+        setattr(TestInternalModels, attr, sync_test(getattr(TestInternalModels, attr)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,9 +2,17 @@ import unittest
 from unittest.mock import patch, MagicMock, AsyncMock
 import asyncio
 import json
-from services.llm_service import generate_response
+import httpx
+from services.llm_service import (
+    generate_response, run_conversation, stabilize_prefix, capture_backend_timings,
+    completion_options, SUMMARY_INSTRUCTION, _round_timings
+)
 from services.mcp_service import MCPServer
 from models.schema import Message
+from models.internal import ToolEntry
+from services.shared_cache import TieredCache
+from services.llm_router import LLMRouter, LLMBackend
+from litellm.types.utils import ModelResponseStream, StreamingChoices, Delta
 
 class TestLLMService(unittest.TestCase):
     """Test cases for LLM Service"""
@@ -200,6 +208,280 @@ class TestLLMService(unittest.TestCase):
         # Assert final response contains error handling message
         self.assertEqual(result.get("content"), "I encountered an error with the tool.")
 
+    @patch('services.llm_service.litellm.acompletion')
+    async def test_run_conversation_keeps_tool_history(self, mock_acompletion):
+        """Test that a turn appends tool calls, tool results and the answer to the history"""
+        class MockMessage(dict):
+            def __init__(self, data):
+                super().__init__(data)
+                for key, value in data.items():
+                    setattr(self, key, value)
+        
+        tool_call = {
+            "id": "tool_call_1",
+            "type": "function",
+            "function": {"name": "test_tool", "arguments": json.dumps({"input": "test"})}
+        }
+        first_completion = MagicMock()
+        first_completion.choices = [MagicMock(message=MockMessage({"role": "assistant", "content": None, "tool_calls": [tool_call]}))]
+        second_completion = MagicMock()
+        second_completion.choices = [MagicMock(message=MockMessage({"role": "assistant", "content": "Done."}))]
+        mock_acompletion.side_effect = [first_completion, second_completion]
+        
+        history = [{"role": "user", "content": "Use the tool"}]
+        result = await run_conversation(history, self.mcp_server)
+        
+        self.assertEqual(result.get("content"), "Done.")
+        self.assertEqual([m["role"] for m in history], ["user", "assistant", "tool", "system", "assistant"])
+        self.assertEqual(history[1]["tool_calls"], [tool_call])
+        self.assertEqual(json.loads(history[2]["content"]), {"result": "test_success"})
+        self.assertEqual(history[-1], {"role": "assistant", "content": "Done."})
+    
+    @patch('services.llm_service.litellm.acompletion')
+    async def test_run_conversation_shapes_tool_results(self, mock_acompletion):
+        """Test that the LLM sees the tool's compact view while the client gets the full result"""
+        class MockMessage(dict):
+            def __init__(self, data):
+                super().__init__(data)
+                for key, value in data.items():
+                    setattr(self, key, value)
+        
+        full_result = {"location": "Paris, FR", "temperature": "12.3°C", "humidity": "60%", "timestamp": 1625076000}
+        self.mcp_server.execute_tool = AsyncMock(return_value=full_result)
+        self.mcp_server.get_tool.return_value = ToolEntry(
+            name="test_tool",
+            description="Test tool",
+            parameters={},
+            llm_view={"fields": ["location", "temperature", "humidity"], "parse_numbers": True, "rename": {"temperature": "temp_c"}}
+        )
+        
+        tool_call = {
+            "id": "tool_call_1",
+            "type": "function",
+            "function": {"name": "test_tool", "arguments": json.dumps({"input": "test"})}
+        }
+        first_completion = MagicMock()
+        first_completion.choices = [MagicMock(message=MockMessage({"role": "assistant", "content": None, "tool_calls": [tool_call]}))]
+        second_completion = MagicMock()
+        second_completion.choices = [MagicMock(message=MockMessage({"role": "assistant", "content": "Mild in Paris."}))]
+        mock_acompletion.side_effect = [first_completion, second_completion]
+        
+        history = [{"role": "user", "content": "Weather in Paris?"}]
+        with patch("builtins.print"):
+            result = await run_conversation(history, self.mcp_server)
+        
+        self.assertEqual(json.loads(history[2]["content"]), {"location": "Paris, FR", "temp_c": 12.3, "humidity": 60})
+        self.assertEqual(result["tool_calls"], [{"name": "test_tool", "arguments": {"input": "test"}, "result": full_result}])
+    
+    def make_tool_call_completion(self, *calls):
+        """Build a completion whose message calls test_tool once per arguments dict"""
+        message = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {"id": f"tool_call_{index}", "type": "function", "function": {"name": "test_tool", "arguments": json.dumps(arguments)}}
+                for index, arguments in enumerate(calls)
+            ]
+        }
+        completion = MagicMock()
+        completion.choices = [MagicMock(message=message)]
+        return completion
+    
+    def make_answer_completion(self, content):
+        completion = MagicMock()
+        completion.choices = [MagicMock(message={"role": "assistant", "content": content})]
+        return completion
+    
+    @patch('services.llm_service.litellm.acompletion')
+    async def test_template_answer_skips_summary_round(self, mock_acompletion):
+        """Test that one successful templated call is answered without a second completion"""
+        self.mcp_server.execute_tool = AsyncMock(return_value={"result": "test_success", "input": "test"})
+        self.mcp_server.get_tool.return_value = ToolEntry(
+            name="test_tool", description="Test tool", parameters={}, response_template="Tool said {result} for {input}."
+        )
+        mock_acompletion.side_effect = [self.make_tool_call_completion({"input": "test"})]
+        
+        history = [{"role": "user", "content": "Use the tool"}]
+        result = await run_conversation(history, self.mcp_server, skip_summary=True)
+        
+        self.assertEqual(mock_acompletion.call_count, 1)
+        self.assertEqual(result["content"], "Tool said test_success for test.")
+        self.assertEqual([m["role"] for m in history], ["user", "assistant", "tool", "assistant"])
+    
+    @patch('services.llm_service.litellm.acompletion')
+    async def test_template_answer_falls_back_to_summary(self, mock_acompletion):
+        """Test that the summary round runs when the request opts out, a call fails or several calls were made"""
+        self.mcp_server.get_tool.return_value = ToolEntry(
+            name="test_tool", description="Test tool", parameters={}, response_template="Tool said {result}."
+        )
+        cases = [
+            ("opted out", False, {"result": "ok"}, [{"input": "a"}]),
+            ("tool error", True, {"error": "boom"}, [{"input": "a"}]),
+            ("missing field", True, {"other": "ok"}, [{"input": "a"}]),
+            ("two calls", True, {"result": "ok"}, [{"input": "a"}, {"input": "b"}])
+        ]
+        for name, skip_summary, tool_result, calls in cases:
+            with self.subTest(name):
+                self.mcp_server.execute_tool = AsyncMock(return_value=tool_result)
+                mock_acompletion.reset_mock()
+                mock_acompletion.side_effect = [self.make_tool_call_completion(*calls), self.make_answer_completion("Summary.")]
+                
+                with patch("builtins.print"):
+                    result = await run_conversation([{"role": "user", "content": "Use the tool"}], self.mcp_server, skip_summary)
+                
+                self.assertEqual(mock_acompletion.call_count, 2)
+                self.assertEqual(result["content"], "Summary.")
+    
+    @patch('services.llm_service.config.COMPLETION_CACHE_TTL', 60)
+    @patch('services.llm_service.litellm.acompletion')
+    async def test_completion_cache(self, mock_acompletion):
+        """Test that identical completion requests are answered from the cache"""
+        mock_acompletion.return_value = self.make_answer_completion("Hello!")
+        
+        with patch('services.llm_service._completion_cache', TieredCache("completion")):
+            first = await run_conversation([{"role": "user", "content": "Hi"}], self.mcp_server)
+            second = await run_conversation([{"role": "user", "content": "Hi"}], self.mcp_server)
+            await run_conversation([{"role": "user", "content": "Hi there"}], self.mcp_server)
+        
+        self.assertEqual(first["content"], "Hello!")
+        self.assertEqual(second["content"], "Hello!")
+        self.assertEqual(mock_acompletion.call_count, 2)
+    
+    @patch('services.llm_service.config.COMPLETION_CACHE_TTL', 60)
+    @patch('services.llm_service.litellm.acompletion')
+    async def test_completion_cache_keyed_by_backend_model(self, mock_acompletion):
+        """Test that an answer cached from one backend's model is not served for another model"""
+        mock_acompletion.return_value = self.make_answer_completion("Hello!")
+        
+        with patch('services.llm_service._completion_cache', TieredCache("completion")):
+            for model in ("llama3", "mistral", "llama3"):
+                router = LLMRouter([LLMBackend("http://localhost:11434", model)])
+                with patch('services.llm_service.get_router', return_value=router):
+                    await run_conversation([{"role": "user", "content": "Hi"}], self.mcp_server)
+        
+        self.assertEqual([call.kwargs["model"] for call in mock_acompletion.call_args_list], ["ollama/llama3", "ollama/mistral"])
+    
+    @patch('services.llm_service.litellm.acompletion')
+    async def test_run_conversation_rolls_back_on_error(self, mock_acompletion):
+        """Test that a failed turn leaves the history unchanged"""
+        mock_acompletion.side_effect = Exception("API Error")
+        history = [{"role": "user", "content": "Hello"}]
+        
+        with self.assertRaises(Exception):
+            await run_conversation(history, self.mcp_server)
+        self.assertEqual(history, [{"role": "user", "content": "Hello"}])
+
+    def make_stream(self, *deltas):
+        """Build a streamed completion yielding one chunk per delta"""
+        async def stream():
+            for delta in deltas:
+                yield ModelResponseStream(choices=[StreamingChoices(delta=Delta(**delta))])
+            yield ModelResponseStream(choices=[StreamingChoices(delta=Delta(), finish_reason="stop")])
+        return stream()
+    
+    @patch('services.llm_service.litellm.acompletion')
+    async def test_run_conversation_streams_events(self, mock_acompletion):
+        """Test that tokens and tool events are passed on while the turn runs"""
+        tool_call = {"index": 0, "id": "call_1", "type": "function", "function": {"name": "test_tool", "arguments": '{"input": "test"}'}}
+        mock_acompletion.side_effect = [
+            self.make_stream({"content": None, "tool_calls": [tool_call]}),
+            self.make_stream({"content": "The tool "}, {"content": "worked."})
+        ]
+        events = []
+        
+        async def on_event(event):
+            events.append(event)
+        
+        history = [{"role": "user", "content": "Use the tool"}]
+        result = await run_conversation(history, self.mcp_server, skip_summary=False, on_event=on_event)
+        
+        self.assertTrue(all(call.kwargs["stream"] for call in mock_acompletion.call_args_list))
+        self.assertEqual(events, [
+            {"type": "tool_call", "name": "test_tool", "arguments": {"input": "test"}},
+            {"type": "tool_result", "name": "test_tool", "result": {"result": "test_success"}},
+            {"type": "token", "content": "The tool "},
+            {"type": "token", "content": "worked."}
+        ])
+        self.assertEqual(result["content"], "The tool worked.")
+        self.assertEqual(history[1]["tool_calls"][0]["function"]["name"], "test_tool")
+        self.assertEqual(history[-1], {"role": "assistant", "content": "The tool worked."})
+    
+    @patch('services.llm_service.litellm.acompletion')
+    async def test_run_conversation_rolls_back_on_cancel(self, mock_acompletion):
+        """Test that a cancelled turn leaves the history unchanged"""
+        started = asyncio.Event()
+        
+        async def slow_completion(**kwargs):
+            started.set()
+            await asyncio.sleep(10)
+        
+        mock_acompletion.side_effect = slow_completion
+        history = [{"role": "user", "content": "Hello"}]
+        turn = asyncio.ensure_future(run_conversation(history, self.mcp_server))
+        await started.wait()
+        turn.cancel()
+        
+        with self.assertRaises(asyncio.CancelledError):
+            await turn
+        self.assertEqual(history, [{"role": "user", "content": "Hello"}])
+
+    @patch('services.llm_service.config.PROMPT_PREFIX_STABLE', True)
+    @patch('services.llm_service.litellm.acompletion')
+    async def test_stable_prefix_mode(self, mock_acompletion):
+        """Test that both rounds share the system prompt and tool block"""
+        class MockMessage(dict):
+            def __init__(self, data):
+                super().__init__(data)
+                for key, value in data.items():
+                    setattr(self, key, value)
+        
+        tool_call = {"id": "tool_call_1", "function": {"name": "test_tool", "arguments": json.dumps({"input": "test"})}}
+        first_completion = MagicMock()
+        first_completion.choices = [MagicMock(message=MockMessage({"role": "assistant", "content": None, "tool_calls": [tool_call]}))]
+        second_completion = MagicMock()
+        second_completion.choices = [MagicMock(message=MockMessage({"role": "assistant", "content": "Done."}))]
+        mock_acompletion.side_effect = [first_completion, second_completion]
+        
+        history = [{"role": "system", "content": "You are helpful."}, {"role": "user", "content": "Use the tool"}]
+        await run_conversation(history, self.mcp_server)
+        
+        first_call, second_call = mock_acompletion.call_args_list
+        self.assertEqual(first_call.kwargs["tools"], second_call.kwargs["tools"])
+        self.assertEqual(second_call.kwargs["tool_choice"], "none")
+        self.assertTrue(history[0]["content"].endswith(SUMMARY_INSTRUCTION))
+        self.assertNotIn("system", [m["role"] for m in history[1:]])
+    
+    def test_stabilize_prefix_is_idempotent(self):
+        """Test that the summary instruction is added to the system prompt only once"""
+        messages = [{"role": "user", "content": "hi"}]
+        stabilize_prefix(messages)
+        stabilize_prefix(messages)
+        self.assertEqual(messages[0], {"role": "system", "content": SUMMARY_INSTRUCTION})
+        self.assertEqual(len(messages), 2)
+    
+    @patch('services.llm_service.config.LLM_KEEP_ALIVE', "1h")
+    def test_keep_alive_option(self):
+        """Test that keep_alive is sent at the top level of the Ollama request"""
+        self.assertEqual(completion_options()["extra_body"], {"keep_alive": "1h"})
+    
+    async def test_capture_backend_timings(self):
+        """Test reading prompt-eval and eval durations from a raw Ollama response"""
+        response = httpx.Response(
+            200,
+            json={"response": "hi", "prompt_eval_count": 10, "prompt_eval_duration": 2000000, "eval_count": 5, "eval_duration": 8000000},
+            request=httpx.Request("POST", "http://localhost:11434/api/generate")
+        )
+        sink = {}
+        token = _round_timings.set(sink)
+        try:
+            await capture_backend_timings(response)
+        finally:
+            _round_timings.reset(token)
+        
+        self.assertEqual(sink["prompt_eval_ms"], 2.0)
+        self.assertEqual(sink["eval_ms"], 8.0)
+        self.assertEqual(sink["prompt_eval_count"], 10)
+
 # Function to convert async tests to sync for unittest
 def sync_test(coro):
     def wrapper(*args, **kwargs):
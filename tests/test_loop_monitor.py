@@ -0,0 +1,141 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import time
+from services.mcp_service import MCPServer
+from services.loop_monitor import LoopMonitor, LoopBlockedError, watch_loop, _original_run
+from services.metrics import metrics
+from services.profiler import tagged
+from models.schema import Tool
+from tools.calculator import register_calculator_tool
+from tools.time_tool import register_time_tool
+
+async def blocking_tool(seconds: float):
+    """Stands in for a tool calling requests.get directly"""
+    time.sleep(seconds)
+    return {"slept": seconds}
+
+async def resumed_blocking_tool(seconds: float):
+    """Blocks after its first await"""
+    await asyncio.sleep(0)
+    time.sleep(seconds)
+    return {"slept": seconds}
+
+def tool(name, function):
+    return Tool(
+        name=name,
+        description="Test tool",
+        parameters={"type": "object", "properties": {"seconds": {"type": "number"}}},
+        function=function
+    )
+
+class TestLoopMonitor(unittest.TestCase):
+    """Test cases for the event loop lag and blocking callback monitor"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        metrics.reset()
+        self.mcp_server = MCPServer()
+        self.mcp_server.register_tool(tool("blocking_tool", blocking_tool))
+        self.mcp_server.register_tool(tool("resumed_blocking_tool", resumed_blocking_tool))
+        self.monitor = LoopMonitor(slow_callback_duration=0.02, lag_interval=0.005)
+        patcher = patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_attributes_blocking_to_tools_and_endpoints(self):
+        """Test that blocking stretches are charged to the tool, else the endpoint, else the coroutine"""
+        self.monitor.start()
+        # Callbacks are timed from the next one on
+        await asyncio.sleep(0)
+        try:
+            with tagged(endpoint="POST /chat"):
+                await self.mcp_server.execute_tool("blocking_tool", {"seconds": 0.03})
+                await asyncio.sleep(0)
+                await self.mcp_server.execute_tool("resumed_blocking_tool", {"seconds": 0.03})
+                await asyncio.sleep(0)
+                time.sleep(0.03)
+                await asyncio.sleep(0)
+
+            async def untagged():
+                time.sleep(0.03)
+            await asyncio.create_task(untagged())
+            await self.mcp_server.execute_tool("blocking_tool", {"seconds": 0.001})
+        finally:
+            await self.monitor.stop()
+
+        offenders = self.monitor.offenders
+        self.assertEqual(offenders["tool:blocking_tool"]["count"], 1)
+        self.assertEqual(offenders["tool:resumed_blocking_tool"]["count"], 1)
+        self.assertEqual(offenders["endpoint:POST /chat"]["count"], 1)
+        self.assertIn("task:TestLoopMonitor.test_attributes_blocking_to_tools_and_endpoints.<locals>.untagged", offenders)
+        self.assertEqual(self.monitor.recent[0]["endpoint"], "POST /chat")
+        self.assertGreaterEqual(offenders["tool:blocking_tool"]["max_ms"], 30)
+        self.assertEqual(metrics.counter("loop.slow_callbacks"), 4)
+
+    async def test_lag_percentiles(self):
+        """Test that lag is measured and reported with the offenders"""
+        self.monitor.start()
+        try:
+            await asyncio.sleep(0.02)
+            time.sleep(0.05)
+            await asyncio.sleep(0.02)
+        finally:
+            await self.monitor.stop()
+        self.assertEqual(asyncio.events.Handle._run.__name__, "_run")
+
+        stats = self.monitor.stats()
+        self.assertGreaterEqual(stats["lag_ms"]["max"], 30)
+        self.assertEqual(stats["slow_callbacks"], 1)
+        self.assertEqual(stats["recent"][0]["offender"], "task:TestLoopMonitor.test_lag_percentiles")
+
+    def test_uninstall_keeps_later_wrappers(self):
+        """Test that uninstalling does not undo a Handle._run patch made after install"""
+        self.monitor.install()
+        timed = asyncio.events.Handle._run
+
+        def wrapper(handle):
+            return timed(handle)
+
+        asyncio.events.Handle._run = wrapper
+        try:
+            self.monitor.uninstall()
+            self.assertIs(asyncio.events.Handle._run, wrapper)
+        finally:
+            asyncio.events.Handle._run = _original_run
+
+    async def test_watch_loop_fails_on_blocking_tools(self):
+        """Test that a tool blocking past the threshold fails the watched block"""
+        with self.assertRaises(LoopBlockedError) as raised:
+            with watch_loop(20):
+                await asyncio.create_task(self.mcp_server.execute_tool("blocking_tool", {"seconds": 0.03}))
+        self.assertIn("tool:blocking_tool", str(raised.exception))
+
+        # Blocking outside tools is not a failure unless asked for
+        with watch_loop(20):
+            await asyncio.sleep(0)
+            time.sleep(0.03)
+            await asyncio.sleep(0)
+
+    async def test_bundled_tools_do_not_block(self):
+        """Test that local tools keep the loop responsive"""
+        register_calculator_tool(self.mcp_server)
+        register_time_tool(self.mcp_server)
+        with watch_loop(50):
+            await asyncio.create_task(self.mcp_server.execute_tool("calculate", {"expression": "2 * (3 + 4)"}))
+            await asyncio.create_task(self.mcp_server.execute_tool("get_time", {"timezone": "UTC"}))
+
+# Function to convert async tests to sync for unittest
+def sync_test(coro):
+    def wrapper(*args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+# Apply the decorator to all async test methods
+for attr in dir(TestLoopMonitor):
+    if attr.startswith('test_') and asyncio.iscoroutinefunction(getattr(TestLoopMonitor, attr)):
+        setattr(TestLoopMonitor, attr, sync_test(getattr(TestLoopMonitor, attr)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import json
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from models.schema import Tool
+from services.mcp_service import MCPServer
+from services.mcp_protocol import MCPProtocolHandler, INVALID_PARAMS, METHOD_NOT_FOUND, PARSE_ERROR, INVALID_REQUEST
+
+PARAMETERS = {"type": "object", "properties": {"text": {"type": "string"}}, "required": ["text"]}
+
+def request(method, request_id=1, **params):
+    return {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+
+class TestMCPProtocol(unittest.TestCase):
+    """Test cases for the Model Context Protocol transports"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.mcp_server = MCPServer()
+        self.gate = asyncio.Event()
+
+        async def echo(text):
+            return {"echo": text}
+
+        async def wait_for_gate(text):
+            # Returns only once the 'open_gate' call of the same batch has run
+            await asyncio.wait_for(self.gate.wait(), 1)
+            return {"waited": text}
+
+        async def open_gate(text):
+            self.gate.set()
+            return {"opened": text}
+
+        async def progress(text):
+            yield "step 1"
+            yield {"step": 2}
+
+        with patch("builtins.print"):
+            for name, function in [("echo", echo), ("wait_for_gate", wait_for_gate), ("open_gate", open_gate), ("progress", progress)]:
+                self.mcp_server.register_tool(Tool(name=name, description=f"The {name} tool", parameters=PARAMETERS, function=function))
+        self.handler = MCPProtocolHandler(self.mcp_server)
+
+    async def call(self, message, notify=None):
+        response = await self.handler.handle_message(json.dumps(message).encode(), notify)
+        return None if response is None else json.loads(response)
+
+    async def test_initialize_and_list(self):
+        """Test the handshake and that the tool list is serialized once per registry change"""
+        response = await self.call(request("initialize", protocolVersion="2024-11-05", capabilities={}))
+        self.assertEqual(response["result"]["protocolVersion"], "2024-11-05")
+        self.assertIn("tools", response["result"]["capabilities"])
+        self.assertIsNone(await self.call({"jsonrpc": "2.0", "method": "notifications/initialized"}))
+
+        response = await self.call(request("tools/list", request_id="list"))
+        self.assertEqual(response["id"], "list")
+        self.assertEqual(response["result"]["tools"][0], {"name": "echo", "description": "The echo tool", "inputSchema": PARAMETERS})
+        self.assertIs(self.handler.tools_list_json(), self.handler.tools_list_json())
+
+        with patch("builtins.print"):
+            self.mcp_server.unregister_tool("echo")
+        response = await self.call(request("tools/list"))
+        self.assertNotIn("echo", [tool["name"] for tool in response["result"]["tools"]])
+
+    async def test_tools_call(self):
+        """Test tool results, failures and protocol errors"""
+        response = await self.call(request("tools/call", name="echo", arguments={"text": "hi"}))
+        self.assertFalse(response["result"]["isError"])
+        self.assertEqual(json.loads(response["result"]["content"][0]["text"]), {"echo": "hi"})
+        self.assertEqual(response["result"]["structuredContent"], {"echo": "hi"})
+
+        response = await self.call(request("tools/call", name="echo", arguments={"wrong": "hi"}))
+        self.assertTrue(response["result"]["isError"])
+
+        response = await self.call(request("tools/call", name="missing", arguments={}))
+        self.assertEqual(response["error"]["code"], INVALID_PARAMS)
+        response = await self.call(request("resources/list"))
+        self.assertEqual(response["error"]["code"], METHOD_NOT_FOUND)
+        self.assertEqual(json.loads(await self.handler.handle_message(b"{not json"))["error"]["code"], PARSE_ERROR)
+        self.assertEqual((await self.call({"id": 3, "method": "ping"}))["error"]["code"], INVALID_REQUEST)
+
+    async def test_batch_runs_concurrently(self):
+        """Test that a batch's calls run at the same time and answer in one array"""
+        responses = await self.call([
+            request("tools/call", 1, name="wait_for_gate", arguments={"text": "a"}),
+            request("tools/call", 2, name="open_gate", arguments={"text": "b"}),
+            {"jsonrpc": "2.0", "method": "notifications/initialized"},
+            request("ping", 3)
+        ])
+        self.assertEqual([response["id"] for response in responses], [1, 2, 3])
+        self.assertEqual(responses[0]["result"]["structuredContent"], {"waited": "a"})
+        self.assertEqual(responses[2]["result"], {})
+        self.assertEqual((await self.call([]))["error"]["code"], INVALID_REQUEST)
+
+    async def test_stdio_stream_with_progress(self):
+        """Test newline-delimited messages with progress notifications for streaming tools"""
+        lines = [
+            json.dumps(request("tools/call", 7, name="progress", arguments={"text": "x"}, _meta={"progressToken": "p"})).encode() + b"\n",
+            b"\n",
+            json.dumps(request("ping", 8)).encode() + b"\n"
+        ]
+        written = []
+
+        async def read_line():
+            return lines.pop(0) if lines else b""
+
+        async def write(data):
+            written.append(json.loads(data))
+
+        await self.handler.serve_stream(read_line, write)
+
+        progress = [message["params"] for message in written if message.get("method") == "notifications/progress"]
+        self.assertEqual(progress, [
+            {"progressToken": "p", "progress": 1, "message": "step 1"},
+            {"progressToken": "p", "progress": 2, "message": '{"step":2}'}
+        ])
+        responses = {message["id"]: message for message in written if "id" in message}
+        self.assertEqual(set(responses), {7, 8})
+        self.assertEqual(responses[7]["result"]["structuredContent"]["chunks"], 2)
+
+    def test_http_transport(self):
+        """Test POST requests, notification-only bodies and batches over HTTP"""
+        app = FastAPI()
+
+        @app.post("/mcp")
+        async def mcp_endpoint(http_request: Request):
+            return await self.handler.http_response(await http_request.body())
+
+        client = TestClient(app)
+        response = client.post("/mcp", json=request("tools/call", name="echo", arguments={"text": "hi"}))
+        self.assertEqual(response.headers["content-type"], "application/json")
+        self.assertEqual(response.json()["result"]["structuredContent"], {"echo": "hi"})
+
+        self.assertEqual(client.post("/mcp", json={"jsonrpc": "2.0", "method": "notifications/initialized"}).status_code, 202)
+        self.assertEqual(len(client.post("/mcp", json=[request("ping", 1), request("tools/list", 2)]).json()), 2)
+
+# Function to convert async tests to sync for unittest
+def sync_test(coro):
+    def wrapper(*args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+# Apply the decorator to all async test methods
+for attr in dir(TestMCPProtocol):
+    if attr.startswith('test_') and asyncio.iscoroutinefunction(getattr(TestMCPProtocol, attr)):
+        setattr(TestMCPProtocol, attr, sync_test(getattr(TestMCPProtocol, attr)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import json
+import httpx
+from fastapi import FastAPI, Request
+from starlette.responses import Response
+from models.schema import Tool
+from services.mcp_service import MCPServer
+from services.mcp_protocol import MCPProtocolHandler
+from services.mcp_remote import RemoteMCPServer, parse_event_stream, parse_remote_servers
+
+PARAMETERS = {"type": "object", "properties": {"text": {"type": "string"}}, "required": ["text"]}
+
+class StandInMCPServer:
+    """In-process MCP server on the streamable HTTP transport, recording what it receives"""
+
+    def __init__(self):
+        self.registry = MCPServer()
+        self.handler = MCPProtocolHandler(self.registry)
+        self.posts = []
+        self.running = 0
+        self.peak = 0
+        self.announce_change = False
+        self.app = FastAPI()
+
+        @self.app.post("/mcp")
+        async def mcp_endpoint(request: Request):
+            body = await request.body()
+            self.posts.append(json.loads(body))
+            response = await self.handler.handle_message(body)
+            if response is None:
+                return Response(status_code=202)
+            if self.announce_change:
+                # Answer as an event stream, with the change notification first
+                self.announce_change = False
+                notification = json.dumps({"jsonrpc": "2.0", "method": "notifications/tools/list_changed"})
+                events = f"event: message\ndata: {notification}\n\nevent: message\ndata: {response.decode()}\n\n"
+                return Response(content=events, media_type="text/event-stream")
+            return Response(content=response, media_type="application/json", headers={"Mcp-Session-Id": "session-1"})
+
+    def add_tool(self, name, function):
+        with patch("builtins.print"):
+            self.registry.register_tool(Tool(name=name, description=f"Remote {name}", parameters=PARAMETERS, function=function))
+
+    def requests(self, method):
+        """Requests received for a method, whether sent alone or in a batch"""
+        messages = [message for post in self.posts for message in (post if isinstance(post, list) else [post])]
+        return [message for message in messages if message.get("method") == method]
+
+class TestMCPRemote(unittest.TestCase):
+    """Test cases for remote MCP servers federated into the registry"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.stand_in = StandInMCPServer()
+
+        async def shout(text):
+            self.stand_in.running += 1
+            self.stand_in.peak = max(self.stand_in.peak, self.stand_in.running)
+            await asyncio.sleep(0.01)
+            self.stand_in.running -= 1
+            return {"shout": text.upper()}
+
+        async def fail(text):
+            return {"error": f"Cannot handle {text}"}
+
+        self.stand_in.add_tool("shout", shout)
+        self.stand_in.add_tool("fail", fail)
+        self.mcp_server = MCPServer()
+        with patch("builtins.print"):
+            self.mcp_server.register_tool(Tool(name="local", description="Local tool", parameters=PARAMETERS, function=lambda text: {"local": text}))
+
+    def remote(self, **options):
+        transport = httpx.ASGITransport(app=self.stand_in.app)
+        return RemoteMCPServer("remote", "http://stand-in/mcp", transport=transport, **options)
+
+    async def add(self, remote):
+        with patch("builtins.print"):
+            return await self.mcp_server.add_remote_server(remote)
+
+    async def test_remote_tools_proxied(self):
+        """Test that remote tools are registered with a prefix and run through execute_tool"""
+        remote = self.remote()
+        self.assertEqual(await self.add(remote), 2)
+        self.assertEqual([tool["function"]["name"] for tool in self.mcp_server.get_tools_for_llm()], ["local", "remote_shout", "remote_fail"])
+
+        self.assertEqual(await self.mcp_server.execute_tool("remote_shout", {"text": "hi"}), {"shout": "HI"})
+        self.assertEqual(await self.mcp_server.execute_tool("remote_fail", {"text": "x"}), {"error": "Cannot handle x"})
+        self.assertEqual(remote.session_id, "session-1")
+        self.assertEqual(len(self.stand_in.requests("initialize")), 1)
+        await self.mcp_server.close_remotes()
+
+    async def test_pipelining_and_concurrency_limit(self):
+        """Test that concurrent calls share batches and respect the per-remote limit"""
+        remote = self.remote(max_concurrency=3, batch_window=0.005)
+        await self.add(remote)
+        self.stand_in.posts.clear()
+
+        results = await asyncio.gather(*(self.mcp_server.execute_tool("remote_shout", {"text": str(index)}) for index in range(9)))
+
+        self.assertEqual([result["shout"] for result in results], [str(index) for index in range(9)])
+        self.assertEqual(self.stand_in.peak, 3)
+        # Each group of three calls let through by the limit goes out as one batch
+        self.assertLessEqual(len(self.stand_in.posts), 4)
+        self.assertTrue(any(isinstance(post, list) and len(post) == 3 for post in self.stand_in.posts))
+        await self.mcp_server.close_remotes()
+
+    async def test_schema_cached_and_refreshed_on_change(self):
+        """Test that the tool list is fetched once and again after a change notification"""
+        remote = self.remote()
+        await self.add(remote)
+        await self.mcp_server.sync_remote(remote)
+        self.assertEqual(len(self.stand_in.requests("tools/list")), 1)
+
+        async def whisper(text):
+            return {"whisper": text.lower()}
+
+        self.stand_in.add_tool("whisper", whisper)
+        self.stand_in.announce_change = True
+        with patch("builtins.print"):
+            await self.mcp_server.execute_tool("remote_shout", {"text": "hi"})
+            await self.mcp_server._remote_syncs["remote"]
+
+        self.assertEqual(len(self.stand_in.requests("tools/list")), 2)
+        self.assertEqual(await self.mcp_server.execute_tool("remote_whisper", {"text": "HI"}), {"whisper": "hi"})
+        await self.mcp_server.close_remotes()
+
+    async def test_removed_tool_and_unreachable_remote(self):
+        """Test that calls to a vanished tool refresh the list and transport errors surface"""
+        remote = self.remote()
+        await self.add(remote)
+        with patch("builtins.print"):
+            self.stand_in.registry.unregister_tool("fail")
+            with self.assertRaisesRegex(Exception, "Unknown tool"):
+                await self.mcp_server.execute_tool("remote_fail", {"text": "x"})
+            await self.mcp_server._remote_syncs["remote"]
+        self.assertIsNone(self.mcp_server.get_tool("remote_fail"))
+
+        offline = RemoteMCPServer("offline", "http://offline/mcp", transport=httpx.MockTransport(lambda request: httpx.Response(503)))
+        with self.assertRaises(httpx.HTTPStatusError):
+            await self.add(offline)
+        with patch("builtins.print") as mock_print:
+            await self.mcp_server.refresh_remotes()
+        self.assertIn("could not be refreshed", mock_print.call_args[0][0])
+        await self.mcp_server.close_remotes()
+
+    def test_parsing(self):
+        """Test event stream and configuration parsing"""
+        self.assertEqual(parse_event_stream('event: message\ndata: {"id": 1}\n\ndata: [{"id": 2}]\n'), [{"id": 1}, [{"id": 2}]])
+        remotes = parse_remote_servers("search|http://search/mcp|s_, files|http://files/mcp", timeout=5)
+        self.assertEqual([(remote.name, remote.prefix) for remote in remotes], [("search", "s_"), ("files", "files_")])
+        remotes = parse_remote_servers('[{"name": "search", "url": "http://search/mcp", "max_concurrency": 2}]')
+        self.assertEqual(remotes[0].max_concurrency, 2)
+
+# Function to convert async tests to sync for unittest
+def sync_test(coro):
+    def wrapper(*args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+# Apply the decorator to all async test methods
+for attr in dir(TestMCPRemote):
+    if attr.startswith('test_') and asyncio.iscoroutinefunction(getattr(TestMCPRemote, attr)):
+        setattr(TestMCPRemote, attr, sync_test(getattr(TestMCPRemote, attr)))
+
+if __name__ == "__main__":
+    unittest.main()
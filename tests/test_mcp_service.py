@@ -36,7 +36,9 @@ class TestMCPService(unittest.TestCase):
         
         # Verify tool was registered
         self.assertIn("test_tool", self.mcp_server.tools)
-        self.assertEqual(self.mcp_server.tools["test_tool"], self.test_tool)
+        entry = self.mcp_server.tools["test_tool"]
+        self.assertEqual(entry.name, self.test_tool.name)
+        self.assertIs(entry.function, self.test_tool.function)
     
     def test_list_tools(self):
         """Test listing registered tools"""
@@ -0,0 +1,46 @@
+import unittest
+from services.metrics import Metrics, percentile
+
+class TestMetrics(unittest.TestCase):
+    """Test cases for the metrics registry"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.metrics = Metrics(max_samples=100)
+
+    def test_counters_and_gauges(self):
+        """Test counter increments and gauge updates"""
+        self.metrics.increment("requests")
+        self.metrics.increment("requests", 2)
+        self.metrics.set_gauge("queue_depth", 5)
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["counters"]["requests"], 3)
+        self.assertEqual(snapshot["gauges"]["queue_depth"], 5)
+
+    def test_histogram_percentiles(self):
+        """Test histogram summaries over a bounded window"""
+        for value in range(1, 201):
+            self.metrics.observe("latency", value)
+
+        summary = self.metrics.summary("latency")
+        self.assertEqual(summary["count"], 200)
+        # Only the last 100 samples are kept
+        self.assertEqual(summary["p50"], 150)
+        self.assertEqual(summary["max"], 200)
+
+    def test_percentile_empty(self):
+        """Test percentile of an empty sequence"""
+        self.assertEqual(percentile([], 0.95), 0.0)
+
+    def test_collectors(self):
+        """Test that collector results appear in snapshots"""
+        self.metrics.register_collector("derived", lambda: {"ratio": 0.5})
+        self.metrics.register_collector("broken", lambda: 1 / 0)
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["derived"], {"ratio": 0.5})
+        self.assertIn("error", snapshot["broken"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import asyncio
+import time
+from services.quota import TokenBucket, QuotaManager, QuotaExceededError, ClientRateLimiter, quota_manager
+from services.http_cache import ResponseCache, CachePolicy
+from services.upstream import UpstreamClient
+from services.metrics import metrics
+
+HOST = "rates.example.com"
+URL = f"https://{HOST}/latest/USD"
+
+class FakeClock:
+    """Manually advanced time source"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def json_response(data):
+    """Build a fake requests response"""
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = data
+    return response
+
+class TestQuota(unittest.TestCase):
+    """Test cases for the provider quotas and client rate limits"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        metrics.reset()
+        self.clock = FakeClock()
+
+    def test_token_bucket_refill(self):
+        """Test that a bucket refills continuously and never beyond capacity"""
+        bucket = TokenBucket(60, 60, clock=self.clock)
+        for _ in range(60):
+            self.assertTrue(bucket.consume())
+        self.assertFalse(bucket.consume())
+        self.assertAlmostEqual(bucket.wait_time(), 1.0)
+
+        self.clock.now += 30
+        self.assertAlmostEqual(bucket.remaining, 30)
+        self.clock.now += 3600
+        self.assertEqual(bucket.remaining, 60)
+
+    def test_tightest_quota_wins(self):
+        """Test that a call needs budget from every quota of its provider"""
+        manager = QuotaManager({HOST: {"per_minute": 60, "per_day": 2}}, max_wait=5, clock=self.clock)
+        provider = manager.providers[HOST]
+        for bucket in provider.buckets.values():
+            bucket.consume()
+            bucket.consume()
+        self.assertGreater(provider.wait_time(), 5)
+        self.assertTrue(manager.under_pressure(HOST))
+        self.assertFalse(manager.under_pressure("other.example.com"))
+        self.assertEqual(manager.status()[HOST]["remaining"], {"per_minute": 58, "per_day": 0})
+
+        with self.assertRaises(ValueError):
+            QuotaManager({HOST: {"per_week": 1}})
+
+    async def test_calls_queue_in_order(self):
+        """Test that calls over the quota wait their turn instead of failing"""
+        manager = QuotaManager({HOST: {"per_second": 10}}, max_wait=1)
+        for bucket in manager.providers[HOST].buckets.values():
+            bucket.tokens = 0
+        order = []
+
+        async def call(index):
+            await manager.acquire(HOST)
+            order.append(index)
+
+        started = time.monotonic()
+        await asyncio.gather(*(call(index) for index in range(3)))
+        self.assertEqual(order, [0, 1, 2])
+        self.assertGreaterEqual(time.monotonic() - started, 0.25)
+        self.assertEqual(metrics.counter("quota.delayed"), 3)
+        self.assertEqual(manager.providers[HOST].waiting, 0)
+
+    async def test_rejects_long_waits(self):
+        """Test that a call is rejected when the quota refills too late"""
+        manager = QuotaManager({HOST: {"per_minute": 1}}, max_wait=0.1)
+        await manager.acquire(HOST)
+        with self.assertRaises(QuotaExceededError) as context:
+            await manager.acquire(HOST)
+        self.assertGreater(context.exception.retry_after, 50)
+        self.assertEqual(manager.status()[HOST]["rejected"], 1)
+        # Hosts without a quota are never held
+        await manager.acquire("other.example.com")
+
+    @patch('services.upstream.requests.get')
+    async def test_upstream_prefers_cache_under_pressure(self, mock_get):
+        """Test that stale responses are served without a refresh when quota runs low"""
+        mock_get.return_value = json_response({"rates": {"EUR": 0.9}})
+        quota = QuotaManager({HOST: {"per_day": 4}}, max_wait=0, pressure_threshold=0.4, clock=self.clock)
+        cache = ResponseCache(
+            [CachePolicy(f"https://{HOST}/*", soft_ttl=60, hard_ttl=300, stale_if_error=600)],
+            clock=self.clock,
+            under_pressure=lambda url: quota.under_pressure(HOST)
+        )
+        client = UpstreamClient(max_retries=0, hedge=False, cache=cache, quota=quota)
+
+        await client.get_json(URL)
+        await client.get_json(f"https://{HOST}/latest/EUR")
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertTrue(quota.under_pressure(HOST))
+
+        # Past hard_ttl this would normally be refetched
+        self.clock.now += 400
+        self.assertEqual(await client.get_json(URL), {"rates": {"EUR": 0.9}})
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(metrics.counter("http_cache.quota_stale"), 1)
+
+    @patch('services.upstream.requests.get')
+    async def test_upstream_falls_back_when_quota_exhausted(self, mock_get):
+        """Test that an exhausted quota serves the last good body without calling the host"""
+        mock_get.return_value = json_response({"ok": True})
+        quota = QuotaManager({HOST: {"per_minute": 1}}, max_wait=0)
+        client = UpstreamClient(max_retries=0, hedge=False, quota=quota)
+
+        self.assertEqual(await client.get_json(URL), {"ok": True})
+        self.assertEqual(await client.get_json(URL), {"ok": True})
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(metrics.counter("upstream.quota_fallbacks"), 1)
+        self.assertEqual(client.breaker(HOST).state, "closed")
+
+        with self.assertRaises(QuotaExceededError):
+            await client.get_json(f"https://{HOST}/latest/EUR")
+
+    def test_client_rate_limiter(self):
+        """Test per-client buckets with a burst and a bounded client table"""
+        limiter = ClientRateLimiter(per_minute=60, burst=2, max_clients=2, clock=self.clock)
+        self.assertEqual(limiter.check("alice"), (True, 0.0))
+        self.assertEqual(limiter.check("alice"), (True, 0.0))
+        allowed, retry_after = limiter.check("alice")
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 1.0)
+        # Other clients have their own budget
+        self.assertTrue(limiter.check("bob")[0])
+
+        self.clock.now += 1
+        self.assertTrue(limiter.check("alice")[0])
+
+        limiter.check("carol")
+        self.assertEqual(list(limiter.buckets), ["alice", "carol"])
+
+    def test_client_rate_limiter_ignores_unknown_api_keys(self):
+        """Test that rotating made-up API keys still share their address's bucket"""
+        limiter = ClientRateLimiter(per_minute=60, burst=2, clock=self.clock, api_keys=["team-key"])
+        results = [limiter.check(limiter.client_id(f"random-{n}", "10.0.0.1"))[0] for n in range(6)]
+        self.assertEqual(results, [True, True, False, False, False, False])
+        self.assertEqual(list(limiter.buckets), ["addr:10.0.0.1"])
+
+        # Configured keys have a bucket of their own
+        self.assertEqual(limiter.client_id("team-key", "10.0.0.1"), "key:team-key")
+        self.assertTrue(limiter.check(limiter.client_id("team-key", "10.0.0.1"))[0])
+        self.assertEqual(limiter.client_id(None, None), "addr:unknown")
+
+    def test_remaining_budget_on_metrics(self):
+        """Test that the shared manager reports its budget on /metrics"""
+        snapshot = metrics.snapshot()
+        self.assertIn("quota", snapshot)
+        self.assertEqual(set(snapshot["quota"]), set(quota_manager.providers))
+        self.assertIn("per_day", snapshot["quota"]["open.er-api.com"]["remaining"])
+
+# Function to convert async tests to sync for unittest
+def sync_test(coro):
+    def wrapper(*args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+# Apply the decorator to all async test methods
+for attr in dir(TestQuota):
+    if attr.startswith('test_') and asyncio.iscoroutinefunction(getattr(TestQuota, attr)):
+        setattr(TestQuota, attr, sync_test(getattr(TestQuota, attr)))
+
+if __name__ == "__main__":
+    unittest.main()
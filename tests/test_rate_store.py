@@ -0,0 +1,126 @@
+import unittest
+from unittest.mock import patch, AsyncMock
+import asyncio
+import os
+import tempfile
+from datetime import date, timedelta
+import numpy as np
+from services.rate_store import RateStore, snapshot_latest_rates, day_index
+from tools.currency_history import convert_currency_historical, get_rate_trend
+
+class TestRateStore(unittest.TestCase):
+    """Test cases for the memory-mapped historical rate store and its tools"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = RateStore(self.directory.name, "USD")
+        patcher = patch("tools.currency_history.get_rate_store", return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Clean up test fixtures"""
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_snapshot_and_lookup(self):
+        """Test that a stored table answers cross rates, falling back over days without rates"""
+        friday = date(2024, 3, 1)
+        self.assertEqual(self.store.write_snapshot(friday, {"USD": 1.0, "EUR": 0.9, "JPY": 150.0}), 2)
+
+        rate, rate_date = self.store.cross_rate("EUR", "JPY", friday)
+        self.assertAlmostEqual(rate, 150.0 / 0.9)
+        # Saturday has no rate; Friday's is used
+        rate, rate_date = self.store.cross_rate("USD", "EUR", friday + timedelta(days=1))
+        self.assertEqual((rate, rate_date), (0.9, friday))
+        self.assertIsNone(self.store.cross_rate("USD", "EUR", friday + timedelta(days=30)))
+        self.assertIsNone(self.store.cross_rate("USD", "GBP", friday))
+        self.assertEqual(self.store.currencies(), ["EUR", "JPY", "USD"])
+
+    def test_bulk_import_rebases(self):
+        """Test importing a wide CSV quoted against another base currency"""
+        filename = os.path.join(self.directory.name, "ecb.csv")
+        with open(filename, "w") as handle:
+            handle.write("Date,USD,GBP,JPY\n2024-01-02,1.10,0.86,N/A\n2024-01-03,1.09,0.87,160.0\n")
+
+        stored = self.store.import_csv(filename, base="EUR")
+        # USD itself is the store's base and not stored; EUR is added from the USD column
+        self.assertEqual(stored, 2 + 2 + 1)
+        rate, _ = self.store.cross_rate("EUR", "USD", date(2024, 1, 3))
+        self.assertAlmostEqual(rate, 1.09)
+        rate, _ = self.store.cross_rate("EUR", "GBP", date(2024, 1, 2))
+        self.assertAlmostEqual(rate, 0.86)
+        self.assertTrue(np.isnan(self.store.series("JPY", date(2024, 1, 2), date(2024, 1, 2))[0]))
+
+    def test_trend_is_vectorized_over_slices(self):
+        """Test range aggregation over the memory-mapped column"""
+        start = date(2023, 1, 1)
+        days = np.arange(day_index(start), day_index(start) + 100)
+        values = np.linspace(0.8, 0.9, 100)
+        values[50] = np.nan
+        self.store.write_columns(days, {"EUR": values})
+        self.assertIsInstance(self.store.column("EUR"), np.memmap)
+
+        trend = self.store.trend("USD", "EUR", start - timedelta(days=5), start + timedelta(days=99))
+        self.assertEqual(trend["first"], {"date": "2023-01-01", "rate": 0.8})
+        self.assertAlmostEqual(trend["last"]["rate"], 0.9)
+        self.assertAlmostEqual(trend["change_pct"], 12.5)
+        self.assertEqual(trend["max"]["date"], (start + timedelta(days=99)).isoformat())
+        self.assertEqual(trend["days_with_data"], 99)
+        self.assertIsNone(self.store.trend("USD", "EUR", date(2020, 1, 1), date(2020, 2, 1)))
+
+    def test_readers_see_growth(self):
+        """Test that another store on the same directory reads rates written after it opened the column"""
+        reader = RateStore(self.directory.name, "USD")
+        self.store.write_snapshot(date(2024, 1, 1), {"EUR": 0.9})
+        self.assertEqual(reader.cross_rate("USD", "EUR", date(2024, 1, 1))[0], 0.9)
+        self.store.write_snapshot(date(2026, 6, 1), {"EUR": 0.8})
+        self.assertEqual(reader.cross_rate("USD", "EUR", date(2026, 6, 1))[0], 0.8)
+
+    async def test_snapshot_latest_rates(self):
+        """Test recording the latest table of the exchange-rate API"""
+        table = {"result": "success", "base_code": "USD", "time_last_update_unix": 1704153600, "rates": {"USD": 1, "EUR": 0.91}}
+        with patch("services.upstream.upstream.get_json", AsyncMock(return_value=table)):
+            self.assertEqual(await snapshot_latest_rates(self.store), 1)
+        self.assertEqual(self.store.cross_rate("USD", "EUR", date(2024, 1, 2))[0], 0.91)
+
+    async def test_tools(self):
+        """Test the historical conversion and trend tools"""
+        self.store.write_snapshot(date(2024, 1, 1), {"EUR": 0.9})
+        self.store.write_snapshot(date(2024, 1, 10), {"EUR": 0.99})
+
+        result = await convert_currency_historical(100, "usd", "eur", "2024-01-03")
+        self.assertAlmostEqual(result["converted_amount"], 90.0)
+        self.assertEqual(result["rate_date"], "2024-01-01")
+
+        result = await get_rate_trend("USD", "EUR", "2024-01-01", "2024-01-31")
+        self.assertAlmostEqual(result["change_pct"], 10.0)
+
+        self.assertIn("error", await convert_currency_historical(1, "USD", "EUR", "not a date"))
+        self.assertIn("error", await convert_currency_historical(1, "USD", "EUR", "1990-01-01"))
+        self.assertIn("error", await get_rate_trend("USD", "EUR", "2024-02-01", "2024-01-01"))
+
+        # Codes name files in the store directory, so only three letters are accepted
+        for code in ("../../etc/passwd", "EU", "E1R", "EURO", "USD\n"):
+            result = await convert_currency_historical(1, "USD", code, "2024-01-03")
+            self.assertIn("Invalid currency code", result["error"])
+            self.assertIn("error", await get_rate_trend(code, "EUR", "2024-01-01", "2024-01-31"))
+        for code in ("../USD", "USD\n"):
+            with self.assertRaises(ValueError):
+                self.store.column(code)
+
+# Function to convert async tests to sync for unittest
+def sync_test(coro):
+    def wrapper(*args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+# Apply the decorator to all async test methods
+for attr in dir(TestRateStore):
+    if attr.startswith('test_') and asyncio.iscoroutinefunction(getattr(TestRateStore, attr)):
+        setattr(TestRateStore, attr, sync_test(getattr(TestRateStore, attr)))
+
+if __name__ == "__main__":
+    unittest.main()
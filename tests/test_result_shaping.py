@@ -0,0 +1,71 @@
+import unittest
+import json
+from services.result_shaping import shape_for_llm, estimate_tokens
+
+WEATHER = {
+    "location": "Paris, FR",
+    "temperature": "12.3°C",
+    "feels_like": "-1.5°C",
+    "description": "clear sky",
+    "humidity": "60%",
+    "wind_speed": "3.1 m/s",
+    "timestamp": 1625076000
+}
+
+class TestResultShaping(unittest.TestCase):
+    """Test cases for compact tool results sent to the LLM"""
+
+    def test_no_view_keeps_result(self):
+        """Test that tools without an LLM view are sent unchanged"""
+        self.assertEqual(json.loads(shape_for_llm(WEATHER, None)), WEATHER)
+
+    def test_fields_numbers_and_rename(self):
+        """Test field selection, unit stripping and key abbreviation"""
+        view = {
+            "fields": ["location", "temperature", "feels_like", "humidity", "wind_speed"],
+            "parse_numbers": True,
+            "rename": {"temperature": "temp_c", "feels_like": "feels_c", "wind_speed": "wind_m_s"}
+        }
+        shaped = json.loads(shape_for_llm(WEATHER, view))
+        self.assertEqual(shaped, {"location": "Paris, FR", "temp_c": 12.3, "feels_c": -1.5, "humidity": 60, "wind_m_s": 3.1})
+        # The tool's own result is left as it was
+        self.assertEqual(WEATHER["temperature"], "12.3°C")
+
+    def test_rounding(self):
+        """Test that floats are rounded at any depth"""
+        result = {"rate": 0.912345, "history": [{"rate": 1.23456}]}
+        self.assertEqual(json.loads(shape_for_llm(result, {"round": 2})), {"rate": 0.91, "history": [{"rate": 1.23}]})
+
+    def test_errors_pass_through(self):
+        """Test that error results are never trimmed"""
+        error = {"error": "Location not found", "details": "x"}
+        self.assertEqual(json.loads(shape_for_llm(error, {"fields": ["location"]})), error)
+
+    def test_size_cap_drops_records_with_marker(self):
+        """Test that long tables lose rows, not columns, and say how many"""
+        result = {
+            "columns": ["city", "temp_c"],
+            "rows": [[f"City {index}", 20.5] for index in range(100)],
+            "errors": []
+        }
+        text = shape_for_llm(result, {"max_chars": 300})
+        self.assertLessEqual(len(text), 300)
+        shaped = json.loads(text)
+        self.assertEqual(shaped["columns"], ["city", "temp_c"])
+        self.assertTrue(shaped["rows"][-1].startswith("...[truncated"))
+        kept = len(shaped["rows"]) - 1
+        self.assertIn(f"{100 - kept} items", shaped["rows"][-1])
+        self.assertEqual(len(result["rows"]), 100)
+
+    def test_size_cap_cuts_text_last(self):
+        """Test that results without records are cut with a marker"""
+        text = shape_for_llm({"text": "x" * 500}, {"max_chars": 100})
+        self.assertEqual(len(text), 100)
+        self.assertIn("...[truncated", text)
+
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("abcdefgh"), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+from unittest.mock import patch
+import importlib
+import json
+import sys
+from datetime import datetime, timezone
+from decimal import Decimal
+from pydantic import BaseModel
+import services.serialization as serialization
+from services.serialization import dumps, dumps_bytes, loads, FastJSONResponse
+
+class FakeNumpyScalar:
+    """Looks like a numpy scalar to the encoder"""
+    dtype = "float64"
+
+    def __init__(self, value):
+        self.value = value
+
+    def tolist(self):
+        return self.value
+
+class Point(BaseModel):
+    x: int
+    y: int
+
+SAMPLE = {
+    "when": datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc),
+    "price": Decimal("1.25"),
+    "reading": FakeNumpyScalar(3.5),
+    "point": Point(x=1, y=2),
+    "tags": ("a", "b"),
+    "text": "Zürich"
+}
+
+EXPECTED = {
+    "when": "2024-05-01T12:30:00+00:00",
+    "price": 1.25,
+    "reading": 3.5,
+    "point": {"x": 1, "y": 2},
+    "tags": ["a", "b"],
+    "text": "Zürich"
+}
+
+class TestSerialization(unittest.TestCase):
+    """Test cases for the fast JSON encoder"""
+
+    def test_non_json_types(self):
+        """Test that tool results with datetimes, Decimals, numpy values and models serialize"""
+        self.assertEqual(json.loads(dumps(SAMPLE)), EXPECTED)
+        self.assertEqual(loads(dumps_bytes(SAMPLE)), EXPECTED)
+
+    def test_unknown_types_raise(self):
+        """Test that unsupported objects still fail like json.dumps does"""
+        with self.assertRaises(TypeError):
+            dumps({"value": object()})
+
+    def test_compact_output(self):
+        """Test that the output has no extra whitespace and keeps non-ASCII text"""
+        self.assertEqual(dumps({"a": [1, 2], "b": "é"}), '{"a":[1,2],"b":"é"}')
+
+    def test_standard_library_fallback(self):
+        """Test that the encoder works the same without orjson installed"""
+        try:
+            with patch.dict(sys.modules, {"orjson": None}):
+                fallback = importlib.reload(serialization)
+                self.assertFalse(fallback.HAS_ORJSON)
+                self.assertEqual(json.loads(fallback.dumps(SAMPLE)), EXPECTED)
+                self.assertEqual(fallback.dumps({"a": [1, 2], "b": "é"}), '{"a":[1,2],"b":"é"}')
+        finally:
+            importlib.reload(serialization)
+
+    def test_response_render(self):
+        """Test that the response class renders with the fast encoder"""
+        response = FastJSONResponse({"response": {"when": SAMPLE["when"]}})
+        self.assertEqual(json.loads(response.body), {"response": {"when": "2024-05-01T12:30:00+00:00"}})
+        self.assertEqual(response.headers["content-type"], "application/json")
+
+if __name__ == "__main__":
+    unittest.main()
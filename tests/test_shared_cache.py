@@ -0,0 +1,200 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+from services.shared_cache import CacheBackend, SQLiteCacheBackend, RespCacheBackend, RespConnection, TieredCache, create_backend, BACKOFF_MIN
+from services.http_cache import ResponseCache, CachePolicy
+from services.mcp_service import MCPServer
+from models.schema import Tool
+from tests.resp_stand_in import RespStandIn
+
+def write_from_other_process(path):
+    """Runs in a separate worker process"""
+    asyncio.run(TieredCache("tool", SQLiteCacheBackend(path)).set("rates:USD", {"EUR": 0.9}, 60))
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+class TestSharedCache(unittest.TestCase):
+    """Test cases for the two-level cache shared between workers"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "shared.sqlite3")
+        self.backends = []
+        self.print_patch = patch("builtins.print")
+        self.print_patch.start()
+
+    def tearDown(self):
+        for backend in self.backends:
+            backend.close()
+        self.print_patch.stop()
+        self.tmpdir.cleanup()
+
+    def sqlite_backend(self):
+        backend = SQLiteCacheBackend(self.path, poll_interval=0)
+        self.backends.append(backend)
+        return backend
+
+    def test_sqlite_uses_wal(self):
+        """Test that the local backend runs SQLite in WAL mode"""
+        self.sqlite_backend().set("key", b"value", 60)
+        mode = sqlite3.connect(self.path).execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    async def test_sqlite_shared_between_workers(self):
+        """Test that a value cached by one worker is an L2 hit for another"""
+        worker_a = TieredCache("tool", self.sqlite_backend())
+        worker_b = TieredCache("tool", self.sqlite_backend())
+
+        await worker_a.set("weather:paris", {"temp_c": 12.3}, 60)
+        self.assertEqual(await worker_b.get("weather:paris"), {"temp_c": 12.3})
+        self.assertIn("weather:paris", worker_b.entries)
+
+    async def test_sqlite_shared_between_processes(self):
+        """Test that a value written by another process is visible"""
+        process = multiprocessing.get_context("spawn").Process(target=write_from_other_process, args=(self.path,))
+        process.start()
+        process.join(timeout=30)
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(await TieredCache("tool", self.sqlite_backend()).get("rates:USD"), {"EUR": 0.9})
+
+    async def test_sqlite_invalidation_fan_out(self):
+        """Test that invalidating in one worker drops the other worker's L1 copy"""
+        worker_a = TieredCache("tool", self.sqlite_backend())
+        worker_b = TieredCache("tool", self.sqlite_backend())
+        await worker_a.set("key", "old", 60)
+        self.assertEqual(await worker_b.get("key"), "old")
+
+        await worker_a.invalidate("key")
+        self.assertIsNone(await worker_b.get("key"))
+
+        # Writes are fanned out too, so the other worker sees the new value
+        await worker_a.set("key", "v1", 60)
+        self.assertEqual(await worker_b.get("key"), "v1")
+        await worker_a.set("key", "v2", 60)
+        self.assertEqual(await worker_b.get("key"), "v2")
+
+    async def test_expiry_and_l1_bound(self):
+        """Test that expired values are not served and L1 stays bounded"""
+        cache = TieredCache("tool", self.sqlite_backend(), max_entries=2)
+        await cache.set("short", 1, 0.05)
+        time.sleep(0.1)
+        self.assertIsNone(await cache.get("short"))
+
+        for index in range(5):
+            await cache.set(f"key{index}", index, 60)
+        self.assertEqual(list(cache.entries), ["key3", "key4"])
+        # Evicted from L1, still in L2
+        self.assertEqual(await cache.get("key0"), 0)
+
+    async def test_resp_backend(self):
+        """Test the Redis-protocol backend against a local stand-in server"""
+        server = RespStandIn().start()
+        self.addCleanup(server.stop)
+        backend_a = RespCacheBackend(server.url)
+        backend_b = RespCacheBackend(server.url)
+        self.backends += [backend_a, backend_b]
+        worker_a = TieredCache("completion", backend_a)
+        worker_b = TieredCache("completion", backend_b)
+
+        self.assertIsNone(await worker_b.get("key"))
+        self.assertTrue(wait_for(lambda: server.subscribers.get(b"agent_ai:invalidate")))
+
+        await worker_a.set("key", {"content": "Hello"}, 60)
+        self.assertEqual(await worker_b.get("key"), {"content": "Hello"})
+
+        await worker_a.invalidate("key")
+        self.assertTrue(wait_for(lambda: not backend_b._pending.empty()))
+        self.assertIsNone(await worker_b.get("key"))
+        self.assertIn("PUBLISH", server.commands)
+
+    async def test_backend_outage_falls_back_to_l1(self):
+        """Test that an unreachable shared tier never fails a lookup"""
+        backend = RespCacheBackend("redis://127.0.0.1:1/0", timeout=0.2)
+        self.backends.append(backend)
+        cache = TieredCache("tool", backend)
+        with patch.object(RespConnection, "connect", side_effect=ConnectionRefusedError("refused"), autospec=True) as connect:
+            await cache.set("key", "value", 60)
+            self.assertEqual(await cache.get("key"), "value")
+            self.assertIsNone(await cache.get("other"))
+            # The dead server is dialed once, then skipped until the backoff ends
+            self.assertEqual(connect.call_count, 2)
+            self.assertEqual(backend._backoff, BACKOFF_MIN)
+
+            backend._retry_at = 0
+            self.assertIsNone(await cache.get("other"))
+            self.assertEqual(backend._backoff, BACKOFF_MIN * 2)
+
+    def test_backend_is_abstract(self):
+        """Test that backends must implement the storage methods"""
+        with self.assertRaises(TypeError):
+            CacheBackend()
+
+    def test_create_backend(self):
+        self.assertIsNone(create_backend(""))
+        self.assertIsInstance(create_backend("sqlite", path=self.path), SQLiteCacheBackend)
+        self.assertIsInstance(create_backend("redis", url="redis://localhost:6379/0"), RespCacheBackend)
+        with self.assertRaises(ValueError):
+            create_backend("memcached")
+
+    async def test_http_cache_shared_between_workers(self):
+        """Test that a response fetched by one worker is not fetched again by another"""
+        calls = []
+
+        async def fetch(url):
+            calls.append(url)
+            return {"rates": {"EUR": 0.9}}
+
+        policies = [CachePolicy("https://rates.example.com/*", soft_ttl=60, hard_ttl=300)]
+        worker_a = ResponseCache(policies, shared=self.sqlite_backend())
+        worker_b = ResponseCache(policies, shared=self.sqlite_backend())
+
+        url = "https://rates.example.com/latest/USD"
+        self.assertEqual(await worker_a.get(url, fetch), {"rates": {"EUR": 0.9}})
+        self.assertEqual(await worker_b.get(url, fetch), {"rates": {"EUR": 0.9}})
+        self.assertEqual(len(calls), 1)
+
+    async def test_tool_results_cached(self):
+        """Test that tools with a cache_ttl run once for the same arguments"""
+        calls = []
+
+        async def lookup(city):
+            calls.append(city)
+            return {"city": city, "temp_c": 20}
+
+        mcp_server = MCPServer()
+        mcp_server._result_cache = TieredCache("tool", self.sqlite_backend())
+        mcp_server.register_tool(Tool(name="lookup", description="Lookup", parameters={}, function=lookup, cache_ttl=60))
+
+        await mcp_server.execute_tool("lookup", {"city": "Paris"})
+        result = await mcp_server.execute_tool("lookup", {"city": "Paris"})
+        await mcp_server.execute_tool("lookup", {"city": "Rome"})
+
+        self.assertEqual(result, {"city": "Paris", "temp_c": 20})
+        self.assertEqual(calls, ["Paris", "Rome"])
+
+# Function to convert async tests to sync for unittest
+def sync_test(coro):
+    def wrapper(*args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+# Apply the decorator to all async test methods
+for attr in dir(TestSharedCache):
+    if attr.startswith('test_') and asyncio.iscoroutinefunction(getattr(TestSharedCache, attr)):
+        setattr(TestSharedCache, attr, sync_test(getattr(TestSharedCache, attr)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import sys
+from services.startup import LazyModule, StartupProfiler
+
+class TestStartup(unittest.TestCase):
+    """Test cases for lazy imports and the startup profiler"""
+
+    def test_lazy_module_imports_on_first_use(self):
+        """Test that the real module is imported only when an attribute is read"""
+        sys.modules.pop("colorsys", None)
+        lazy = LazyModule("colorsys")
+        self.assertFalse(lazy.is_loaded)
+        self.assertNotIn("colorsys", sys.modules)
+
+        self.assertEqual(lazy.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertTrue(lazy.is_loaded)
+
+    def test_lazy_module_supports_patching(self):
+        """Test that attributes can be replaced on the proxy, e.g., by unittest.mock.patch"""
+        from unittest.mock import patch
+        lazy = LazyModule("colorsys")
+        with patch.object(lazy, "rgb_to_hsv", return_value="patched"):
+            self.assertEqual(lazy.rgb_to_hsv(1, 0, 0), "patched")
+        self.assertEqual(lazy.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+
+    def test_profiler_phases_and_readiness(self):
+        """Test phase timing and readiness reporting"""
+        profiler = StartupProfiler()
+        with profiler.phase("tool_registration"):
+            pass
+        profiler.record("imports", 0.25)
+
+        report = profiler.report()
+        self.assertFalse(report["ready"])
+        self.assertIn("tool_registration", report["phases_ms"])
+        self.assertEqual(report["phases_ms"]["imports"], 250.0)
+        self.assertNotIn("time_to_ready_ms", report)
+
+        profiler.mark_ready()
+        report = profiler.report()
+        self.assertTrue(report["ready"])
+        self.assertIn("time_to_ready_ms", report)
+
+    def test_profiler_records_failed_phase(self):
+        """Test that a phase is timed even when it raises"""
+        profiler = StartupProfiler()
+        with self.assertRaises(RuntimeError):
+            with profiler.phase("model_warmup"):
+                raise RuntimeError("backend down")
+        self.assertIn("model_warmup", profiler.phases)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import unittest
+import unittest.mock
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from services.tool_discovery import scan_module_source, build_manifest, ManifestError
+from services.mcp_service import MCPServer
+
+TOOL_SOURCE = '''
+from models.schema import Tool
+
+async def shout(text: str):
+    return {"result": text.upper()}
+
+def register_shout_tool(mcp_server):
+    shout_tool = Tool(
+        name="shout_INDEX",
+        description="Upper-case some text",
+        parameters={"type": "object", "properties": {"text": {"type": "string"}}, "required": ["text"]},
+        function=shout
+    )
+    unused_tool = Tool(name="unused_INDEX", description="Never registered", parameters={}, function=shout)
+    mcp_server.register_tool(shout_tool)
+'''
+
+DYNAMIC_SOURCE = '''
+from models.schema import Tool
+
+def make_schema():
+    return {"type": "object", "properties": {}}
+
+async def ping():
+    return {"result": "pong"}
+
+def register_ping_tool(mcp_server):
+    mcp_server.register_tool(Tool(name="ping", description="Ping", parameters=make_schema(), function=ping))
+'''
+
+class TestToolDiscovery(unittest.TestCase):
+    """Test cases for manifest-driven tool discovery"""
+
+    def setUp(self):
+        """Create a temporary tools package on the import path"""
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.package_name = f"discovered_tools_{id(self)}"
+        self.package_dir = os.path.join(self.tmpdir.name, self.package_name)
+        os.makedirs(self.package_dir)
+        open(os.path.join(self.package_dir, "__init__.py"), "w").close()
+        self.cache_path = os.path.join(self.tmpdir.name, "cache", "manifest.json")
+        sys.path.insert(0, self.tmpdir.name)
+
+    def tearDown(self):
+        sys.path.remove(self.tmpdir.name)
+        for name in list(sys.modules):
+            if name.startswith(self.package_name):
+                del sys.modules[name]
+        self.tmpdir.cleanup()
+
+    def write_module(self, name, source):
+        with open(os.path.join(self.package_dir, f"{name}.py"), "w") as module_file:
+            module_file.write(source)
+
+    def test_scan_only_registered_tools(self):
+        """Test that only tools passed to register_tool are described"""
+        entries = scan_module_source(TOOL_SOURCE.replace("INDEX", str(0)), "pkg.shout")
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]["name"], "shout_0")
+        self.assertEqual(entries[0]["module"], "pkg.shout")
+        self.assertEqual(entries[0]["function_name"], "shout")
+        self.assertEqual(entries[0]["parameters"]["required"], ["text"])
+
+    def test_scan_rejects_non_literal_definitions(self):
+        """Test that computed tool definitions cannot be described statically"""
+        with self.assertRaises(ManifestError):
+            scan_module_source(DYNAMIC_SOURCE, "pkg.ping")
+
+    def test_scan_repository_tools(self):
+        """Test that the bundled tools can be described without importing them"""
+        tools_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools")
+        manifest = build_manifest(tools_dir, "tools")
+        names = [tool["name"] for module in manifest["modules"].values() for tool in module["tools"]]
+        self.assertEqual(sorted(names), [
+            "calculate", "convert_currency", "convert_currency_historical", "get_rate_trend",
+            "get_time", "get_weather", "get_weather_batch"
+        ])
+        self.assertFalse(any(module["eager"] for module in manifest["modules"].values()))
+
+    def test_manifest_cache_reuse_and_invalidation(self):
+        """Test that unchanged modules come from the cache and changed ones are rescanned"""
+        self.write_module("shout", TOOL_SOURCE.replace("INDEX", str(1)))
+        first = build_manifest(self.package_dir, self.package_name, self.cache_path)
+        self.assertTrue(os.path.exists(self.cache_path))
+
+        with unittest.mock.patch("services.tool_discovery.scan_module_source") as mock_scan:
+            second = build_manifest(self.package_dir, self.package_name, self.cache_path)
+            mock_scan.assert_not_called()
+        self.assertEqual(first, second)
+
+        # A modified module is rescanned
+        self.write_module("shout", TOOL_SOURCE.replace("INDEX", str(2)))
+        os.utime(os.path.join(self.package_dir, "shout.py"), ns=(time.time_ns(), time.time_ns() + 10**9))
+        third = build_manifest(self.package_dir, self.package_name, self.cache_path)
+        self.assertEqual(third["modules"][f"{self.package_name}.shout"]["tools"][0]["name"], "shout_2")
+
+    async def test_lazy_import_on_first_call(self):
+        """Test that tool modules are imported only when the tool first runs"""
+        self.write_module("shout", TOOL_SOURCE.replace("INDEX", str(3)))
+        mcp_server = MCPServer()
+        mcp_server.load_tools_from_modules(self.package_dir, self.package_name)
+
+        module_name = f"{self.package_name}.shout"
+        self.assertIn("shout_3", mcp_server.tools)
+        self.assertNotIn(module_name, sys.modules)
+
+        result = await mcp_server.execute_tool("shout_3", {"text": "hi"})
+        self.assertEqual(result, {"result": "HI"})
+        self.assertIn(module_name, sys.modules)
+
+    def test_eager_fallback(self):
+        """Test that modules that cannot be described are imported and registered at startup"""
+        self.write_module("ping", DYNAMIC_SOURCE)
+        mcp_server = MCPServer()
+        mcp_server.load_tools_from_modules(self.package_dir, self.package_name)
+        self.assertIn("ping", mcp_server.tools)
+        self.assertIsNotNone(mcp_server.tools["ping"].function)
+
+    def test_startup_does_not_import_hundreds_of_tools(self):
+        """Test that registering many tools imports none of their modules"""
+        for index in range(200):
+            self.write_module(f"tool_{index}", TOOL_SOURCE.replace("INDEX", str(index)))
+        build_manifest(self.package_dir, self.package_name, self.cache_path)
+
+        mcp_server = MCPServer()
+        with unittest.mock.patch("builtins.print"):
+            mcp_server.load_tools_from_modules(self.package_dir, self.package_name)
+
+        self.assertEqual(len(mcp_server.tools), 200)
+        self.assertFalse([name for name in sys.modules if name.startswith(f"{self.package_name}.")])
+
+# Function to convert async tests to sync for unittest
+def sync_test(coro):
+    def wrapper(*args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+# Apply the decorator to all async test methods
+for attr in dir(TestToolDiscovery):
+    if attr.startswith('test_') and asyncio.iscoroutinefunction(getattr(TestToolDiscovery, attr)):
+        setattr(TestToolDiscovery, attr, sync_test(getattr(TestToolDiscovery, attr)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import os
+import sys
+import tempfile
+from services.mcp_service import MCPServer
+from models.schema import Tool
+
+MODULE_SOURCE = '''
+async def greet(name: str):
+    return {"result": "GREETING " + name}
+'''
+
+def tool(name, function=None, **options):
+    return Tool(name=name, description=f"{name} tool", parameters={"type": "object", "properties": {}}, function=function, **options)
+
+async def first(**arguments):
+    return {"result": "first"}
+
+async def second(**arguments):
+    return {"result": "second"}
+
+class TestToolRegistry(unittest.TestCase):
+    """Test cases for copy-on-write registry snapshots and hot reload"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.mcp_server = MCPServer()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.package_name = f"reloaded_tools_{id(self)}"
+        self.package_dir = os.path.join(self.tmpdir.name, self.package_name)
+        os.makedirs(self.package_dir)
+        open(os.path.join(self.package_dir, "__init__.py"), "w").close()
+        sys.path.insert(0, self.tmpdir.name)
+        for patcher in (patch("builtins.print"), patch("config.TOOL_MANIFEST_PATH", "")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        """Clean up test fixtures"""
+        sys.path.remove(self.tmpdir.name)
+        for name in list(sys.modules):
+            if name.startswith(self.package_name):
+                del sys.modules[name]
+        self.tmpdir.cleanup()
+
+    def write_module(self, source):
+        with open(os.path.join(self.package_dir, "greeting.py"), "w") as handle:
+            handle.write(source)
+
+    async def test_requests_keep_their_snapshot(self):
+        """Test that a pinned request keeps reading the registry it started with"""
+        self.mcp_server.update(register=[tool("echo", first), tool("old", first)])
+        before = self.mcp_server.latest
+
+        with self.mcp_server.pinned() as snapshot:
+            self.assertIs(snapshot, before)
+            self.mcp_server.update(register=[tool("echo", second), tool("new", second)], unregister=["old"])
+
+            # Reads in the block, and in tasks it starts, still see the old registry
+            self.assertEqual(sorted(self.mcp_server.tools), ["echo", "old"])
+            self.assertEqual(await self.mcp_server.execute_tool("echo", {}), {"result": "first"})
+            self.assertEqual(await asyncio.create_task(self.mcp_server.execute_tool("old", {})), {"result": "first"})
+            self.assertIs(self.mcp_server.get_tools_for_llm(), before.llm_tools)
+            with self.mcp_server.pinned() as nested:
+                self.assertIs(nested, before)
+
+        # New requests see the new one
+        with self.mcp_server.pinned():
+            self.assertEqual(sorted(self.mcp_server.tools), ["echo", "new"])
+            self.assertEqual(await self.mcp_server.execute_tool("echo", {}), {"result": "second"})
+            with self.assertRaises(ValueError):
+                await self.mcp_server.execute_tool("old", {})
+        self.assertEqual(self.mcp_server.latest.version, before.version + 1)
+
+    def test_snapshots_are_immutable(self):
+        """Test that published snapshots cannot be changed in place"""
+        self.mcp_server.register_tool(tool("echo", first))
+        snapshot = self.mcp_server.latest
+        with self.assertRaises(TypeError):
+            snapshot.tools["other"] = snapshot.tools["echo"]
+        self.assertTrue(self.mcp_server.unregister_tool("echo"))
+        self.assertFalse(self.mcp_server.unregister_tool("echo"))
+        self.assertIn("echo", snapshot.tools)
+        # Other registries' pins do not apply
+        with MCPServer().pinned():
+            self.assertNotIn("echo", self.mcp_server.tools)
+
+    async def test_hot_reload_of_tool_modules(self):
+        """Test reloading changed tool code, replacing tools of the previous load only"""
+        self.write_module(MODULE_SOURCE + '''
+from models.schema import Tool
+
+def register_greeting_tools(mcp_server):
+    mcp_server.register_tool(Tool(name="greet", description="Greet", parameters={}, function=greet))
+    mcp_server.register_tool(Tool(name="wave", description="Wave", parameters={}, function=greet))
+''')
+        self.mcp_server.register_tool(tool("manual", first))
+        self.mcp_server.load_tools_from_modules(self.package_dir, self.package_name)
+        self.assertEqual(await self.mcp_server.execute_tool("greet", {"name": "Ada"}), {"result": "GREETING Ada"})
+        version = self.mcp_server.latest.version
+
+        self.write_module(MODULE_SOURCE.replace("GREETING ", "Hello, ") + '''
+from models.schema import Tool
+
+def register_greeting_tools(mcp_server):
+    mcp_server.register_tool(Tool(name="greet", description="Greet", parameters={}, function=greet))
+''')
+        snapshot = self.mcp_server.load_tools_from_modules(self.package_dir, self.package_name, reload_modules=True)
+        self.assertEqual(snapshot.version, version + 1)
+        self.assertEqual(sorted(snapshot.tools), ["greet", "manual"])
+        self.assertEqual(await self.mcp_server.execute_tool("greet", {"name": "Ada"}), {"result": "Hello, Ada"})
+
+    async def test_import_tool(self):
+        """Test resolving the function of a tool added at runtime"""
+        self.write_module(MODULE_SOURCE)
+        patcher = patch("config.TOOL_IMPORT_PACKAGES", f"tools, {self.package_name}")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        entry = self.mcp_server.import_tool(tool("greet", module=f"{self.package_name}.greeting", function_name="greet"))
+        self.mcp_server.register_tool(entry)
+        self.assertEqual(await self.mcp_server.execute_tool("greet", {"name": "Bo"}), {"result": "GREETING Bo"})
+
+        with self.assertRaises(ValueError):
+            self.mcp_server.import_tool(tool("missing", module=f"{self.package_name}.greeting", function_name="nope"))
+        with self.assertRaises(ImportError):
+            self.mcp_server.import_tool(tool("missing", module=f"{self.package_name}.absent", function_name="greet"))
+
+    def test_import_tool_is_limited_to_tool_packages(self):
+        """Test that only functions of the allowed packages can back a runtime tool"""
+        self.write_module(MODULE_SOURCE + "from os import system\n")
+        with patch("services.mcp_service.importlib") as importlib:
+            for module in ("os", "subprocess", "toolsx.evil", self.package_name):
+                with self.assertRaisesRegex(ValueError, "not in an allowed tool package"):
+                    self.mcp_server.import_tool(tool("shell", module=module, function_name="system"), reload_module=True)
+            importlib.import_module.assert_not_called()
+            importlib.reload.assert_not_called()
+
+        with patch("config.TOOL_IMPORT_PACKAGES", self.package_name):
+            with self.assertRaisesRegex(ValueError, "not defined in an allowed tool package"):
+                self.mcp_server.import_tool(tool("shell", module=f"{self.package_name}.greeting", function_name="system"))
+        # Bundled tools stay importable by default
+        entry = self.mcp_server.import_tool(tool("calc", module="tools.calculator", function_name="calculate"))
+        self.assertTrue(callable(entry.function))
+
+# Function to convert async tests to sync for unittest
+def sync_test(coro):
+    def wrapper(*args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+# Apply the decorator to all async test methods
+for attr in dir(TestToolRegistry):
+    if attr.startswith('test_') and asyncio.iscoroutinefunction(getattr(TestToolRegistry, attr)):
+        setattr(TestToolRegistry, attr, sync_test(getattr(TestToolRegistry, attr)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import unittest
+from unittest.mock import patch
+import asyncio
+import json
+import tracemalloc
+from models.schema import Tool
+from services.llm_service import run_conversation
+from services.mcp_service import MCPServer
+from services.tool_streaming import FinalResult, ResultAggregator
+
+PARAMETERS = {"type": "object", "properties": {"query": {"type": "string"}}, "required": ["query"]}
+
+class TestToolStreaming(unittest.TestCase):
+    """Test cases for tools that stream their output"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.mcp_server = MCPServer()
+        self.closed = []
+
+        async def search(query):
+            try:
+                for index in range(3):
+                    await asyncio.sleep(0)
+                    yield {"match": f"{query} {index}"}
+            finally:
+                self.closed.append(query)
+
+        async def report(query):
+            yield "Collecting data... "
+            yield "done."
+            yield FinalResult({"report": f"Report on {query}"})
+
+        with patch("builtins.print"):
+            self.mcp_server.register_tool(Tool(name="search", description="Search", parameters=PARAMETERS, function=search))
+            self.mcp_server.register_tool(Tool(name="report", description="Report", parameters=PARAMETERS, function=report))
+
+    async def test_stream_chunks_then_result(self):
+        """Test that chunks arrive through the iterator and the aggregate is the result"""
+        run = self.mcp_server.stream_tool("search", {"query": "cats"})
+        chunks = [chunk async for chunk in run]
+
+        self.assertEqual(chunks, [{"match": "cats 0"}, {"match": "cats 1"}, {"match": "cats 2"}])
+        self.assertEqual(run.result, {"items": chunks, "chunks": 3})
+        self.assertEqual(self.closed, ["cats"])
+
+    async def test_final_result_and_plain_tools(self):
+        """Test that a yielded FinalResult replaces the aggregate and plain tools stream nothing"""
+        received = []
+
+        async def on_chunk(chunk):
+            received.append(chunk)
+
+        result = await self.mcp_server.execute_tool("report", {"query": "sales"}, on_chunk=on_chunk)
+        self.assertEqual(result, {"report": "Report on sales"})
+        self.assertEqual(received, ["Collecting data... ", "done."])
+
+        with patch("builtins.print"):
+            self.mcp_server.register_tool(Tool(name="plain", description="Plain", parameters=PARAMETERS, function=lambda query: {"q": query}))
+        run = self.mcp_server.stream_tool("plain", {"query": "x"})
+        self.assertEqual([chunk async for chunk in run], [])
+        self.assertEqual(run.result, {"q": "x"})
+
+    async def test_stopping_early_closes_the_tool(self):
+        """Test that a consumer that stops iterating runs the tool's cleanup"""
+        run = self.mcp_server.stream_tool("search", {"query": "dogs"})
+        iterator = run.__aiter__()
+        self.assertEqual(await iterator.__anext__(), {"match": "dogs 0"})
+        await iterator.aclose()
+        self.assertEqual(self.closed, ["dogs"])
+        self.assertFalse(run.done)
+
+    async def test_errors_and_cache(self):
+        """Test that streaming errors are wrapped and aggregated results cached"""
+        async def broken(query):
+            yield "partial"
+            raise RuntimeError("backend gone")
+
+        calls = []
+
+        async def cached(query):
+            calls.append(query)
+            yield "result"
+
+        with patch("builtins.print"):
+            self.mcp_server.register_tool(Tool(name="broken", description="Broken", parameters=PARAMETERS, function=broken))
+            self.mcp_server.register_tool(Tool(name="cached", description="Cached", parameters=PARAMETERS, function=cached, cache_ttl=60))
+
+        with self.assertRaisesRegex(Exception, "Error executing tool 'broken': backend gone"):
+            await self.mcp_server.execute_tool("broken", {"query": "x"})
+
+        first = await self.mcp_server.execute_tool("cached", {"query": "x"})
+        second = await self.mcp_server.execute_tool("cached", {"query": "x"})
+        self.assertEqual(first, {"text": "result", "chunks": 1})
+        self.assertEqual(second, first)
+        self.assertEqual(calls, ["x"])
+
+    def test_aggregate_is_bounded(self):
+        """Test that text and items beyond the caps are counted, not kept"""
+        aggregator = ResultAggregator(max_chars=10, max_items=2)
+        for chunk in ["abcdef", "ghijkl", "mnop", {"a": 1}, {"b": 2}, {"c": 3}]:
+            aggregator.add(chunk)
+        result = aggregator.result()
+
+        self.assertEqual(result["text"], "abcdefghij...[truncated 6 chars]")
+        self.assertEqual(result["items"], [{"a": 1}, {"b": 2}, "...[truncated 1 items]"])
+        self.assertEqual(result["chunks"], 6)
+        self.assertTrue(result["truncated"])
+
+    async def test_large_output_memory_bounded(self):
+        """Test that a tool streaming megabytes keeps only the capped result in memory"""
+        async def huge(query):
+            for _ in range(5000):
+                yield "x" * 1024
+
+        with patch("builtins.print"):
+            self.mcp_server.register_tool(Tool(name="huge", description="Huge", parameters=PARAMETERS, function=huge))
+
+        tracemalloc.start()
+        try:
+            result = await self.mcp_server.execute_tool("huge", {"query": "x"}, on_chunk=None)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(result["chunks"], 5000)
+        self.assertTrue(result["truncated"])
+        # About 5 MB was streamed; the default cap keeps 16 KiB of text
+        self.assertLess(peak, 256 * 1024)
+
+    @patch('services.llm_service.complete_round')
+    async def test_conversation_forwards_chunks(self, mock_complete_round):
+        """Test that clients get each chunk while the LLM only sees the aggregated result"""
+        tool_call = {"id": "call_1", "type": "function", "function": {"name": "search", "arguments": json.dumps({"query": "cats"})}}
+        mock_complete_round.side_effect = [
+            ({"role": "assistant", "content": None, "tool_calls": [tool_call]}, "backend"),
+            ({"role": "assistant", "content": "Found three."}, "backend")
+        ]
+        events = []
+
+        async def on_event(event):
+            events.append(event)
+
+        history = [{"role": "user", "content": "Search cats"}]
+        result = await run_conversation(history, self.mcp_server, skip_summary=False, on_event=on_event)
+
+        self.assertEqual([event["type"] for event in events], ["tool_call", "tool_chunk", "tool_chunk", "tool_chunk", "tool_result"])
+        self.assertEqual(events[1], {"type": "tool_chunk", "name": "search", "chunk": {"match": "cats 0"}})
+        self.assertEqual(json.loads(history[2]["content"])["chunks"], 3)
+        self.assertEqual(result["tool_calls"][0]["result"]["items"][2], {"match": "cats 2"})
+
+# Function to convert async tests to sync for unittest
+def sync_test(coro):
+    def wrapper(*args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+# Apply the decorator to all async test methods
+for attr in dir(TestToolStreaming):
+    if attr.startswith('test_') and asyncio.iscoroutinefunction(getattr(TestToolStreaming, attr)):
+        setattr(TestToolStreaming, attr, sync_test(getattr(TestToolStreaming, attr)))
+
+if __name__ == "__main__":
+    unittest.main()
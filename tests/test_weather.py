@@ -2,10 +2,19 @@ import unittest
 from unittest.mock import patch, MagicMock
 import json
 import asyncio
-from tools.weather import get_weather, get_geo_location
+import threading
+import time
+import requests
+from tools.weather import get_weather, get_geo_location, get_weather_batch, register_weather_tool
+from services.mcp_service import MCPServer
+from services.upstream import upstream
 
 class TestWeatherTool(unittest.TestCase):
     """Test cases for weather tools"""
+
+    def setUp(self):
+        """Start every test without cached upstream responses"""
+        upstream.reset()
     
     @patch('tools.weather.requests.get')
     async def test_get_geo_location_success(self, mock_get):
@@ -103,6 +112,125 @@ class TestWeatherTool(unittest.TestCase):
         # Should have error from geo location
         self.assertIn("error", result)
 
+class TestWeatherBatchTool(unittest.TestCase):
+    """Test cases for the multi-city weather tool"""
+
+    CITIES = {
+        "paris": {"lat": 48.85, "lon": 2.35, "country": "FR", "temp": 18.2},
+        "berlin": {"lat": 52.52, "lon": 13.4, "country": "DE", "temp": 12.5},
+        "rome": {"lat": 41.9, "lon": 12.5, "country": "IT", "temp": 24.1}
+    }
+
+    def setUp(self):
+        """Serve geocoding and weather responses from a fake upstream"""
+        upstream.reset()
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.urls = []
+
+    def fake_get(self, url, timeout):
+        with self.lock:
+            self.urls.append(url)
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(0.05)
+            response = MagicMock()
+            response.status_code = 200
+            if "/geo/" in url:
+                name = url.split("q=")[1].split("&")[0].split(",")[0]
+                city = self.CITIES.get(name.lower())
+                response.json.return_value = [dict(city, name=name)] if city else []
+            else:
+                lat = float(url.split("lat=")[1].split("&")[0])
+                name, city = next((name, city) for name, city in self.CITIES.items() if city["lat"] == lat)
+                if name == "rome" and getattr(self, "rome_down", False):
+                    raise requests.exceptions.ConnectionError(f"down: {url}")
+                response.json.return_value = {
+                    "name": name.title(),
+                    "sys": {"country": city["country"]},
+                    "main": {"temp": city["temp"], "feels_like": city["temp"] - 1, "humidity": 60},
+                    "weather": [{"description": "clear sky"}],
+                    "wind": {"speed": 3.1},
+                    "dt": 1625076000
+                }
+            return response
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    @patch('services.upstream.requests.get')
+    async def test_get_weather_batch_table(self, mock_get):
+        mock_get.side_effect = self.fake_get
+        
+        result = await get_weather_batch(["Paris", "Berlin", "Rome", "paris"])
+        
+        self.assertEqual(result["columns"][:3], ["city", "location", "temp_c"])
+        self.assertEqual([row[0] for row in result["rows"]], ["Paris", "Berlin", "Rome"])
+        self.assertEqual(result["rows"][1][2], 12.5)
+        self.assertEqual(result["errors"], [])
+        # Duplicates are looked up once: three geocodes and three weather calls
+        self.assertEqual(len(self.urls), 6)
+
+    @patch('tools.weather.config.WEATHER_BATCH_CONCURRENCY', 2)
+    @patch('services.upstream.requests.get')
+    async def test_get_weather_batch_bounded_concurrency(self, mock_get):
+        mock_get.side_effect = self.fake_get
+        
+        started = time.perf_counter()
+        await get_weather_batch(["Paris", "Berlin", "Rome"])
+        elapsed = time.perf_counter() - started
+        
+        self.assertEqual(self.peak, 2)
+        # Six requests of 50 ms, two at a time, finish well before running them in sequence would
+        self.assertLess(elapsed, 0.3)
+
+    @patch('services.upstream.requests.get')
+    async def test_get_weather_batch_partial_errors(self, mock_get):
+        self.rome_down = True
+        mock_get.side_effect = self.fake_get
+        
+        with patch('services.upstream.random.uniform', return_value=0):
+            result = await get_weather_batch(["Paris", "Atlantis", "Rome"])
+        
+        self.assertEqual([row[0] for row in result["rows"]], ["Paris"])
+        self.assertEqual([error["city"] for error in result["errors"]], ["Atlantis", "Rome"])
+
+    @patch('tools.weather.config.WEATHER_API_KEY', 'SECRET123')
+    @patch('services.upstream.requests.get')
+    async def test_get_weather_batch_errors_hide_api_key(self, mock_get):
+        self.rome_down = True
+        mock_get.side_effect = self.fake_get
+        mcp_server = MCPServer()
+        register_weather_tool(mcp_server)
+        
+        with patch('services.upstream.random.uniform', return_value=0), patch('builtins.print'):
+            result = await mcp_server.execute_tool("get_weather_batch", {"cities": ["Paris", "Rome"]})
+        
+        self.assertEqual(result["errors"][0]["city"], "Rome")
+        self.assertIn("appid=***", result["errors"][0]["error"])
+        self.assertNotIn("SECRET123", json.dumps(result))
+        # Results listing failed lookups are not cached
+        self.assertIsNone(await mcp_server.result_cache.get('get_weather_batch:{"cities": ["Paris", "Rome"]}'))
+
+    async def test_get_weather_batch_limits(self):
+        self.assertIn("error", await get_weather_batch([" ", ""]))
+        with patch('tools.weather.config.WEATHER_BATCH_MAX_CITIES', 2):
+            self.assertIn("error", await get_weather_batch(["Paris", "Berlin", "Rome"]))
+
+# Function to convert async tests to sync for unittest
+def sync_test(coro):
+    def wrapper(*args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(coro(*args, **kwargs))
+    return wrapper
+
+# Apply the decorator to the async batch tests
+for attr in dir(TestWeatherBatchTool):
+    if attr.startswith('test_') and asyncio.iscoroutinefunction(getattr(TestWeatherBatchTool, attr)):
+        setattr(TestWeatherBatchTool, attr, sync_test(getattr(TestWeatherBatchTool, attr)))
+
 # Allow running the tests directly
 if __name__ == "__main__":
     unittest.main()
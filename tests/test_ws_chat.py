@@ -0,0 +1,153 @@
+import unittest
+import asyncio
+import json
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from services.ws_chat import ChatConnection, trim_history, CLOSE_GOING_AWAY, CLOSE_MESSAGE_TOO_BIG, CLOSE_TRY_AGAIN_LATER
+
+class TestWebSocketChat(unittest.TestCase):
+    """Test cases for conversations held on a WebSocket"""
+
+    def setUp(self):
+        """Set up test fixtures"""
+        self.histories = []
+        self.release = None
+        self.options = {}
+        self.max_connections = 100
+        app = FastAPI()
+
+        @app.websocket("/ws/chat")
+        async def websocket_chat(websocket: WebSocket):
+            await websocket.accept()
+            if not ChatConnection.reserve(self.max_connections):
+                await websocket.close(code=CLOSE_TRY_AGAIN_LATER)
+                return
+            try:
+                await ChatConnection(websocket, self.run_turn, system_prompt="Be brief.", **self.options).serve()
+            finally:
+                ChatConnection.release()
+
+        self.client = TestClient(app)
+
+    async def run_turn(self, messages, skip_summary, on_event):
+        """Stand-in for run_conversation that streams a tool call and two tokens"""
+        self.histories.append([dict(message) for message in messages])
+        if self.release is not None:
+            await asyncio.sleep(10)
+        await on_event({"type": "tool_call", "name": "get_time", "arguments": {"timezone": "UTC"}})
+        await on_event({"type": "tool_result", "name": "get_time", "result": {"time": "12:00"}})
+        answer = f"Answer {len(self.histories)}"
+        for token in answer.split(" "):
+            await on_event({"type": "token", "content": token})
+        messages.append({"role": "assistant", "content": answer})
+        return {"role": "assistant", "content": answer}
+
+    def receive_until(self, websocket, kind):
+        events = []
+        while True:
+            event = json.loads(websocket.receive_text())
+            events.append(event)
+            if event["type"] == kind:
+                return events
+
+    def test_streams_events_and_keeps_history(self):
+        """Test that a turn streams its events and later turns send only the new message"""
+        with self.client.websocket_connect("/ws/chat") as websocket:
+            websocket.send_text(json.dumps({"type": "message", "content": "What time is it?"}))
+            events = self.receive_until(websocket, "done")
+            self.assertEqual([event["type"] for event in events], ["tool_call", "tool_result", "token", "token", "done"])
+            self.assertEqual(events[-1]["response"]["content"], "Answer 1")
+
+            websocket.send_text(json.dumps({"type": "message", "content": "And now?"}))
+            self.receive_until(websocket, "done")
+
+        self.assertEqual([m["role"] for m in self.histories[1]], ["system", "user", "assistant", "user"])
+        self.assertEqual(self.histories[1][0]["content"], "Be brief.")
+
+    def test_cancel_turn(self):
+        """Test that a running turn can be cancelled and leaves no trace in the history"""
+        self.release = True
+        with self.client.websocket_connect("/ws/chat") as websocket:
+            websocket.send_text(json.dumps({"type": "message", "content": "Slow question"}))
+            websocket.send_text(json.dumps({"type": "message", "content": "Too early"}))
+            self.assertIn("in progress", self.receive_until(websocket, "error")[-1]["detail"])
+            websocket.send_text(json.dumps({"type": "cancel"}))
+            self.receive_until(websocket, "cancelled")
+
+            self.release = None
+            websocket.send_text(json.dumps({"type": "message", "content": "Quick question"}))
+            self.receive_until(websocket, "done")
+
+        self.assertEqual([m["content"] for m in self.histories[-1]], ["Be brief.", "Quick question"])
+
+    def test_heartbeat_closes_idle_connection(self):
+        """Test that a silent client is pinged and then disconnected"""
+        self.options = {"heartbeat_interval": 0.05, "max_missed_heartbeats": 2}
+        with self.client.websocket_connect("/ws/chat") as websocket:
+            self.assertEqual(json.loads(websocket.receive_text()), {"type": "ping"})
+            websocket.send_text(json.dumps({"type": "pong"}))
+            self.assertEqual(json.loads(websocket.receive_text()), {"type": "ping"})
+            self.assertEqual(json.loads(websocket.receive_text()), {"type": "ping"})
+            with self.assertRaises(WebSocketDisconnect) as context:
+                websocket.receive_text()
+        self.assertEqual(context.exception.code, CLOSE_GOING_AWAY)
+        self.assertEqual(ChatConnection.active, 0)
+
+    def test_message_size_limit(self):
+        """Test that oversized client messages close the connection"""
+        self.options = {"max_message_bytes": 100}
+        with self.client.websocket_connect("/ws/chat") as websocket:
+            websocket.send_text(json.dumps({"type": "ping"}))
+            self.assertEqual(json.loads(websocket.receive_text()), {"type": "pong"})
+            websocket.send_text(json.dumps({"type": "message", "content": "x" * 200}))
+            with self.assertRaises(WebSocketDisconnect) as context:
+                websocket.receive_text()
+        self.assertEqual(context.exception.code, CLOSE_MESSAGE_TOO_BIG)
+
+    def test_connection_limit(self):
+        """Test that a connection over the limit is closed with 1013 and its slot is not taken"""
+        self.max_connections = 1
+        with self.client.websocket_connect("/ws/chat") as first:
+            first.send_text(json.dumps({"type": "ping"}))
+            first.receive_text()
+            self.assertEqual(ChatConnection.active, 1)
+            with self.client.websocket_connect("/ws/chat") as second:
+                with self.assertRaises(WebSocketDisconnect) as context:
+                    second.receive_text()
+            self.assertEqual(context.exception.code, CLOSE_TRY_AGAIN_LATER)
+            self.assertEqual(ChatConnection.active, 1)
+        self.assertEqual(ChatConnection.active, 0)
+
+    def test_rate_limit_and_bad_messages(self):
+        """Test that rejected messages get an error event and keep the connection open"""
+        self.options = {"check_rate": lambda: (False, 2.0)}
+        with self.client.websocket_connect("/ws/chat") as websocket:
+            websocket.send_text("not json")
+            self.assertEqual(self.receive_until(websocket, "error")[-1]["detail"], "Messages must be JSON objects")
+            websocket.send_text(json.dumps({"type": "dance"}))
+            self.receive_until(websocket, "error")
+            websocket.send_text(json.dumps({"type": "message", "content": "Hi"}))
+            self.assertEqual(self.receive_until(websocket, "error")[-1]["retry_after"], 2.0)
+        self.assertEqual(self.histories, [])
+
+    def test_trim_history(self):
+        """Test that the oldest whole turns are dropped and the system prompt kept"""
+        messages = [{"role": "system", "content": "Be brief."}]
+        for turn in range(5):
+            messages += [
+                {"role": "user", "content": f"Question {turn}"},
+                {"role": "assistant", "tool_calls": [{"id": f"call_{turn}"}]},
+                {"role": "tool", "tool_call_id": f"call_{turn}", "content": "x" * 100},
+                {"role": "assistant", "content": f"Answer {turn}"}
+            ]
+        dropped = trim_history(messages, 650)
+
+        self.assertEqual(dropped, 12)
+        self.assertEqual(messages[0]["content"], "Be brief.")
+        self.assertEqual([m["content"] for m in messages if m["role"] == "user"], ["Question 3", "Question 4"])
+        self.assertEqual(trim_history(messages, 10), 4)
+        self.assertEqual(messages[1]["content"], "Question 4")
+
+if __name__ == "__main__":
+    unittest.main()
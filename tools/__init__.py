@@ -1,15 +1,20 @@
 # This file makes the tools directory a Python package
 # It also serves as an entry point for loading all tools
 
-# Import all tool registration functions here
-from tools.weather import register_weather_tool
-from tools.time_tool import register_time_tool
-from tools.calculator import register_calculator_tool
-from tools.currency import register_currency_tool
+# Tool modules are discovered from their source by services.tool_discovery and
+# imported on first use, so the registration functions are resolved lazily here
+_REGISTRATION_FUNCTIONS = {
+    "register_weather_tool": "tools.weather",
+    "register_time_tool": "tools.time_tool",
+    "register_calculator_tool": "tools.calculator",
+    "register_currency_tool": "tools.currency",
+    "register_currency_history_tools": "tools.currency_history",
+}
 
-__all__ = [
-    "register_weather_tool",
-    "register_time_tool",
-    "register_calculator_tool",
-    "register_currency_tool"
-]
+__all__ = list(_REGISTRATION_FUNCTIONS)
+
+def __getattr__(name):
+    if name in _REGISTRATION_FUNCTIONS:
+        import importlib
+        return getattr(importlib.import_module(_REGISTRATION_FUNCTIONS[name]), name)
+    raise AttributeError(f"module 'tools' has no attribute '{name}'")
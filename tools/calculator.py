@@ -103,7 +103,16 @@ def register_calculator_tool(mcp_server):
             },
             "required": ["expression"]
         },
-        function=calculate
+        function=calculate,
+        response_template="{expression} = {formatted_result}",
+        llm_view={"fields": ["expression", "formatted_result"], "rename": {"formatted_result": "result"}},
+        intents=[
+            {
+                "pattern": r"(?:what(?:'s| is)|calculate|compute)?\s*(?P<expression>\d+(?:\.\d+)?\s*[-+*/%^]\s*\d+(?:\.\d+)?)",
+                "template": "{expression} = {formatted_result}",
+                "confidence": 0.95
+            }
+        ]
     )
     
     mcp_server.register_tool(calculator_tool)
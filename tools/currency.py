@@ -2,6 +2,7 @@ import requests
 from typing import Dict, Any
 import config
 from models.schema import Tool
+from services.upstream import upstream
 
 async def convert_currency(amount: float, from_currency: str, to_currency: str) -> Dict[str, Any]:
     """
@@ -20,10 +21,7 @@ async def convert_currency(amount: float, from_currency: str, to_currency: str)
         # Replace with your preferred currency API
         url = f"https://open.er-api.com/v6/latest/{from_currency.upper()}"
         
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        data = response.json()
+        data = await upstream.get_json(url)
         
         if data["result"] != "success":
             return {"error": "Failed to fetch exchange rates"}
@@ -34,7 +32,7 @@ async def convert_currency(amount: float, from_currency: str, to_currency: str)
             return {"error": f"Currency '{to_currency}' not found"}
         
         exchange_rate = data["rates"][to_currency]
-        converted_amount = int(amount) * exchange_rate
+        converted_amount = float(amount) * exchange_rate
         
         return {
             "from": from_currency.upper(),
@@ -74,7 +72,20 @@ def register_currency_tool(mcp_server):
             },
             "required": ["amount", "from_currency", "to_currency"]
         },
-        function=convert_currency
+        function=convert_currency,
+        response_template="{amount:g} {from} is {converted_amount:.2f} {to} (rate {rate}).",
+        llm_view={
+            "fields": ["from", "to", "amount", "converted_amount", "rate"],
+            "round": 4,
+            "rename": {"converted_amount": "result"}
+        },
+        intents=[
+            {
+                "pattern": r"(?:convert )?(?P<amount>\d+(?:\.\d+)?) ?(?P<from_currency>[A-Za-z]{3}) (?:to|in|into) (?P<to_currency>[A-Za-z]{3})",
+                "template": "{amount:g} {from} is {converted_amount:.2f} {to} (rate {rate}).",
+                "confidence": 0.9
+            }
+        ]
     )
     
     mcp_server.register_tool(currency_tool)
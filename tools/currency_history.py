@@ -0,0 +1,140 @@
+import datetime
+from typing import Dict, Any, Optional
+from models.schema import Tool
+from services.rate_store import get_rate_store, parse_date
+
+# Longest range a trend query may cover
+MAX_TREND_DAYS = 3660
+
+async def convert_currency_historical(amount: float, from_currency: str, to_currency: str, date: str) -> Dict[str, Any]:
+    """
+    Convert an amount at the exchange rate of a past day
+
+    Args:
+        amount: Amount to convert
+        from_currency: Source currency code (e.g., 'USD')
+        to_currency: Target currency code (e.g., 'EUR')
+        date: Day of the rate, 'YYYY-MM-DD'; the last earlier rate is used on days without one
+
+    Returns:
+        Dictionary containing conversion result
+    """
+    try:
+        day = parse_date(date)
+        found = get_rate_store().cross_rate(from_currency, to_currency, day)
+        if found is None:
+            return {"error": f"No {from_currency.upper()}/{to_currency.upper()} rate stored for {day.isoformat()}"}
+
+        rate, rate_date = found
+        return {
+            "from": from_currency.upper(),
+            "to": to_currency.upper(),
+            "amount": amount,
+            "converted_amount": amount * rate,
+            "rate": rate,
+            "date": day.isoformat(),
+            "rate_date": rate_date.isoformat()
+        }
+    except ValueError as e:
+        return {"error": f"Error processing conversion: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Unexpected error: {str(e)}"}
+
+async def get_rate_trend(from_currency: str, to_currency: str, start_date: str, end_date: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Summarize how an exchange rate moved over a range of days
+
+    Args:
+        from_currency: Source currency code (e.g., 'USD')
+        to_currency: Target currency code (e.g., 'EUR')
+        start_date: First day, 'YYYY-MM-DD'
+        end_date: Last day, 'YYYY-MM-DD' (optional, defaults to today)
+
+    Returns:
+        Dictionary with the first and last rate, change, extremes, mean and volatility
+    """
+    try:
+        start = parse_date(start_date)
+        end = parse_date(end_date) if end_date else datetime.date.today()
+        if end < start:
+            return {"error": "end_date is before start_date"}
+        if (end - start).days > MAX_TREND_DAYS:
+            return {"error": f"Ranges are limited to {MAX_TREND_DAYS} days"}
+
+        trend = get_rate_store().trend(from_currency, to_currency, start, end)
+        if trend is None:
+            return {"error": f"No {from_currency.upper()}/{to_currency.upper()} rates stored between {start.isoformat()} and {end.isoformat()}"}
+
+        return {"from": from_currency.upper(), "to": to_currency.upper(), "start_date": start.isoformat(), "end_date": end.isoformat(), **trend}
+    except ValueError as e:
+        return {"error": f"Error processing trend: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Unexpected error: {str(e)}"}
+
+def register_currency_history_tools(mcp_server):
+    """Register the historical exchange-rate tools with the MCP server"""
+    historical_tool = Tool(
+        name="convert_currency_historical",
+        description="Convert an amount from one currency to another at the exchange rate of a past date",
+        parameters={
+            "type": "object",
+            "properties": {
+                "amount": {
+                    "type": "number",
+                    "description": "Amount to convert"
+                },
+                "from_currency": {
+                    "type": "string",
+                    "description": "Source currency code, e.g., 'USD', 'EUR', 'JPY'"
+                },
+                "to_currency": {
+                    "type": "string",
+                    "description": "Target currency code, e.g., 'USD', 'EUR', 'JPY'"
+                },
+                "date": {
+                    "type": "string",
+                    "description": "Date of the exchange rate, 'YYYY-MM-DD'"
+                }
+            },
+            "required": ["amount", "from_currency", "to_currency", "date"]
+        },
+        function=convert_currency_historical,
+        response_template="{amount:g} {from} was {converted_amount:.2f} {to} on {rate_date} (rate {rate}).",
+        llm_view={
+            "fields": ["from", "to", "amount", "converted_amount", "rate", "rate_date"],
+            "round": 4,
+            "rename": {"converted_amount": "result"}
+        }
+    )
+
+    trend_tool = Tool(
+        name="get_rate_trend",
+        description="Summarize how the exchange rate between two currencies moved over a date range: change, minimum, maximum, mean and volatility",
+        parameters={
+            "type": "object",
+            "properties": {
+                "from_currency": {
+                    "type": "string",
+                    "description": "Source currency code, e.g., 'USD'"
+                },
+                "to_currency": {
+                    "type": "string",
+                    "description": "Target currency code, e.g., 'EUR'"
+                },
+                "start_date": {
+                    "type": "string",
+                    "description": "First date of the range, 'YYYY-MM-DD'"
+                },
+                "end_date": {
+                    "type": "string",
+                    "description": "Last date of the range, 'YYYY-MM-DD' (optional, defaults to today)"
+                }
+            },
+            "required": ["from_currency", "to_currency", "start_date"]
+        },
+        function=get_rate_trend,
+        llm_view={"round": 4}
+    )
+
+    mcp_server.register_tool(historical_tool)
+    mcp_server.register_tool(trend_tool)
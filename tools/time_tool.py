@@ -58,7 +58,24 @@ def register_time_tool(mcp_server):
             },
             "required": []
         },
-        function=get_time
+        function=get_time,
+        response_template="It is {time} on {day_of_week}, {date} in {timezone}.",
+        llm_view={
+            "fields": ["iso_format", "day_of_week", "timezone"],
+            "rename": {"iso_format": "time", "day_of_week": "day"}
+        },
+        intents=[
+            {
+                "pattern": r"(?:what(?:'s| is) the )?(?:current )?time(?: is it)?(?: now)? in (?P<timezone>[A-Za-z_]+(?:/[A-Za-z_\-]+){1,2}|UTC)",
+                "template": "It is {time} on {day_of_week}, {date} in {timezone}.",
+                "confidence": 0.95
+            },
+            {
+                "pattern": r"what(?:'s| is) the (?:current )?time|what time is it(?: now)?",
+                "template": "It is {time} on {day_of_week}, {date} ({timezone}).",
+                "confidence": 0.9
+            }
+        ]
     )
     
     mcp_server.register_tool(time_tool)
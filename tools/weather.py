@@ -1,8 +1,11 @@
 import requests
 import json
-from typing import Dict, Any, Optional
+import asyncio
+from typing import Dict, Any, List, Optional
 import config
 from models.schema import Tool
+from services.upstream import upstream
+from services.http_cache import redact_url
 
 async def get_geo_location(city: str) -> Dict[str, Any]:
     """
@@ -17,10 +20,7 @@ async def get_geo_location(city: str) -> Dict[str, Any]:
     try:
         # Using OpenWeatherMap Geocoding API
         url = f"http://api.openweathermap.org/geo/1.0/direct?q={city}&limit=1&appid={config.WEATHER_API_KEY}"
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        data = response.json()
+        data = await upstream.get_json(url)
         
         # Check if we have results
         if not data:
@@ -41,7 +41,11 @@ async def get_geo_location(city: str) -> Dict[str, Any]:
         return geo_info
         
     except requests.exceptions.RequestException as e:
-        return {"error": f"Error fetching geolocation data: {str(e)}"}
+        return {"error": f"Error fetching geolocation data: {redact_url(str(e))}"}
+
+def current_weather_url(lat: float, lon: float) -> str:
+    """Build the OpenWeatherMap current weather URL for a coordinate"""
+    return f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&units=metric&appid={config.WEATHER_API_KEY}"
 
 async def get_weather(city: str, country: str = None) -> Dict[str, Any]:
     """
@@ -58,15 +62,13 @@ async def get_weather(city: str, country: str = None) -> Dict[str, Any]:
     
     try:
         geo_location = await get_geo_location(location)
+        if "error" in geo_location:
+            return geo_location
         lat = geo_location.get("lat")
         lon = geo_location.get("lon")
         
-        # Using OpenWeatherMap API (replace with your preferred weather API)
-        url = f"https://api.openweathermap.org/data/3.0/onecall?lat={lat}&lon={lon}&exclude={part}&appid={config.WEATHER_API_KEY}"
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        data = response.json()
+        # Using OpenWeatherMap current weather API (replace with your preferred weather API)
+        data = await upstream.get_json(current_weather_url(lat, lon))
         
         # Extract relevant information
         weather_info = {
@@ -81,10 +83,80 @@ async def get_weather(city: str, country: str = None) -> Dict[str, Any]:
         
         return weather_info
     except requests.exceptions.RequestException as e:
-        return {"error": f"Error fetching weather data: {str(e)}"}
+        return {"error": f"Error fetching weather data: {redact_url(str(e))}"}
     except (KeyError, IndexError) as e:
         return {"error": f"Error parsing weather data: {str(e)}"}
 
+async def get_weather_batch(cities: List[str], country: str = None) -> Dict[str, Any]:
+    """
+    Get current weather for several cities at once
+    
+    All cities are geocoded concurrently, then their weather is fetched
+    concurrently, with at most WEATHER_BATCH_CONCURRENCY requests in flight.
+    
+    Args:
+        cities: City names
+        country: Country code applied to every city (optional)
+        
+    Returns:
+        Dictionary with a 'columns'/'rows' table (one row per city found) and
+        an 'errors' list for cities that could not be looked up
+    """
+    # Drop duplicates but keep the order the cities were asked in
+    unique_cities = []
+    seen = set()
+    for city in cities:
+        key = city.strip().lower()
+        if key and key not in seen:
+            seen.add(key)
+            unique_cities.append(city.strip())
+    if not unique_cities:
+        return {"error": "No cities given"}
+    if len(unique_cities) > config.WEATHER_BATCH_MAX_CITIES:
+        return {"error": f"At most {config.WEATHER_BATCH_MAX_CITIES} cities can be looked up at once"}
+    
+    semaphore = asyncio.Semaphore(config.WEATHER_BATCH_CONCURRENCY)
+    
+    async def geocode(city: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await get_geo_location(city if not country else f"{city},{country}")
+    
+    async def current_weather(geo_location: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            return await upstream.get_json(current_weather_url(geo_location["lat"], geo_location["lon"]))
+    
+    geo_locations = await asyncio.gather(*[geocode(city) for city in unique_cities])
+    found = [(city, geo) for city, geo in zip(unique_cities, geo_locations) if "error" not in geo]
+    errors = [{"city": city, "error": geo["error"]} for city, geo in zip(unique_cities, geo_locations) if "error" in geo]
+    
+    results = await asyncio.gather(*[current_weather(geo) for _, geo in found], return_exceptions=True)
+    
+    rows = []
+    for (city, geo), data in zip(found, results):
+        if isinstance(data, requests.exceptions.RequestException):
+            errors.append({"city": city, "error": f"Error fetching weather data: {redact_url(str(data))}"})
+            continue
+        if isinstance(data, BaseException):
+            raise data
+        try:
+            rows.append([
+                city,
+                f"{data['name']}, {data['sys']['country']}",
+                data['main']['temp'],
+                data['main']['feels_like'],
+                data['weather'][0]['description'],
+                data['main']['humidity'],
+                data['wind']['speed']
+            ])
+        except (KeyError, IndexError, TypeError) as e:
+            errors.append({"city": city, "error": f"Error parsing weather data: {str(e)}"})
+    
+    return {
+        "columns": ["city", "location", "temp_c", "feels_like_c", "description", "humidity_pct", "wind_m_s"],
+        "rows": rows,
+        "errors": errors
+    }
+
 def register_weather_tool(mcp_server):
     """Register the weather tool with the MCP server"""
     weather_tool = Tool(
@@ -104,7 +176,20 @@ def register_weather_tool(mcp_server):
             },
             "required": ["city"]
         },
-        function=get_weather
+        function=get_weather,
+        response_template="Weather in {location}: {description}, {temperature} (feels like {feels_like}), humidity {humidity}, wind {wind_speed}.",
+        llm_view={
+            "fields": ["location", "temperature", "feels_like", "description", "humidity", "wind_speed"],
+            "parse_numbers": True,
+            "rename": {"temperature": "temp_c", "feels_like": "feels_c", "humidity": "humidity_pct", "wind_speed": "wind_m_s"}
+        },
+        intents=[
+            {
+                "pattern": r"(?:what(?:'s| is) the )?weather (?:like )?(?:in|for) (?P<city>[A-Za-z][A-Za-z .'\-]*)",
+                "template": "Weather in {location}: {description}, {temperature} (feels like {feels_like}), humidity {humidity}, wind {wind_speed}.",
+                "confidence": 0.85
+            }
+        ]
     )
     
     geo_location_tool = Tool(
@@ -123,4 +208,28 @@ def register_weather_tool(mcp_server):
         function=get_geo_location
     )
     
+    weather_batch_tool = Tool(
+        name="get_weather_batch",
+        description="Get current weather for several cities in one call, e.g., to compare them",
+        parameters={
+            "type": "object",
+            "properties": {
+                "cities": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "City names, e.g., ['Paris', 'Berlin', 'Rome']"
+                },
+                "country": {
+                    "type": "string",
+                    "description": "Country code for all cities (optional), e.g., 'US'"
+                }
+            },
+            "required": ["cities"]
+        },
+        function=get_weather_batch,
+        cache_ttl=120,
+        llm_view={"round": 1, "max_chars": 2000}
+    )
+    
     mcp_server.register_tool(weather_tool)
+    mcp_server.register_tool(weather_batch_tool)